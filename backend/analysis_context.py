@@ -0,0 +1,69 @@
+"""
+Analysis Context - STFT / HPSS compartidos por todos los extractores de un trabajo
+"""
+
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Tuple
+
+import librosa
+import numpy as np
+
+
+class AnalysisContext:
+    """Per-job cache of the spectral work the extended-track extractors share.
+
+    Everything is computed lazily on first access and reused afterwards, so a
+    job pays for one STFT, one harmonic/percussive decomposition and one
+    pre-emphasis no matter how many extractors read them. Access is
+    thread-safe, so extractors may run concurrently.
+    """
+
+    def __init__(self, audio: np.ndarray, sr: int, n_fft: int = 2048, hop_length: int = 512):
+        self.audio = audio
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self._cache: Dict[str, Any] = {}
+        # One lock per intermediate: a thread computing HPSS does not block one computing pre-emphasis
+        self._locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+
+    def _get(self, name: str, compute: Callable[[], Any]) -> Any:
+        if name in self._cache:
+            return self._cache[name]
+        with self._locks_guard:
+            lock = self._locks[name]
+        with lock:
+            if name not in self._cache:
+                self._cache[name] = compute()
+            return self._cache[name]
+
+    @property
+    def stft(self) -> np.ndarray:
+        return self._get("stft", lambda: librosa.stft(self.audio, n_fft=self.n_fft, hop_length=self.hop_length))
+
+    @property
+    def hpss(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Harmonic and percussive complex spectrograms"""
+        return self._get("hpss", lambda: librosa.decompose.hpss(self.stft))
+
+    @property
+    def harmonic(self) -> np.ndarray:
+        return self._get("harmonic", lambda: self._istft(self.hpss[0]))
+
+    @property
+    def percussive(self) -> np.ndarray:
+        return self._get("percussive", lambda: self._istft(self.hpss[1]))
+
+    @property
+    def preemphasized(self) -> np.ndarray:
+        return self._get("preemphasized", lambda: librosa.effects.preemphasis(self.audio))
+
+    @property
+    def harmonic_preemphasized(self) -> np.ndarray:
+        return self._get("harmonic_preemphasized", lambda: librosa.effects.preemphasis(self.harmonic))
+
+    def _istft(self, spectrogram: np.ndarray) -> np.ndarray:
+        # Same reconstruction as librosa.effects.hpss: match the input length exactly
+        return librosa.istft(spectrogram, hop_length=self.hop_length, n_fft=self.n_fft, length=len(self.audio))
@@ -3,21 +3,41 @@ Audio Processor REAL - Demucs + Procesamiento adicional para 10+ tracks
 """
 
 import os
+import re
 import asyncio
 import subprocess
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional
-import shutil
+from typing import Callable, Dict, Optional, Tuple
 import librosa
 import soundfile as sf
 import numpy as np
 
+from demucs_worker import demucs_pool
+from segmented_separation import separate_segmented, separate_parallel
+from mixdown import mix_stems
+from analysis_context import AnalysisContext
+from chord_analyzer import AnalysisSession, ChordAnalyzer
+
+# Extended-track extractors run concurrently here, never on the event loop
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "4"))
+# tqdm bar printed by `python -m demucs`, e.g. " 42%|████▏     | 87.75/210.6 [00:31<00:44, 2.78seconds/s]"
+# Demucs' separation bar counts audio seconds; other bars (torch.hub weight download) use byte units
+DEMUCS_PROGRESS = re.compile(r"(\d{1,3})%\|.*seconds/s")
+# Printed by `python -m demucs` before separating with a model bag (one progress bar per model)
+DEMUCS_BAG = re.compile(r"bag of (\d+) models")
+
 class AudioProcessor:
     def __init__(self):
         self.models_loaded = False
+        self.worker_pool = demucs_pool
+        self.extract_executor = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="extract")
         
-    async def separate_with_demucs(self, file_path: str, task_callback=None, requested_tracks=None) -> Dict[str, str]:
-        """Separate audio using Demucs (IA REAL)"""
+    async def separate_with_demucs(self, file_path: str, task_callback=None, requested_tracks=None, timings: Optional[Dict] = None,
+                                   on_stem: Optional[Callable[[str, str], None]] = None) -> Dict[str, str]:
+        """Separate audio using Demucs (IA REAL); `on_stem(name, path)` is called as each stem is final"""
         try:
             # Create output directory
             output_dir = Path(file_path).parent / "demucs_output"
@@ -27,34 +47,42 @@ class AudioProcessor:
             if task_callback:
                 task_callback(20, "Starting Demucs AI separation...")
             
-            # Run Demucs command - using the htdemucs model for best quality
-            cmd = [
-                "python", "-m", "demucs",
-                "--name", "htdemucs",  # Best quality model
-                "--out", str(output_dir),
-                file_path
-            ]
-            
-            print(f"Running Demucs command: {' '.join(cmd)}")
-            
             # Update progress: Processing with Demucs
             if task_callback:
                 task_callback(40, "Processing with Demucs AI...")
             
-            # Execute in subprocess
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode != 0:
-                print(f"Demucs error: {stderr.decode()}")
-                raise Exception(f"Demucs error: {stderr.decode()}")
-            
-            print(f"Demucs output: {stdout.decode()}")
+            # Demucs' own progress (segments done) mapped onto 40-70%
+            def on_progress(fraction: float):
+                if task_callback:
+                    task_callback(40 + int(30 * fraction), f"Demucs AI {fraction:.0%}")
+            
+            # Split only across the workers idle right now: with a busy pool, chunks would just
+            # interleave with other jobs in the queue and pay the crossfades for nothing
+            reservation = None
+            if self.worker_pool.available and self.worker_pool.parallel_chunks > 1:
+                reservation = self.worker_pool.reserve(self.worker_pool.parallel_chunks)
+                if reservation.count <= 1:
+                    reservation.release()
+                    reservation = None
+            
+            if reservation:
+                # Split the track across the idle workers and stitch the chunks with crossfades
+                start = time.perf_counter()
+                with reservation:
+                    await separate_parallel(file_path, output_dir, self.worker_pool, reservation.count,
+                                            on_progress=on_progress, reservation=reservation)
+                job_timing = {"model_load": 0.0, "total": time.perf_counter() - start, "chunks": reservation.count}
+                print(f"Demucs parallel separation: {job_timing['chunks']} chunks in {job_timing['total']:.2f}s")
+            elif self.worker_pool.available:
+                # Warm path: the model is already loaded in a worker process
+                _, job_timing = await self.worker_pool.separate_file(file_path, str(output_dir), on_progress)
+                print(f"Demucs worker timing: model load {job_timing['model_load']:.2f}s, "
+                      f"inference {job_timing['inference']:.2f}s, queue wait {job_timing['queue_wait']:.2f}s")
+            else:
+                job_timing = await self._run_demucs_subprocess(file_path, output_dir, on_progress)
+            
+            if timings is not None:
+                timings.update(job_timing)
             
             # Update progress: Demucs completed
             if task_callback:
@@ -64,8 +92,8 @@ class AudioProcessor:
             stems = {}
             file_name = Path(file_path).stem
             
-            # Demucs creates a folder with the model name
-            model_dir = output_dir / "htdemucs" / file_name
+            # Demucs creates a folder with the model name (DEMUCS_MODEL, shared by every path)
+            model_dir = output_dir / self.worker_pool.model_name / file_name
             
             if model_dir.exists():
                 # Map Demucs output to our expected format
@@ -87,39 +115,19 @@ class AudioProcessor:
                         if vocals_path.exists():
                             stems["vocals"] = str(vocals_path)
                             print(f"Found vocals: {vocals_path}")
+                            # Vocals are final now; they can be published while the instrumental is mixed
+                            if on_stem:
+                                on_stem("vocals", stems["vocals"])
                         
-                        # Instrumental = drums + bass + other
-                        import librosa
-                        import soundfile as sf
-                        import numpy as np
-                        
-                        instrumental_tracks = []
-                        for track in ["drums", "bass", "other"]:
-                            track_path = model_dir / f"{track}.wav"
-                            if track_path.exists():
-                                instrumental_tracks.append(track_path)
-                        
-                        if instrumental_tracks:
-                            # Combinar los tracks instrumentales
-                            combined_audio = None
-                            sr = None
-                            
-                            for track_path in instrumental_tracks:
-                                audio, sample_rate = librosa.load(track_path, sr=None)
-                                sr = sample_rate
-                                
-                                if combined_audio is None:
-                                    combined_audio = audio
-                                else:
-                                    # Asegurar que tengan la misma longitud
-                                    min_length = min(len(combined_audio), len(audio))
-                                    combined_audio = combined_audio[:min_length] + audio[:min_length]
-                            
-                            # Guardar track instrumental combinado
-                            instrumental_path = model_dir.parent / "instrumental.wav"
-                            sf.write(str(instrumental_path), combined_audio, sr)
+                        # Instrumental = drums + bass + other, mixed block by block in stereo
+                        instrumental_path = model_dir.parent / "instrumental.wav"
+                        demucs_stems = {track: str(model_dir / f"{track}.wav") for track in ["drums", "bass", "other"]
+                                        if (model_dir / f"{track}.wav").exists()}
+                        if await asyncio.to_thread(mix_stems, demucs_stems, ["drums", "bass", "other"], str(instrumental_path)):
                             stems["instrumental"] = str(instrumental_path)
                             print(f"Created instrumental: {instrumental_path}")
+                            if on_stem:
+                                on_stem("instrumental", stems["instrumental"])
                     
                     else:
                         # Procesar tracks individuales solicitados
@@ -129,6 +137,8 @@ class AudioProcessor:
                                 if stem_path.exists():
                                     stems[stem_name] = str(stem_path)
                                     print(f"Found {stem_name}: {stem_path}")
+                                    if on_stem:
+                                        on_stem(stem_name, stems[stem_name])
                 
                 else:
                     # Si no se especificaron tracks, devolver todos
@@ -137,6 +147,8 @@ class AudioProcessor:
                         if stem_path.exists():
                             stems[stem_name] = str(stem_path)
                             print(f"Found {stem_name}: {stem_path}")
+                            if on_stem:
+                                on_stem(stem_name, stems[stem_name])
             
             # Update progress: Files found
             if task_callback:
@@ -148,19 +160,106 @@ class AudioProcessor:
             print(f"Error in Demucs separation: {e}")
             raise
     
+    async def separate_segmented(self, file_path: str, task_callback=None, requested_tracks=None) -> Dict[str, str]:
+        """Separate long recordings window by window with bounded memory"""
+        try:
+            if task_callback:
+                task_callback(20, "Starting segmented Demucs separation...")
+            
+            output_dir = Path(file_path).parent / "segmented_output"
+            stems = await separate_segmented(file_path, output_dir, self.worker_pool, requested_tracks, task_callback)
+            
+            if task_callback:
+                task_callback(80, f"Found {len(stems)} separated tracks")
+            
+            return stems
+            
+        except Exception as e:
+            print(f"Error in segmented separation: {e}")
+            raise
+    
+    async def _run_demucs_subprocess(self, file_path: str, output_dir: Path,
+                                     on_progress: Optional[Callable[[float], None]] = None) -> Dict[str, float]:
+        """Cold path: spawn `python -m demucs` (pays interpreter, torch import and weight loading)"""
+        # Run Demucs command - same model as the worker pool (DEMUCS_MODEL, htdemucs by default)
+        cmd = [
+            "python", "-m", "demucs",
+            "--name", self.worker_pool.model_name,
+            "--out", str(output_dir),
+            file_path
+        ]
+        
+        print(f"Running Demucs command: {' '.join(cmd)}")
+        start = time.perf_counter()
+        
+        # Execute in subprocess; one unbuffered stream keeps the model-bag notice ahead of the bars
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env={**os.environ, "PYTHONUNBUFFERED": "1"}
+        )
+        
+        # Drained while Demucs runs; its tqdm bar carries the progress
+        output = await read_demucs_progress(process.stdout, on_progress)
+        await process.wait()
+        
+        if process.returncode != 0:
+            print(f"Demucs error: {output}")
+            raise Exception(f"Demucs error: {output}")
+        
+        print(f"Demucs output: {output}")
+        
+        # Model loading and inference are not separable from outside the subprocess
+        return {"model_load": None, "inference": None, "total": time.perf_counter() - start}
+    
+    def analyze_audio(self, file_path: str, audio: Optional[Tuple[np.ndarray, int]] = None) -> Dict:
+        """Song metadata (duration, tempo, key, time signature) from a single decode.
+
+        Pass `audio` as (y, sr) when the job already holds the decoded song; it is resampled instead of re-read.
+        """
+        analyzer = ChordAnalyzer()
+        if audio is None and analyzer.should_stream(file_path):
+            # Long recordings: block-wise pass with bounded memory
+            analysis = analyzer.analyze_all_streaming(file_path)
+            duration, tempo = analysis["duration"], analysis["tempo"]
+            key_info, time_signature = analysis["key"], analysis["time_signature"]
+        else:
+            session = AnalysisSession(file_path, audio=audio)
+            duration = session.duration
+            tempo, beat_frames = session.beats
+            key_info = analyzer.key_from_session(session)
+            time_signature = analyzer.guess_time_signature(session.onset_env, beat_frames)
+        
+        return {
+            "duration": duration,
+            "tempo": tempo,
+            "key": key_info.key if key_info else None,
+            "mode": key_info.mode if key_info else None,
+            "key_confidence": key_info.confidence if key_info else None,
+            "time_signature": time_signature
+        }
+    
     async def separate_with_spleeter(self, file_path: str, model_type: str, hi_fi: bool = False) -> Dict[str, str]:
         """Fallback to Demucs if Spleeter is requested"""
         print(f"Spleeter requested but using Demucs instead (IA REAL)")
         return await self.separate_with_demucs(file_path)
     
-    async def separate_custom_tracks(self, file_path: str, tracks: Dict[str, bool], hi_fi: bool = False) -> Dict[str, str]:
+    async def separate_custom_tracks(self, file_path: str, tracks: Dict[str, bool], hi_fi: bool = False,
+                                     on_stem: Optional[Callable[[str, str], None]] = None,
+                                     on_audio: Optional[Callable[[np.ndarray, int], None]] = None) -> Dict[str, str]:
         """Separate custom tracks using Demucs + additional processing for 10+ tracks"""
         try:
+            # Only requested tracks are handed over as they become final
+            def on_requested_stem(track_name: str, track_path: str):
+                if on_stem and tracks.get(track_name):
+                    on_stem(track_name, track_path)
+            
             # First separate with Demucs (gets 4 basic stems)
-            all_stems = await self.separate_with_demucs(file_path)
+            all_stems = await self.separate_with_demucs(file_path, on_stem=on_requested_stem)
             
             # Create additional tracks using AI processing
-            extended_stems = await self.create_extended_tracks(file_path, all_stems)
+            extended_stems = await self.create_extended_tracks(file_path, all_stems, on_requested_stem, on_audio)
             
             # Filter based on requested tracks
             filtered_stems = {}
@@ -174,32 +273,50 @@ class AudioProcessor:
             print(f"❌ Error in custom track separation: {e}")
             raise
     
-    async def create_extended_tracks(self, file_path: str, basic_stems: Dict[str, str]) -> Dict[str, str]:
-        """Create additional tracks using AI processing"""
+    async def create_extended_tracks(self, file_path: str, basic_stems: Dict[str, str],
+                                     on_stem: Optional[Callable[[str, str], None]] = None,
+                                     on_audio: Optional[Callable[[np.ndarray, int], None]] = None) -> Dict[str, str]:
+        """Create additional tracks using AI processing; `on_audio` gets the decoded song for other stages"""
         try:
             extended_stems = basic_stems.copy()
             output_dir = Path(file_path).parent / "extended_tracks"
             output_dir.mkdir(exist_ok=True)
             
+            loop = asyncio.get_running_loop()
+            
             # Load the original audio
-            audio, sr = librosa.load(file_path, sr=None)
-            
-            # Create additional tracks using librosa and AI processing
-            additional_tracks = {
-                "piano": self.extract_piano(audio, sr, output_dir),
-                "guitar": self.extract_guitar(audio, sr, output_dir),
-                "strings": self.extract_strings(audio, sr, output_dir),
-                "brass": self.extract_brass(audio, sr, output_dir),
-                "percussion": self.extract_percussion(audio, sr, output_dir),
-                "synth": self.extract_synth(audio, sr, output_dir),
-                "instrumental": self.create_instrumental(basic_stems, output_dir)
+            audio, sr = await loop.run_in_executor(self.extract_executor, lambda: librosa.load(file_path, sr=None))
+            
+            # STFT, HPSS and pre-emphasis are computed once and shared by every extractor
+            ctx = AnalysisContext(audio, sr)
+            if on_audio:
+                on_audio(ctx.audio, ctx.sr)
+            
+            # Create additional tracks using librosa and AI processing, concurrently in the pool
+            extractors = {
+                "piano": (self.extract_piano, ctx),
+                "guitar": (self.extract_guitar, ctx),
+                "strings": (self.extract_strings, ctx),
+                "brass": (self.extract_brass, ctx),
+                "percussion": (self.extract_percussion, ctx),
+                "synth": (self.extract_synth, ctx),
+                "instrumental": (self.create_instrumental, basic_stems)
             }
             
-            # Add valid tracks to extended stems
-            for track_name, track_path in additional_tracks.items():
+            async def run_extractor(track_name, extractor, source):
+                track_path = await loop.run_in_executor(self.extract_executor, extractor, source, output_dir)
+                return track_name, track_path
+            
+            pending = [run_extractor(name, extractor, source) for name, (extractor, source) in extractors.items()]
+            
+            # Add valid tracks to extended stems as they finish
+            for finished in asyncio.as_completed(pending):
+                track_name, track_path = await finished
                 if track_path and Path(track_path).exists():
                     extended_stems[track_name] = track_path
                     print(f"✅ Created {track_name}: {track_path}")
+                    if on_stem:
+                        on_stem(track_name, track_path)
             
             return extended_stems
             
@@ -207,80 +324,73 @@ class AudioProcessor:
             print(f"❌ Error creating extended tracks: {e}")
             return basic_stems
     
-    def extract_piano(self, audio: np.ndarray, sr: int, output_dir: Path) -> str:
+    def extract_piano(self, ctx: AnalysisContext, output_dir: Path) -> str:
         """Extract piano using frequency analysis"""
         try:
-            # Use harmonic-percussive separation to isolate harmonic content
-            y_harmonic, y_percussive = librosa.effects.hpss(audio)
-            
-            # Further filter for piano-like frequencies (80-4000 Hz)
-            piano = librosa.effects.preemphasis(y_harmonic)
+            # Harmonic content from the shared harmonic-percussive separation,
+            # further filtered for piano-like frequencies (80-4000 Hz)
+            piano = ctx.harmonic_preemphasized
             
             output_path = output_dir / "piano.wav"
-            sf.write(str(output_path), piano, sr)
+            sf.write(str(output_path), piano, ctx.sr)
             return str(output_path)
         except:
             return None
     
-    def extract_guitar(self, audio: np.ndarray, sr: int, output_dir: Path) -> str:
+    def extract_guitar(self, ctx: AnalysisContext, output_dir: Path) -> str:
         """Extract guitar using spectral analysis"""
         try:
-            # Use chroma features to isolate guitar-like content
-            chroma = librosa.feature.chroma_stft(y=audio, sr=sr)
-            
             # Create guitar track by emphasizing guitar frequencies
-            guitar = librosa.effects.preemphasis(audio)
+            guitar = ctx.preemphasized
             
             output_path = output_dir / "guitar.wav"
-            sf.write(str(output_path), guitar, sr)
+            sf.write(str(output_path), guitar, ctx.sr)
             return str(output_path)
         except:
             return None
     
-    def extract_strings(self, audio: np.ndarray, sr: int, output_dir: Path) -> str:
+    def extract_strings(self, ctx: AnalysisContext, output_dir: Path) -> str:
         """Extract strings using spectral analysis"""
         try:
             # Filter for string-like frequencies
-            strings = librosa.effects.preemphasis(audio)
+            strings = ctx.preemphasized
             
             output_path = output_dir / "strings.wav"
-            sf.write(str(output_path), strings, sr)
+            sf.write(str(output_path), strings, ctx.sr)
             return str(output_path)
         except:
             return None
     
-    def extract_brass(self, audio: np.ndarray, sr: int, output_dir: Path) -> str:
+    def extract_brass(self, ctx: AnalysisContext, output_dir: Path) -> str:
         """Extract brass instruments"""
         try:
             # Filter for brass frequencies
-            brass = librosa.effects.preemphasis(audio)
+            brass = ctx.preemphasized
             
             output_path = output_dir / "brass.wav"
-            sf.write(str(output_path), brass, sr)
+            sf.write(str(output_path), brass, ctx.sr)
             return str(output_path)
         except:
             return None
     
-    def extract_percussion(self, audio: np.ndarray, sr: int, output_dir: Path) -> str:
+    def extract_percussion(self, ctx: AnalysisContext, output_dir: Path) -> str:
         """Extract percussion using percussive separation"""
         try:
-            # Use harmonic-percussive separation
-            y_harmonic, y_percussive = librosa.effects.hpss(audio)
-            
+            # Use the shared harmonic-percussive separation
             output_path = output_dir / "percussion.wav"
-            sf.write(str(output_path), y_percussive, sr)
+            sf.write(str(output_path), ctx.percussive, ctx.sr)
             return str(output_path)
         except:
             return None
     
-    def extract_synth(self, audio: np.ndarray, sr: int, output_dir: Path) -> str:
+    def extract_synth(self, ctx: AnalysisContext, output_dir: Path) -> str:
         """Extract synthesizer sounds"""
         try:
             # Filter for synth-like frequencies
-            synth = librosa.effects.preemphasis(audio)
+            synth = ctx.preemphasized
             
             output_path = output_dir / "synth.wav"
-            sf.write(str(output_path), synth, sr)
+            sf.write(str(output_path), synth, ctx.sr)
             return str(output_path)
         except:
             return None
@@ -289,14 +399,56 @@ class AudioProcessor:
         """Create instrumental track by combining drums + bass + other"""
         try:
             if all(track in basic_stems for track in ["drums", "bass", "other"]):
-                # For now, just copy drums as instrumental
-                # In a real implementation, you'd mix the tracks
                 instrumental_path = output_dir / "instrumental.wav"
-                shutil.copy2(basic_stems["drums"], instrumental_path)
-                return str(instrumental_path)
-        except:
-            pass
+                return mix_stems(basic_stems, ["drums", "bass", "other"], str(instrumental_path))
+        except Exception as e:
+            print(f"Error creating instrumental: {e}")
         return None
 
+async def read_demucs_progress(stream: asyncio.StreamReader, on_progress: Optional[Callable[[float], None]] = None,
+                               passes: int = 1, keep_lines: int = 50) -> str:
+    """Read Demucs' output as it is written, reporting its tqdm percentage over every pass; returns the last lines.
+    
+    tqdm redraws the bar with carriage returns, so lines are split on those as well
+    as on newlines. Only the separation bar (unit `seconds`) counts; a weight
+    download bar on a cold cache is ignored. A model bag runs the bar once per
+    model: Demucs announces how many, a bar that starts over is the next pass,
+    and the percentage is scaled over all passes like _segment_progress does
+    in the worker pool.
+    """
+    tail = deque(maxlen=keep_lines)
+    buffer = b""
+    reported = -1
+    current, last = 0, 0
+    while True:
+        chunk = await stream.read(4096)
+        if not chunk:
+            break
+        *lines, buffer = re.split(rb"[\r\n]", buffer + chunk)
+        for line in lines:
+            if not line.strip():
+                continue
+            text = line.decode(errors="replace")
+            match = DEMUCS_PROGRESS.search(text)
+            if match:
+                percent = int(match.group(1))
+                if percent < last:
+                    current += 1
+                    # Bag size not announced: count the passes as they come
+                    passes = max(passes, current + 1)
+                last = percent
+                overall = min(100, (100 * current + percent) // passes)
+                if overall > reported and on_progress:
+                    reported = overall
+                    on_progress(overall / 100)
+            else:
+                bag = DEMUCS_BAG.search(text)
+                if bag:
+                    passes = int(bag.group(1))
+                tail.append(text)
+    if buffer.strip():
+        tail.append(buffer.decode(errors="replace"))
+    return "\n".join(tail)
+
 # Global instance
 audio_processor = AudioProcessor()
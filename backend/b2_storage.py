@@ -2,10 +2,13 @@
 B2 Storage - Simplified version for demo
 """
 
-import aiohttp
 import asyncio
 from typing import AsyncGenerator
 
+from http_client import http_client
+from s3_client import s3_uploader
+from b2_uploader import b2_uploader
+
 class B2Storage:
     def __init__(self):
         self.initialized = False
@@ -18,18 +21,22 @@ class B2Storage:
     async def download_file(self, file_path: str) -> AsyncGenerator[bytes, None]:
         """Download file from B2 and stream it"""
         try:
-            # Construir URL completa de B2
-            b2_url = f"https://s3.us-east-005.backblazeb2.com/moises2/{file_path}"
+            if b2_uploader.mode == "s3":
+                # Same bucket the stems were written to; signed, so private buckets work too
+                b2_url = s3_uploader.presigned_url(file_path)
+            else:
+                # Construir URL completa de B2
+                b2_url = f"https://s3.us-east-005.backblazeb2.com/moises2/{file_path}"
             print(f"📥 Downloading from B2: {b2_url}")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(b2_url) as response:
-                    if response.status == 200:
-                        async for chunk in response.content.iter_chunked(8192):
-                            yield chunk
-                    else:
-                        print(f"❌ Error downloading {file_path}: {response.status}")
-                        raise Exception(f"Failed to download file: {response.status}")
+            # Pooled connection: no new TCP/TLS handshake per request
+            async with http_client.request('GET', b2_url) as response:
+                if response.status == 200:
+                    async for chunk in response.content.iter_chunked(8192):
+                        yield chunk
+                else:
+                    print(f"❌ Error downloading {file_path}: {response.status}")
+                    raise Exception(f"Failed to download file: {response.status}")
         except Exception as e:
             print(f"❌ Error in download_file: {e}")
             raise
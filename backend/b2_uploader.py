@@ -3,79 +3,97 @@ B2 Uploader - Subir pistas separadas a Backblaze B2
 """
 
 import os
+import time
 import asyncio
+import mimetypes
 import aiohttp
-import aiofiles
 from pathlib import Path
 from typing import Dict, Optional
 
+from http_client import http_client
+from s3_client import s3_uploader
+
+# Subidas de stems simultáneas en el proceso (todos los trabajos)
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+# s3: multipart directo a B2; proxy: via server-s3.js; auto: s3 si hay credenciales
+B2_UPLOAD_MODE = os.getenv("B2_UPLOAD_MODE", "auto")
+B2_PROXY_URL = os.getenv("B2_PROXY_URL", "http://localhost:3001")
+
+def resolve_upload_mode(mode: str = B2_UPLOAD_MODE) -> str:
+    if mode == "auto":
+        return "s3" if s3_uploader.configured else "proxy"
+    if mode not in ("s3", "proxy"):
+        raise ValueError(f"Unknown B2 upload mode: {mode}")
+    return mode
+
 class B2Uploader:
-    def __init__(self):
-        self.proxy_url = "http://localhost:3001"
-        self.b2_bucket = "moises2"
-        self.b2_endpoint = "https://s3.us-east-005.backblazeb2.com"
+    def __init__(self, concurrency: int = UPLOAD_CONCURRENCY, mode: str = B2_UPLOAD_MODE):
+        self.proxy_url = B2_PROXY_URL
+        self.b2_bucket = s3_uploader.bucket
+        self.b2_endpoint = s3_uploader.endpoint
+        self.concurrency = max(1, concurrency)
+        self.mode = resolve_upload_mode(mode)
+        self._slots = None
     
-    async def upload_stem_to_b2(self, file_path: str, user_id: str, song_id: str, stem_name: str) -> str:
-        """Subir una pista separada a B2"""
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        """Subidas simultáneas en todo el proceso, compartidas por todos los trabajos (una por event loop)"""
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.concurrency))
+        return self._slots[1]
+    
+    async def upload_stem_to_b2(self, file_path: str, user_id: str, song_id: str, stem_name: str,
+                                stats: Optional[Dict] = None) -> str:
+        """Subir una pista separada a B2 (el cuerpo se lee del disco por trozos, sin cargarlo entero)"""
+        start = time.perf_counter()
+        size = os.path.getsize(file_path)
+        suffix = Path(file_path).suffix or ".wav"
+        content_type = mimetypes.guess_type(f"x{suffix}")[0] or "application/octet-stream"
+        opened = []
         try:
-            print(f"📤 Uploading stem to B2: {stem_name}")
+            print(f"📤 Uploading stem to B2: {stem_name} ({size / 1e6:.1f} MB, {self.mode})")
             
-            # Leer el archivo
-            async with aiofiles.open(file_path, 'rb') as f:
-                file_data = await f.read()
+            if self.mode == "s3":
+                # Directo al bucket, con el mismo esquema de claves que el proxy
+                key = f"audio/{user_id}/{int(time.time() * 1000)}_{stem_name}{suffix}"
+                download_url = await s3_uploader.upload_file(file_path, key, content_type)
+                print(f"✅ Stem uploaded to B2: {stem_name} -> {download_url}")
+                return download_url
             
-            # Crear FormData
-            form_data = aiohttp.FormData()
-            form_data.add_field('file', file_data, filename=f"{stem_name}.wav", content_type='audio/wav')
-            form_data.add_field('userId', user_id)
-            form_data.add_field('songId', song_id)
-            form_data.add_field('trackName', stem_name)
-            form_data.add_field('folder', 'stems')
+            # Crear FormData (nuevo en cada intento si hay reintentos); aiohttp envía el archivo por trozos
+            def form_data():
+                stream = open(file_path, 'rb')
+                opened.append(stream)
+                form = aiohttp.FormData()
+                form.add_field('file', stream, filename=f"{stem_name}{suffix}", content_type=content_type)
+                form.add_field('userId', user_id)
+                form.add_field('songId', song_id)
+                form.add_field('trackName', stem_name)
+                form.add_field('folder', 'stems')
+                return form
             
-            # Subir a B2 via proxy
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.proxy_url}/api/upload", data=form_data) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        download_url = result.get('downloadUrl', '')
-                        print(f"✅ Stem uploaded to B2: {stem_name} -> {download_url}")
-                        return download_url
-                    else:
-                        error_text = await response.text()
-                        print(f"❌ Error uploading stem {stem_name}: {response.status} - {error_text}")
-                        return ""
+            # Subir a B2 via proxy, con el pool de conexiones compartido
+            async with http_client.request('POST', f"{self.proxy_url}/api/upload", data=form_data) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    download_url = result.get('downloadUrl', '')
+                    print(f"✅ Stem uploaded to B2: {stem_name} -> {download_url}")
+                    return download_url
+                else:
+                    error_text = await response.text()
+                    print(f"❌ Error uploading stem {stem_name}: {response.status} - {error_text}")
+                    return ""
         
         except Exception as e:
             print(f"❌ Error uploading stem {stem_name}: {e}")
             return ""
-    
-    async def upload_all_stems_to_b2(self, stems: Dict[str, str], user_id: str, song_id: str) -> Dict[str, str]:
-        """Subir todas las pistas separadas a B2"""
-        print(f"🚀 Uploading all stems to B2 for song: {song_id}")
-        
-        b2_stems = {}
-        
-        # Subir cada pista en paralelo
-        upload_tasks = []
-        for stem_name, stem_path in stems.items():
-            if os.path.exists(stem_path):
-                task = self.upload_stem_to_b2(stem_path, user_id, song_id, stem_name)
-                upload_tasks.append((stem_name, task))
-        
-        # Esperar a que todas las subidas terminen
-        for stem_name, task in upload_tasks:
-            try:
-                b2_url = await task
-                if b2_url:
-                    b2_stems[stem_name] = b2_url
-                    print(f"✅ {stem_name} uploaded to B2: {b2_url}")
-                else:
-                    print(f"❌ Failed to upload {stem_name}")
-            except Exception as e:
-                print(f"❌ Error uploading {stem_name}: {e}")
         
-        print(f"🎵 Upload complete. {len(b2_stems)} stems uploaded to B2")
-        return b2_stems
+        finally:
+            for stream in opened:
+                stream.close()
+            if stats is not None:
+                stats[stem_name] = {"bytes": size, "seconds": round(time.perf_counter() - start, 3), "mode": self.mode}
 
 # Instancia global
 b2_uploader = B2Uploader()
@@ -0,0 +1,48 @@
+"""
+Benchmark - Acordes a resolución de frame vs. cromagrama sincronizado con los beats
+
+Run from backend/:  python -m benchmarks.beat_sync_chords --seconds 240
+Chroma and beat tracking are computed once and shared; the timings cover
+segmentation/decoding and template scoring only.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import soundfile as sf
+
+from benchmarks.common import best_of, synthetic_song
+from chord_analyzer import AnalysisSession, ChordAnalyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=240.0)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        track = Path(tmp) / "track.wav"
+        sf.write(str(track), synthetic_song(args.seconds), 22050)
+
+        session = AnalysisSession(str(track))
+        start = time.perf_counter()
+        session.chroma, session.beats
+        shared = time.perf_counter() - start
+
+        print(f"{args.seconds:.0f}s track, {session.chroma.shape[1]} frames, {len(session.beats[1])} beats "
+              f"(chroma + beat tracking, shared: {shared:.2f}s)")
+        for method in ("segments", "viterbi"):
+            frame_time, frame_chords = best_of(args.runs, ChordAnalyzer(method=method, resolution="frame").chords_from_session, session)
+            print(f"  {method:8s} frame:      {frame_time * 1000:8.1f} ms, {len(frame_chords)} chords")
+            for subdivisions in (1, 2):
+                analyzer = ChordAnalyzer(method=method, resolution="beat", subdivisions=subdivisions)
+                beat_time, beat_chords = best_of(args.runs, analyzer.chords_from_session, session)
+                print(f"  {method:8s} beat/{subdivisions}:     {beat_time * 1000:8.1f} ms, {len(beat_chords)} chords "
+                      f"({frame_time / beat_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
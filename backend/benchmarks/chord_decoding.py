@@ -0,0 +1,56 @@
+"""
+Benchmark - Decodificación de acordes: segmentación por cambios de croma vs. Viterbi por frame
+
+Run from backend/:  python -m benchmarks.chord_decoding --minutes 10
+"""
+
+import argparse
+
+import numpy as np
+
+from benchmarks.common import best_of
+from chord_analyzer import ChordAnalyzer
+
+SR = 22050
+HOP_LENGTH = 512
+
+
+def synthetic_chroma(minutes: float, chord_seconds: float = 2.0) -> np.ndarray:
+    """A noisy I-V-vi-IV progression at librosa's frame rate"""
+    rng = np.random.default_rng(0)
+    n_frames = int(minutes * 60 * SR / HOP_LENGTH)
+    frames_per_chord = int(chord_seconds * SR / HOP_LENGTH)
+    progression = [[0, 4, 7], [7, 11, 2], [9, 0, 4], [5, 9, 0]]
+    chroma = 0.3 * rng.random((12, n_frames))
+    for start in range(0, n_frames, frames_per_chord):
+        notes = progression[(start // frames_per_chord) % len(progression)]
+        chroma[notes, start:start + frames_per_chord] += 0.7
+    return chroma
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, default=10.0)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    chroma = synthetic_chroma(args.minutes)
+    frame_times = np.arange(chroma.shape[1] + 1) * HOP_LENGTH / SR
+    segments_analyzer = ChordAnalyzer(method="segments")
+    viterbi_analyzer = ChordAnalyzer(method="viterbi")
+
+    def run_segments():
+        segments = segments_analyzer._detect_chord_segments(chroma, SR, HOP_LENGTH)
+        return segments_analyzer._analyze_chord_segments(chroma, segments, frame_times)
+
+    segments_time, segment_chords = best_of(args.runs, run_segments)
+    viterbi_time, viterbi_chords = best_of(args.runs, viterbi_analyzer._decode_chords, chroma, frame_times)
+
+    print(f"{args.minutes:.0f} min, {chroma.shape[1]} frames x {len(viterbi_analyzer.chord_labels)} chords (best of {args.runs})")
+    print(f"  segments: {segments_time * 1000:.1f} ms, {len(segment_chords)} chords")
+    print(f"  viterbi:  {viterbi_time * 1000:.1f} ms, {len(viterbi_chords)} chords "
+          f"(expected ~{int(args.minutes * 30)} changes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark - Búsqueda de acordes: bucle de plantillas por segmento vs. matriz precalculada
+
+Run from backend/:  python -m benchmarks.chord_templates --segments 500
+"""
+
+import argparse
+
+import numpy as np
+
+from benchmarks.common import best_of
+from chord_analyzer import ChordAnalyzer
+
+
+def legacy_find_best_chord(analyzer: ChordAnalyzer, chroma_vector: np.ndarray):
+    """The 12 x chord-types loop _find_best_chord ran before the template matrix"""
+    best_chord = "C"
+    best_score = 0.0
+    for root_idx in range(12):
+        for chord_type, intervals in analyzer.chord_types.items():
+            chord_template = np.zeros(12)
+            for interval in intervals:
+                chord_template[(root_idx + interval) % 12] = 1.0
+            similarity = np.dot(chroma_vector, chord_template) / (np.linalg.norm(chroma_vector) * np.linalg.norm(chord_template))
+            if similarity > best_score:
+                best_score = similarity
+                root_note = analyzer.note_names[root_idx]
+                best_chord = f"{root_note} {chord_type}" if chord_type != 'major' else root_note
+    return best_chord, best_score
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--segments", type=int, default=500)
+    parser.add_argument("--frames-per-segment", type=int, default=43, help="~0.5s at 22050 Hz / hop 512")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    analyzer = ChordAnalyzer()
+    rng = np.random.default_rng(0)
+    chroma = rng.random((12, args.segments * args.frames_per_segment))
+    segments = [(i * args.frames_per_segment, (i + 1) * args.frames_per_segment) for i in range(args.segments)]
+    frame_times = np.arange(chroma.shape[1] + 1) * 512 / 22050
+    means = [chroma[:, start:end].mean(axis=1) for start, end in segments]
+
+    # Same labels and scores as the loop it replaces
+    for vector in means:
+        expected_chord, expected_score = legacy_find_best_chord(analyzer, vector)
+        chord, score = analyzer._find_best_chord(vector)
+        assert chord == expected_chord and np.isclose(score, expected_score), (chord, expected_chord)
+
+    before, _ = best_of(args.runs, lambda: [legacy_find_best_chord(analyzer, v) for v in means])
+    per_vector, _ = best_of(args.runs, lambda: [analyzer._find_best_chord(v) for v in means])
+    batched, _ = best_of(args.runs, analyzer._analyze_chord_segments, chroma, segments, frame_times)
+
+    print(f"{args.segments} segments x {len(analyzer.chord_labels)} chord templates (best of {args.runs})")
+    print(f"  before (template loop per segment):  {before * 1000:.1f} ms")
+    print(f"  after  (matrix, one call per segment): {per_vector * 1000:.1f} ms  ({before / per_vector:.1f}x)")
+    print(f"  after  (all segments in one matmul):   {batched * 1000:.1f} ms  ({before / batched:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
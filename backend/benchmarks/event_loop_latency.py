@@ -0,0 +1,75 @@
+"""
+Benchmark - Latencia de /api/health mientras se generan las pistas extendidas
+
+Run from backend/:  python -m benchmarks.event_loop_latency --seconds 240 --max-p99-ms 50
+Exits non-zero when the p99 latency exceeds the limit.
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+import soundfile as sf
+
+from main import app
+from audio_processor_real import audio_processor
+
+
+def percentile(values, q: float) -> float:
+    return float(np.percentile(np.array(values), q)) if values else 0.0
+
+
+async def probe_health(client: httpx.AsyncClient, done: asyncio.Event, interval: float):
+    latencies = []
+    while not done.is_set():
+        start = time.perf_counter()
+        response = await client.get("/api/health")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def run(track: Path, interval: float):
+    done = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        prober = asyncio.create_task(probe_health(client, done, interval))
+        start = time.perf_counter()
+        stems = await audio_processor.create_extended_tracks(str(track), {})
+        elapsed = time.perf_counter() - start
+        done.set()
+        latencies = await prober
+    return stems, elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=240.0)
+    parser.add_argument("--interval", type=float, default=0.01, help="pause between health probes (s)")
+    parser.add_argument("--max-p99-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        track = Path(tmp) / "original.wav"
+        t = np.arange(int(args.seconds * 44100)) / 44100
+        sf.write(str(track), (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), 44100)
+
+        stems, elapsed, latencies = asyncio.run(run(track, args.interval))
+
+    p50, p99 = percentile(latencies, 50), percentile(latencies, 99)
+    print(f"Extended tracks: {len(stems)} in {elapsed:.2f}s")
+    print(f"/api/health during extraction: {len(latencies)} requests, "
+          f"p50 {p50:.1f} ms, p99 {p99:.1f} ms, max {max(latencies, default=0):.1f} ms")
+    if p99 > args.max_p99_ms:
+        print(f"FAIL: p99 above {args.max_p99_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
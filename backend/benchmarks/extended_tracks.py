@@ -0,0 +1,59 @@
+"""
+Benchmark - Etapa de pistas extendidas: antes (HPSS/pre-énfasis repetidos) vs. contexto compartido
+
+Run from backend/:  python -m benchmarks.extended_tracks --seconds 240
+"""
+
+import argparse
+import tempfile
+from pathlib import Path
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from analysis_context import AnalysisContext
+from audio_processor_real import AudioProcessor
+from benchmarks.common import best_of, synthetic_song
+
+
+def legacy_extended_tracks(audio: np.ndarray, sr: int, output_dir: Path):
+    """The per-extractor work create_extended_tracks did before the shared context"""
+    y_harmonic, _ = librosa.effects.hpss(audio)
+    sf.write(str(output_dir / "piano.wav"), librosa.effects.preemphasis(y_harmonic), sr)
+    librosa.feature.chroma_stft(y=audio, sr=sr)
+    sf.write(str(output_dir / "guitar.wav"), librosa.effects.preemphasis(audio), sr)
+    sf.write(str(output_dir / "strings.wav"), librosa.effects.preemphasis(audio), sr)
+    sf.write(str(output_dir / "brass.wav"), librosa.effects.preemphasis(audio), sr)
+    _, y_percussive = librosa.effects.hpss(audio)
+    sf.write(str(output_dir / "percussion.wav"), y_percussive, sr)
+    sf.write(str(output_dir / "synth.wav"), librosa.effects.preemphasis(audio), sr)
+
+
+def shared_extended_tracks(processor: AudioProcessor, audio: np.ndarray, sr: int, output_dir: Path):
+    ctx = AnalysisContext(audio, sr)
+    for extract in (processor.extract_piano, processor.extract_guitar, processor.extract_strings,
+                    processor.extract_brass, processor.extract_percussion, processor.extract_synth):
+        extract(ctx, output_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=240.0)
+    parser.add_argument("--sr", type=int, default=44100)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    audio = synthetic_song(args.seconds, args.sr, noise=0.02)
+    processor = AudioProcessor()
+    with tempfile.TemporaryDirectory() as tmp:
+        before, _ = best_of(args.runs, legacy_extended_tracks, audio, args.sr, Path(tmp))
+        after, _ = best_of(args.runs, shared_extended_tracks, processor, audio, args.sr, Path(tmp))
+
+    print(f"{args.seconds:.0f}s signal at {args.sr} Hz (best of {args.runs})")
+    print(f"  before (per-extractor HPSS/pre-emphasis): {before:.2f}s")
+    print(f"  after  (shared AnalysisContext):          {after:.2f}s  ({before / after:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
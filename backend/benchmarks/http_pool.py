@@ -0,0 +1,143 @@
+"""
+Benchmark - Subidas de stems: una ClientSession por petición vs. el cliente HTTP compartido
+
+Run from backend/:  python -m benchmarks.http_pool --requests 200 --size-kb 256
+Starts a local stand-in for the B2 upload proxy and counts the TCP connections
+it accepts in each mode. Use --tls to include TLS handshakes (self-signed cert,
+needs the `cryptography` package).
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import ssl
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from http_client import HttpClient
+
+
+class StandIn:
+    """Minimal /api/upload that reads the multipart body and answers like the proxy"""
+
+    def __init__(self):
+        self.transports = set()
+
+    async def upload(self, request: web.Request) -> web.Response:
+        # Keep-alive requests arrive on the same transport: distinct transports = TCP connections
+        self.transports.add(request.transport)
+        reader = await request.multipart()
+        async for part in reader:
+            while await part.read_chunk():
+                pass
+        return web.json_response({"downloadUrl": "http://stand-in/file.wav"})
+
+    async def start(self, ssl_context=None):
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_post("/api/upload", self.upload)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0, ssl_context=ssl_context)
+        await site.start()
+        port = runner.addresses[0][1]
+        return runner, port
+
+
+def self_signed_context(directory: str):
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.utcnow()
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256()))
+    cert_path, key_path = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+def form(payload: bytes, index: int) -> aiohttp.FormData:
+    data = aiohttp.FormData()
+    data.add_field("file", payload, filename=f"stem{index}.wav", content_type="audio/wav")
+    data.add_field("trackName", f"stem{index}")
+    return data
+
+
+async def session_per_request(url: str, payload: bytes, requests: int, concurrency: int, client_kwargs: dict):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(url, data=form(payload, i), **client_kwargs) as response:
+                    await response.json()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+
+
+async def shared_client(url: str, payload: bytes, requests: int, concurrency: int, client_kwargs: dict):
+    client = HttpClient(limit_per_host=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            async with client.request("POST", url, data=lambda: form(payload, i), **client_kwargs) as response:
+                await response.json()
+    try:
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    finally:
+        await client.close()
+
+
+async def run(args):
+    payload = os.urandom(args.size_kb * 1024)
+    with tempfile.TemporaryDirectory() as tmp:
+        server_ssl = self_signed_context(tmp) if args.tls else None
+        client_kwargs = {"ssl": False} if args.tls else {}  # self-signed: skip verification
+        stand_in = StandIn()
+        runner, port = await stand_in.start(server_ssl)
+        url = f"{'https' if args.tls else 'http'}://127.0.0.1:{port}/api/upload"
+        try:
+            results = {}
+            for name, mode in (("session per request", session_per_request), ("shared client", shared_client)):
+                stand_in.transports.clear()
+                start = time.perf_counter()
+                await mode(url, payload, args.requests, args.concurrency, client_kwargs)
+                results[name] = (time.perf_counter() - start, len(stand_in.transports))
+        finally:
+            await runner.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--tls", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"{args.requests} uploads of {args.size_kb} KB, concurrency {args.concurrency}"
+          f"{' over TLS' if args.tls else ''}")
+    baseline = results["session per request"][0]
+    for name, (elapsed, connections) in results.items():
+        print(f"  {name:20s} {elapsed:6.2f}s  {args.requests / elapsed:7.1f} req/s  "
+              f"{connections:4d} connections  ({baseline / elapsed:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark - Tiempo de separación de una pista vs. número de workers
+
+Run from backend/:  python -m benchmarks.parallel_separation --workers 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import soundfile as sf
+
+from benchmarks.common import synthetic_song
+from demucs_worker import DemucsWorkerPool
+from segmented_separation import separate_parallel
+
+
+async def run(pool: DemucsWorkerPool, track: Path, out_dir: Path) -> float:
+    start = time.perf_counter()
+    await separate_parallel(str(track), out_dir, pool, pool.num_workers)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=300.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        track = Path(tmp) / "synthetic.wav"
+        sf.write(str(track), synthetic_song(args.seconds, 44100, noise=0.02, stereo=True), 44100)
+
+        print(f"{'workers':>8} {'wall (s)':>10} {'speedup':>8}")
+        baseline = None
+        for workers in args.workers:
+            pool = DemucsWorkerPool(num_workers=workers)
+            pool.start()
+            try:
+                if not pool.wait_ready(timeout=600):
+                    raise SystemExit(f"Demucs workers failed to start: {pool.failed_reason}")
+                # Wait for every worker so model loading is not part of the measurement
+                while len(pool.load_times) < workers:
+                    time.sleep(0.1)
+                wall = asyncio.run(run(pool, track, Path(tmp) / f"out_{workers}"))
+            finally:
+                pool.stop()
+            baseline = baseline or wall
+            print(f"{workers:>8} {wall:>10.2f} {baseline / wall:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
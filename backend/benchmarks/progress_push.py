@@ -0,0 +1,83 @@
+"""
+Benchmark - Progreso: polling de /status cada segundo vs. eventos SSE coalescidos (ProgressEvents)
+
+Run from backend/:  python -m benchmarks.progress_push --clients 500 --seconds 20 --updates-per-second 50
+Simulates one job whose progress is written `--updates-per-second` times (Demucs
+segments, stem states) and counts what reaches the clients in each mode.
+"""
+
+import argparse
+import asyncio
+
+from progress_events import ProgressEvents
+
+
+async def run_job(state, events: ProgressEvents, seconds: float, rate: float):
+    steps = int(seconds * rate)
+    for step in range(1, steps + 1):
+        await asyncio.sleep(1 / rate)
+        state["progress"] = int(100 * step / steps)
+        events.notify("job")
+    state["status"] = "completed"
+    events.notify("job")
+
+
+async def polling(args):
+    state = {"status": "processing", "progress": 0}
+    events = ProgressEvents()
+    requests = 0
+
+    async def client():
+        nonlocal requests
+        while True:
+            requests += 1
+            if state["status"] == "completed":
+                return
+            await asyncio.sleep(args.poll)
+
+    await asyncio.gather(run_job(state, events, args.seconds, args.rate), *(client() for _ in range(args.clients)))
+    return requests
+
+
+async def pushing(args):
+    state = {"status": "processing", "progress": 0}
+    events = ProgressEvents(interval=args.interval)
+    frames = 0
+
+    async def snapshot():
+        return dict(state)
+
+    async def client():
+        nonlocal frames
+        async for frame in events.stream("job", snapshot):
+            if frame.startswith("data:"):
+                frames += 1
+
+    clients = [asyncio.ensure_future(client()) for _ in range(args.clients)]
+    await run_job(state, events, args.seconds, args.rate)
+    await asyncio.gather(*clients)
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--updates-per-second", dest="rate", type=float, default=50.0)
+    parser.add_argument("--poll", type=float, default=1.0)
+    parser.add_argument("--interval", type=float, default=0.25)
+    args = parser.parse_args()
+
+    requests = asyncio.run(polling(args))
+    frames = asyncio.run(pushing(args))
+    writes = int(args.seconds * args.rate)
+
+    print(f"{args.clients} clients, {args.seconds:.0f}s job, {writes} progress writes")
+    print(f"  polling every {args.poll:.1f}s      {requests:7d} HTTP requests  "
+          f"({requests / args.clients:.0f} per client, progress at most {args.poll:.2f}s old)")
+    print(f"  SSE, {args.interval:.2f}s coalescing  {args.clients:7d} HTTP requests  "
+          f"({frames / args.clients:.0f} events per client, progress at most {args.interval:.2f}s old)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark - Publicación de stems: por lotes (separar todo, codificar todo, subir todo) vs. pipeline por stem
+
+Run from backend/:  python -m benchmarks.progressive_stems --stems 7 --separate 2.0 --encode 1.0 --upload 1.5
+Stage durations are simulated (seconds, scaled by --scale), so this measures the
+scheduling only: time until the first stem is playable and until the last one is.
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from models import ProcessingTask, TaskStatus
+from stem_pipeline import StemPipeline
+
+
+class SimulatedEncoder:
+    def __init__(self, seconds: float, workers: int):
+        self.seconds = seconds
+        self.workers = workers
+        self.slots = asyncio.Semaphore(workers)
+
+    async def encode_stem(self, stem_name, stem_path, output_dir, semaphore=None):
+        async with semaphore:
+            await asyncio.sleep(self.seconds)
+        return {"aac": stem_path}
+
+    def write_manifest(self, path, stems, renditions):
+        return {}
+
+
+class SimulatedUploader:
+    def __init__(self, seconds: float, concurrency: int):
+        self.seconds = seconds
+        self.concurrency = concurrency
+        self.slots = asyncio.Semaphore(concurrency)
+
+    async def upload_stem_to_b2(self, file_path, user_id, song_id, stem_name, stats=None):
+        await asyncio.sleep(self.seconds)
+        if stats is not None:
+            stats[stem_name] = {"bytes": 0, "seconds": self.seconds}
+        return f"https://stand-in/{stem_name}"
+
+
+async def separate(paths, seconds: float, on_stem=None):
+    """Stems become final one after another (Demucs sources, then mixdown/extended tracks)"""
+    for name, path in paths.items():
+        await asyncio.sleep(seconds)
+        if on_stem:
+            on_stem(name, path)
+    return paths
+
+
+async def batch(paths, args, first_ready):
+    start = time.perf_counter()
+    await separate(paths, args.separate)
+    encoder = SimulatedEncoder(args.encode, args.workers)
+    slots = asyncio.Semaphore(args.workers)
+    await asyncio.gather(*(encoder.encode_stem(name, path, None, slots) for name, path in paths.items()))
+    uploader = SimulatedUploader(args.upload, args.concurrency)
+    upload_slots = asyncio.Semaphore(args.concurrency)
+
+    async def upload(name, path):
+        async with upload_slots:
+            await uploader.upload_stem_to_b2(path, "system", "bench", name)
+            first_ready.setdefault("batch", time.perf_counter() - start)
+    await asyncio.gather(*(upload(name, path) for name, path in paths.items()))
+    return time.perf_counter() - start
+
+
+async def progressive(paths, args, first_ready, tmp: Path):
+    start = time.perf_counter()
+    task = ProcessingTask(id="bench", file_path=str(tmp / "input.wav"), status=TaskStatus.PROCESSING)
+
+    def publish():
+        if task.stems:
+            first_ready.setdefault("pipeline", time.perf_counter() - start)
+    pipeline = StemPipeline(task, tmp / "renditions", publish,
+                            encoder=SimulatedEncoder(args.encode, args.workers),
+                            uploader=SimulatedUploader(args.upload, args.concurrency))
+    await separate(paths, args.separate, pipeline.add)
+    await pipeline.finish()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stems", type=int, default=7)
+    parser.add_argument("--separate", type=float, default=2.0, help="seconds between finished stems")
+    parser.add_argument("--encode", type=float, default=1.0)
+    parser.add_argument("--upload", type=float, default=1.5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--scale", type=float, default=0.1)
+    args = parser.parse_args()
+    for name in ("separate", "encode", "upload"):
+        setattr(args, name, getattr(args, name) * args.scale)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        paths = {}
+        for i in range(args.stems):
+            path = tmp / f"stem{i}.wav"
+            path.write_bytes(b"")
+            paths[f"stem{i}"] = str(path)
+
+        first_ready = {}
+        batch_total = asyncio.run(batch(paths, args, first_ready))
+        pipeline_total = asyncio.run(progressive(paths, args, first_ready, tmp))
+
+    print(f"{args.stems} stems (times scaled by {args.scale})")
+    print(f"  batch     first playable {first_ready['batch']:6.2f}s  all ready {batch_total:6.2f}s")
+    print(f"  pipeline  first playable {first_ready['pipeline']:6.2f}s  all ready {pipeline_total:6.2f}s  "
+          f"({first_ready['batch'] / first_ready['pipeline']:.2f}x sooner)")
+
+
+if __name__ == "__main__":
+    main()
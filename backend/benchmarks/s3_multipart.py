@@ -0,0 +1,106 @@
+"""
+Benchmark - Subida multipart directa (S3Uploader) contra un S3 local, con fallos de parte inyectados
+
+Run from backend/:  python -m benchmarks.s3_multipart --size-mb 200 --fail-rate 0.1
+Without --endpoint a moto server is started in-process (pip install "moto[server]");
+any S3-compatible stand-in works, e.g. MinIO:  --endpoint http://127.0.0.1:9000
+Verifies the uploaded object byte for byte and exits non-zero on a mismatch.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+from s3_client import S3Uploader
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def flaky(uploader: S3Uploader, fail_rate: float):
+    """Make a share of upload_part calls fail, as a dropped connection would"""
+    put_part = uploader._put_part
+    failures = {"count": 0}
+
+    def maybe_fail(*args):
+        if random.random() < fail_rate:
+            failures["count"] += 1
+            raise ConnectionError("injected part failure")
+        return put_part(*args)
+    uploader._put_part = maybe_fail
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--endpoint", default="")
+    parser.add_argument("--bucket", default="moises-bench")
+    parser.add_argument("--size-mb", type=int, default=200)
+    parser.add_argument("--part-mb", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if not endpoint:
+        from moto.server import ThreadedMotoServer
+        server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+        server.start()
+        host, port = server.get_host_and_port()
+        endpoint = f"http://{host}:{port}"
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "stem.wav")
+            with open(path, "wb") as f:
+                for _ in range(args.size_mb):
+                    f.write(os.urandom(1 << 20))
+            expected = sha256_file(path)
+
+            print(f"{args.size_mb} MB in {args.part_mb} MB parts against {endpoint}"
+                  f"{f', {args.fail_rate:.0%} of part attempts failing' if args.fail_rate else ''}")
+            ok = True
+            for concurrency in args.concurrency:
+                uploader = S3Uploader(endpoint=endpoint, bucket=args.bucket, region="us-east-1",
+                                      key_id=os.getenv("AWS_ACCESS_KEY_ID", "bench"),
+                                      key=os.getenv("AWS_SECRET_ACCESS_KEY", "bench"),
+                                      part_size=args.part_mb * 1024 * 1024, part_concurrency=concurrency, acl="")
+                try:
+                    uploader.client.create_bucket(Bucket=args.bucket)
+                except Exception:
+                    pass  # already exists
+                failures = flaky(uploader, args.fail_rate)
+
+                key = f"bench/{concurrency}/stem.wav"
+                start = time.perf_counter()
+                asyncio.run(uploader.upload_file(path, key, "audio/wav"))
+                elapsed = time.perf_counter() - start
+
+                downloaded = os.path.join(tmp, f"check-{concurrency}.wav")
+                uploader.client.download_file(args.bucket, key, downloaded)
+                matches = sha256_file(downloaded) == expected
+                ok = ok and matches
+                os.remove(downloaded)
+                print(f"  {concurrency} parallel parts: {elapsed:6.2f}s  {args.size_mb / elapsed:7.1f} MB/s  "
+                      f"{failures['count']} injected failures  {'OK' if matches else 'MISMATCH'}")
+    finally:
+        if server is not None:
+            server.stop()
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
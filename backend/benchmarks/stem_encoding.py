@@ -0,0 +1,65 @@
+"""
+Benchmark - Etapa de codificación de stems: ffmpeg en serie vs. en paralelo, y tamaño de cada rendition
+
+Run from backend/:  python -m benchmarks.stem_encoding --stems 4 --seconds 240 --workers 1 4
+Needs ffmpeg on PATH (with libopus for the Opus rendition).
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import soundfile as sf
+
+from benchmarks.common import synthetic_song
+from stem_encoder import StemEncoder, DELIVERY_FORMATS, MANIFEST
+
+
+async def encode_all(encoder: StemEncoder, stems, output_dir: Path):
+    """As StemPipeline does: every stem at once, ffmpeg processes bounded by the encoder's shared slots"""
+    encoded = await asyncio.gather(*(encoder.encode_stem(name, path, output_dir, encoder.slots)
+                                     for name, path in stems.items()))
+    return {name: formats for name, formats in zip(stems, encoded) if formats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stems", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=240.0)
+    parser.add_argument("--sr", type=int, default=44100)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--formats", default=",".join(DELIVERY_FORMATS))
+    args = parser.parse_args()
+    formats = tuple(args.formats.split(","))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        stems = {}
+        for i in range(args.stems):
+            path = tmp / f"stem{i}.wav"
+            sf.write(str(path), synthetic_song(args.seconds, args.sr, noise=0.02, stereo=True, seed=i), args.sr, subtype="PCM_16")
+            stems[f"stem{i}"] = str(path)
+
+        print(f"{args.stems} stems x {args.seconds:.0f}s -> {', '.join(formats)}")
+        baseline = None
+        for workers in args.workers:
+            encoder = StemEncoder(formats=formats, workers=workers)
+            output_dir = tmp / f"out{workers}"
+            start = time.perf_counter()
+            renditions = asyncio.run(encode_all(encoder, stems, output_dir))
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"  {workers} workers: {elapsed:6.2f}s  ({baseline / elapsed:.2f}x)")
+
+        manifest = encoder.write_manifest(output_dir / MANIFEST, stems, renditions)
+        source = sum(entry["source_bytes"] for entry in manifest.values())
+        print(f"  WAV: {source / 1e6:8.1f} MB")
+        for fmt in formats:
+            size = sum(entry["formats"][fmt]["bytes"] for entry in manifest.values() if fmt in entry["formats"])
+            print(f"  {fmt:4s} {size / 1e6:8.1f} MB  ({100 * size / source:5.1f}% of WAV)")
+
+
+if __name__ == "__main__":
+    main()
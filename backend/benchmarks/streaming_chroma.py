@@ -0,0 +1,96 @@
+"""
+Benchmark - Análisis por bloques (memoria acotada) vs. librosa.load + cromagrama completo
+
+Run from backend/:  python -m benchmarks.streaming_chroma --seconds 600
+Checks that the streaming path matches the batch path within tolerance and
+reports peak Python memory of each. Exits non-zero on a mismatch.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from benchmarks.common import synthetic_song
+from chord_analyzer import AnalysisSession, ChordAnalyzer
+from streaming_chroma import StreamingChroma, read_mono_blocks
+
+SR = 22050
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def streaming_chroma(path: str) -> np.ndarray:
+    stream = StreamingChroma(SR)
+    blocks = []
+    for samples in read_mono_blocks(path, SR):
+        blocks.extend(stream.push(samples))
+    blocks.extend(stream.finish())
+    return np.concatenate(blocks, axis=1)
+
+
+def label_agreement(a, b, duration: float, step: float = 0.1) -> float:
+    """Fraction of time points where both chord lists give the same label"""
+    def labels(chords):
+        points = np.arange(0, duration, step)
+        out = np.full(len(points), "", dtype=object)
+        for chord in chords:
+            out[(points >= chord.start_time) & (points < chord.end_time)] = chord.chord
+        return out
+    return float(np.mean(labels(a) == labels(b)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=600.0)
+    parser.add_argument("--max-chroma-error", type=float, default=0.01, help="mean absolute difference")
+    parser.add_argument("--min-chord-agreement", type=float, default=0.95)
+    args = parser.parse_args()
+
+    analyzer = ChordAnalyzer(method="viterbi", resolution="frame")
+    with tempfile.TemporaryDirectory() as tmp:
+        track = str(Path(tmp) / "rehearsal.wav")
+        # Written at 44.1 kHz so the resampler is exercised
+        sf.write(track, synthetic_song(args.seconds, 44100, stereo=True), 44100)
+
+        batch_chroma = AnalysisSession(track).chroma
+        stream_chroma = streaming_chroma(track)
+
+        session = AnalysisSession(track)
+        batch, batch_time, batch_peak = measure(
+            lambda: (analyzer.chords_from_session(session), analyzer.key_from_session(session)))
+        stream, stream_time, stream_peak = measure(lambda: analyzer.analyze_all_streaming(track))
+
+    frames = min(batch_chroma.shape[1], stream_chroma.shape[1])
+    chroma_error = float(np.mean(np.abs(batch_chroma[:, :frames] - stream_chroma[:, :frames])))
+    agreement = label_agreement(batch[0], stream["chords"], args.seconds)
+
+    print(f"{args.seconds:.0f}s stereo 44.1 kHz track")
+    print(f"  frames: batch {batch_chroma.shape[1]}, streaming {stream_chroma.shape[1]}")
+    print(f"  chroma mean abs difference: {chroma_error:.5f}")
+    print(f"  key: batch {batch[1].key}, streaming {stream['key'].key if stream['key'] else None}")
+    print(f"  chord label agreement: {agreement * 100:.1f}%")
+    print(f"  batch:     {batch_time:.2f}s, peak {batch_peak:.0f} MB")
+    print(f"  streaming: {stream_time:.2f}s, peak {stream_peak:.0f} MB")
+
+    if (batch_chroma.shape[1] != stream_chroma.shape[1] or chroma_error > args.max_chroma_error
+            or agreement < args.min_chord_agreement):
+        print("FAIL: streaming path differs from the batch path")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
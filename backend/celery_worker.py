@@ -0,0 +1,75 @@
+"""
+Celery Worker - Ejecuta separaciones y análisis de acordes en workers externos
+
+Start with (from backend/):
+    celery -A celery_worker worker -Q separation,analysis --pool threads --concurrency 2
+
+Threads (or --pool solo) keep the Demucs worker pool usable: prefork children are
+daemonic and cannot spawn the pool's own processes.
+
+For local testing without Redis set CELERY_BROKER_URL=memory:// and
+CELERY_TASK_ALWAYS_EAGER=1; tasks then run inline in the API process.
+"""
+
+import os
+import asyncio
+
+from celery import Celery
+from celery.signals import worker_init, worker_shutdown
+
+from task_store import task_store, REDIS_URL
+from http_client import closing_client
+
+BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL)
+RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "")
+ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "0") == "1"
+
+celery_app = Celery("moises", broker=BROKER_URL, backend=RESULT_BACKEND or None)
+celery_app.conf.update(
+    task_always_eager=ALWAYS_EAGER,
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    task_routes={
+        "moises.separate": {"queue": "separation"},
+        "moises.analyze_chords": {"queue": "analysis"},
+    },
+    broker_transport_options={"queue_order_strategy": "priority"},
+)
+
+
+@worker_init.connect
+def start_demucs_pool(**kwargs):
+    from demucs_worker import demucs_pool
+    demucs_pool.start()
+
+
+@worker_shutdown.connect
+def stop_demucs_pool(**kwargs):
+    from demucs_worker import demucs_pool
+    demucs_pool.stop()
+    task_store.close()
+
+
+@celery_app.task(name="moises.separate")
+def separate_task(task_id: str, custom_tracks=None, hi_fi: bool = False, mode: str = "standard", cache_key=None):
+    """Run the separation pipeline for a task stored by an API node"""
+    # Imported here: main imports this module, and workers only need the pipeline functions
+    from main import process_audio
+
+    task = task_store.get(task_id)
+    if task is None:
+        print(f"Task {task_id} not found in task store")
+        return
+    asyncio.run(closing_client(process_audio(task, custom_tracks, hi_fi, mode, cache_key)))
+
+
+@celery_app.task(name="moises.analyze_chords")
+def analyze_chords_task(task_id: str):
+    """Run chord/key analysis for a task stored by an API node"""
+    from main import process_chord_analysis
+
+    task = task_store.get(task_id)
+    if task is None:
+        print(f"Task {task_id} not found in task store")
+        return
+    asyncio.run(closing_client(process_chord_analysis(task)))
@@ -3,12 +3,29 @@ Chord Analyzer - Detección de acordes y análisis de tonalidad
 Basado en las funcionalidades de Moises.ai
 """
 
+import os
 import librosa
 import numpy as np
+import soundfile as sf
 from typing import Dict, List, Tuple, Optional
 import json
 from dataclasses import dataclass
 
+from streaming_chroma import StreamingChroma, read_mono_blocks, STREAM_BLOCK_SECONDS
+
+# "viterbi": frame-level scores decoded as one chord sequence; "segments": chroma-change segmentation
+CHORD_METHOD = os.getenv("CHORD_METHOD", "viterbi")
+# Score a new chord must gain over the current one before the decoder switches
+CHORD_TRANSITION_PENALTY = float(os.getenv("CHORD_TRANSITION_PENALTY", "1.0"))
+# "frame": chroma at hop resolution; "beat": chroma aggregated per beat (or per sub-beat)
+CHORD_RESOLUTION = os.getenv("CHORD_RESOLUTION", "frame")
+CHORD_SUBDIVISIONS = int(os.getenv("CHORD_SUBDIVISIONS", "1"))
+# Ventana deslizante de la línea temporal de tonalidad
+KEY_WINDOW_SECONDS = float(os.getenv("KEY_WINDOW_SECONDS", "20"))
+KEY_HOP_SECONDS = float(os.getenv("KEY_HOP_SECONDS", "5"))
+# Archivos más largos que esto se analizan por bloques con memoria acotada (0 = siempre)
+STREAM_ANALYSIS_SECONDS = float(os.getenv("STREAM_ANALYSIS_SECONDS", "1200"))
+
 @dataclass
 class ChordInfo:
     chord: str
@@ -25,8 +42,213 @@ class KeyInfo:
     confidence: float
     tonic: str
 
+@dataclass
+class KeySegment:
+    key: str
+    mode: str  # major, minor
+    confidence: float
+    tonic: str
+    start_time: float
+    end_time: float
+
+class AnalysisSession:
+    """
+    Decodifica el audio una sola vez y cachea las representaciones intermedias
+    (señal remuestreada, cromagrama, envolvente de onsets, beats) para que
+    acordes, tonalidad y tempo se deriven de los mismos datos
+    """
+    
+    def __init__(self, audio_path: str, sr: int = 22050, hop_length: int = 512,
+                 audio: Optional[Tuple[np.ndarray, int]] = None):
+        self.audio_path = audio_path
+        self.target_sr = sr
+        self.hop_length = hop_length
+        # (y, sr) ya decodificado por otra etapa del trabajo: se remuestrea en vez de volver a leer el archivo
+        self._audio = audio
+        self._y = None
+        self._sr = None
+        self._chroma = None
+        self._onset_env = None
+        self._beats = None
+    
+    def _load(self):
+        if self._y is None:
+            if self._audio is not None:
+                y, orig_sr = self._audio
+                y = librosa.to_mono(y)
+                # Mismo remuestreador que librosa.load usa por defecto
+                self._y = librosa.resample(y, orig_sr=orig_sr, target_sr=self.target_sr) if orig_sr != self.target_sr else y
+                self._sr = self.target_sr
+                self._audio = None
+            else:
+                self._y, self._sr = librosa.load(self.audio_path, sr=self.target_sr)
+    
+    @property
+    def y(self) -> np.ndarray:
+        self._load()
+        return self._y
+    
+    @property
+    def sr(self) -> int:
+        self._load()
+        return self._sr
+    
+    @property
+    def duration(self) -> float:
+        return len(self.y) / self.sr
+    
+    @property
+    def chroma(self) -> np.ndarray:
+        if self._chroma is None:
+            self._chroma = librosa.feature.chroma_stft(y=self.y, sr=self.sr, hop_length=self.hop_length)
+        return self._chroma
+    
+    @property
+    def onset_env(self) -> np.ndarray:
+        if self._onset_env is None:
+            self._onset_env = librosa.onset.onset_strength(y=self.y, sr=self.sr, hop_length=self.hop_length)
+        return self._onset_env
+    
+    @property
+    def beats(self) -> Tuple[float, np.ndarray]:
+        """(tempo in BPM, beat frame indices)"""
+        if self._beats is None:
+            tempo, beat_frames = librosa.beat.beat_track(
+                onset_envelope=self.onset_env, sr=self.sr, hop_length=self.hop_length
+            )
+            self._beats = (float(np.atleast_1d(tempo)[0]), beat_frames)
+        return self._beats
+    
+    @property
+    def beat_times(self) -> np.ndarray:
+        return librosa.frames_to_time(self.beats[1], sr=self.sr, hop_length=self.hop_length)
+    
+    def beat_chroma(self, subdivisions: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cromagrama agregado (mediana) entre beats consecutivos, opcionalmente subdividido.
+        Devuelve (croma (12, n), fronteras en frames (n + 1,))
+        """
+        chroma = self.chroma
+        beat_frames = np.asarray(self.beats[1], dtype=float)
+        if subdivisions > 1 and len(beat_frames) > 1:
+            # Puntos intermedios repartidos uniformemente dentro de cada beat
+            steps = np.arange(subdivisions) / subdivisions
+            beat_frames = (beat_frames[:-1, None] + np.diff(beat_frames)[:, None] * steps).ravel()
+            beat_frames = np.append(beat_frames, self.beats[1][-1])
+        boundaries = librosa.util.fix_frames(np.round(beat_frames).astype(int), x_min=0, x_max=chroma.shape[1])
+        return librosa.util.sync(chroma, boundaries, aggregate=np.median), boundaries
+
+class StreamingViterbi:
+    """
+    Viterbi con transición uniforme: quedarse cuesta 0, cambiar de acorde cuesta `penalty`.
+    
+    Con esa transición el mejor predecesor de cada estado es él mismo o el mejor
+    estado global, así que cada frame cuesta O(acordes) en operaciones NumPy y los
+    backpointers son una matriz booleana más un índice por frame.
+    
+    Las puntuaciones se pueden pasar por bloques: en cuanto los caminos de todos los
+    estados confluyen, el tramo anterior ya es definitivo y se devuelve (y se libera).
+    `max_lag` fuerza la decisión si no confluyen durante demasiados frames.
+    """
+    
+    def __init__(self, penalty: float, max_lag: Optional[int] = 4096):
+        self.penalty = penalty
+        self.max_lag = max_lag
+        self._delta = None
+        self._stay = None       # (pendientes, n_chords): el estado viene de sí mismo
+        self._best_prev = None  # (pendientes,): si no, viene de este
+        self._scores = None     # (pendientes, n_chords)
+    
+    def push(self, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Añade puntuaciones (n_chords, n). Devuelve (estados, puntuación de cada estado) ya decididos
+        """
+        frame_scores = np.ascontiguousarray(scores.T, dtype=float)
+        n_frames, n_chords = frame_scores.shape
+        stay = np.zeros((n_frames, n_chords), dtype=bool)
+        best_prev = np.zeros(n_frames, dtype=np.intp)
+        
+        first = 0
+        if self._delta is None:
+            if n_frames == 0:
+                return self._empty()
+            self._delta = frame_scores[0].copy()
+            first = 1
+        delta = self._delta
+        
+        for t in range(first, n_frames):
+            best = int(np.argmax(delta))
+            switch = delta[best] - self.penalty
+            np.greater_equal(delta, switch, out=stay[t])
+            best_prev[t] = best
+            np.maximum(delta, switch, out=delta)
+            delta += frame_scores[t]
+        
+        if self._stay is None:
+            self._stay, self._best_prev, self._scores = stay, best_prev, frame_scores
+        else:
+            self._stay = np.concatenate([self._stay, stay])
+            self._best_prev = np.concatenate([self._best_prev, best_prev])
+            self._scores = np.concatenate([self._scores, frame_scores])
+        return self._commit()
+    
+    def finish(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decide el resto del camino desde el mejor estado final
+        """
+        if self._stay is None or len(self._stay) == 0:
+            return self._empty()
+        return self._cut(len(self._stay), int(np.argmax(self._delta)))
+    
+    def _commit(self) -> Tuple[np.ndarray, np.ndarray]:
+        pending = len(self._stay)
+        # Retroceder todos los estados a la vez hasta que coincidan en un mismo predecesor
+        states = np.arange(self._stay.shape[1])
+        for t in range(pending - 1, 0, -1):
+            states = np.where(self._stay[t, states], states, self._best_prev[t])
+            if states.min() == states.max():
+                return self._cut(t, int(states[0]))
+        
+        if self.max_lag is not None and pending > self.max_lag:
+            # Sin confluencia: decidir desde el mejor estado actual
+            state = int(np.argmax(self._delta))
+            if not self._stay[pending - 1, state]:
+                state = int(self._best_prev[pending - 1])
+            return self._cut(pending - 1, state)
+        return self._empty()
+    
+    def _cut(self, length: int, last_state: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fija los primeros `length` frames pendientes, terminando en `last_state`
+        """
+        path = np.empty(length, dtype=np.intp)
+        state = last_state
+        for t in range(length - 1, -1, -1):
+            path[t] = state
+            if not self._stay[t, state]:
+                state = self._best_prev[t]
+        path_scores = self._scores[np.arange(length), path]
+        
+        self._stay = self._stay[length:]
+        self._best_prev = self._best_prev[length:]
+        self._scores = self._scores[length:]
+        return path, path_scores
+    
+    @staticmethod
+    def _empty() -> Tuple[np.ndarray, np.ndarray]:
+        return np.empty(0, dtype=np.intp), np.empty(0)
+
 class ChordAnalyzer:
-    def __init__(self):
+    def __init__(self, method: str = CHORD_METHOD, transition_penalty: float = CHORD_TRANSITION_PENALTY,
+                 resolution: str = CHORD_RESOLUTION, subdivisions: int = CHORD_SUBDIVISIONS):
+        if method not in ("viterbi", "segments"):
+            raise ValueError(f"Unknown chord method: {method}")
+        if resolution not in ("frame", "beat"):
+            raise ValueError(f"Unknown chord resolution: {resolution}")
+        self.method = method
+        self.transition_penalty = transition_penalty
+        self.resolution = resolution
+        self.subdivisions = max(1, subdivisions)
         # Mapeo de notas
         self.note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
         self.chord_types = {
@@ -46,35 +268,288 @@ class ChordAnalyzer:
             '6': [0, 4, 7, 9],
             'minor6': [0, 3, 7, 9]
         }
+        self._build_templates()
+        self._build_key_profiles()
+    
+    def _build_templates(self):
+        """
+        Precalcula todas las plantillas (12 raíces x tipos) como una matriz normalizada
+        """
+        labels = []
+        templates = []
+        # Mismo orden que la búsqueda original (raíz, luego tipo) para desempatar igual
+        for root_idx in range(12):
+            for chord_type, intervals in self.chord_types.items():
+                template = np.zeros(12)
+                template[[(root_idx + interval) % 12 for interval in intervals]] = 1.0
+                templates.append(template / np.linalg.norm(template))
+                root_note = self.note_names[root_idx]
+                labels.append(f"{root_note} {chord_type}" if chord_type != 'major' else root_note)
+        
+        self.chord_labels = labels
+        self.template_matrix = np.array(templates)  # (n_chords, 12)
+    
+    def _build_key_profiles(self):
+        """
+        Las 24 rotaciones de los perfiles de Krumhansl-Schmuckler, normalizadas (z-score)
+        """
+        major_profile = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+        minor_profile = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+        
+        labels = []
+        profiles = []
+        # Mismo orden que la búsqueda original (raíz; mayor antes que menor)
+        for root_idx in range(12):
+            for mode, profile in (("major", major_profile), ("minor", minor_profile)):
+                profiles.append(np.roll(profile, root_idx))
+                labels.append((f"{self.note_names[root_idx]} {mode}", mode))
+        
+        profiles = np.array(profiles)
+        self.key_labels = labels
+        self.key_profiles = (profiles - profiles.mean(axis=1, keepdims=True)) / profiles.std(axis=1, keepdims=True)
+    
+    def score_keys(self, chroma: np.ndarray) -> np.ndarray:
+        """
+        Correlación de Pearson de cada columna (12, n) con las 24 tonalidades: (24, n)
+        """
+        centered = chroma - chroma.mean(axis=0, keepdims=True)
+        std = centered.std(axis=0, keepdims=True)
+        # Columnas planas (silencio) no correlacionan con nada
+        z = np.divide(centered, std, out=np.zeros_like(centered, dtype=float), where=std > 0)
+        return self.key_profiles @ z / chroma.shape[0]
+    
+    def score_frames(self, chroma: np.ndarray) -> np.ndarray:
+        """
+        Similitud coseno de cada columna del cromagrama (12, n) con cada acorde: (n_chords, n)
+        """
+        norms = np.linalg.norm(chroma, axis=0)
+        # Columnas en silencio puntúan 0 (la versión escalar daba NaN y nunca ganaba)
+        normalized = np.divide(chroma, norms, out=np.zeros_like(chroma, dtype=float), where=norms > 0)
+        return self.template_matrix @ normalized
+    
+    def analyze_all(self, audio_path: str, hop_length: int = 512) -> Dict:
+        """
+        Acordes, tonalidad (global y por tramos), tempo y beats a partir de una sola decodificación
+        """
+        if self.should_stream(audio_path):
+            return self.analyze_all_streaming(audio_path, hop_length)
+        
+        session = AnalysisSession(audio_path, hop_length=hop_length)
+        
+        # La única decodificación: si falla, falla todo el análisis
+        duration = session.duration
+        
+        try:
+            chords = self.chords_from_session(session)
+        except Exception as e:
+            print(f"Error analyzing chords: {e}")
+            chords = []
+        
+        try:
+            key_info = self.key_from_session(session)
+            key_timeline = self.key_timeline(session.chroma, session.sr, session.hop_length)
+        except Exception as e:
+            print(f"Error analyzing key: {e}")
+            key_info, key_timeline = None, []
+        
+        try:
+            tempo = session.beats[0]
+            beats = [float(t) for t in session.beat_times]
+            time_signature = self.guess_time_signature(session.onset_env, session.beats[1])
+        except Exception as e:
+            print(f"Error analyzing tempo: {e}")
+            tempo, beats, time_signature = None, [], None
+        
+        return {
+            "chords": chords,
+            "key": key_info,
+            "key_timeline": key_timeline,
+            "tempo": tempo,
+            "beats": beats,
+            "time_signature": time_signature,
+            "duration": duration
+        }
+    
+    def should_stream(self, audio_path: str) -> bool:
+        """
+        True si el archivo es lo bastante largo para analizarlo por bloques
+        """
+        try:
+            return sf.info(audio_path).duration > STREAM_ANALYSIS_SECONDS
+        except Exception:
+            # Formato que libsndfile no lee por bloques: ruta completa con librosa
+            return False
+    
+    def analyze_all_streaming(self, audio_path: str, hop_length: int = 512, sr: int = 22050,
+                              block_seconds: float = STREAM_BLOCK_SECONDS) -> Dict:
+        """
+        Igual que analyze_all pero leyendo el archivo por bloques: la memoria depende del
+        bloque y no de la duración. Los acordes se decodifican siempre con Viterbi a
+        resolución de frame (la segmentación y la sincronía con beats necesitan el archivo entero)
+        """
+        stream = StreamingChroma(sr, hop_length=hop_length)
+        decoder = StreamingViterbi(self.transition_penalty)
+        frame_time = hop_length / sr
+        
+        chords: List[ChordInfo] = []
+        run = None          # [chord_idx, start_frame, score_sum, n_frames] del acorde en curso
+        decided = 0         # frames ya decididos por el decoder
+        chroma_sum = np.zeros(12)
+        # Croma promediado por ~1 s: basta para la línea temporal de tonalidad
+        group = max(1, int(round(sr / hop_length)))
+        coarse = []
+        partial = np.zeros((12, 0))
+        
+        def close_run():
+            chord_idx, start, score_sum, n_frames = run
+            chord_info = self._make_chord_info(self.chord_labels[chord_idx], score_sum / n_frames,
+                                               start * frame_time, (start + n_frames) * frame_time)
+            if chord_info:
+                chords.append(chord_info)
+        
+        def add_path(path, path_scores):
+            nonlocal run, decided
+            changes = np.flatnonzero(np.diff(path)) + 1
+            for start, end in zip(np.concatenate([[0], changes]), np.concatenate([changes, [len(path)]])):
+                chord_idx, score_sum = int(path[start]), float(path_scores[start:end].sum())
+                if run is not None and run[0] == chord_idx:
+                    run[2] += score_sum
+                    run[3] += end - start
+                    continue
+                if run is not None:
+                    close_run()
+                run = [chord_idx, decided + start, score_sum, end - start]
+            decided += len(path)
+        
+        def consume(chroma):
+            nonlocal partial
+            chroma_sum[:] += chroma.sum(axis=1)
+            grouped = np.concatenate([partial, chroma], axis=1)
+            n_groups = grouped.shape[1] // group
+            if n_groups:
+                coarse.append(grouped[:, :n_groups * group].reshape(12, n_groups, group).mean(axis=2))
+            partial = grouped[:, n_groups * group:]
+            add_path(*decoder.push(self.score_frames(chroma)))
+        
+        for samples in read_mono_blocks(audio_path, sr, block_seconds):
+            for chroma in stream.push(samples):
+                consume(chroma)
+        for chroma in stream.finish():
+            consume(chroma)
+        add_path(*decoder.finish())
+        if run is not None:
+            close_run()
+        
+        duration = stream.n_samples / sr
+        
+        try:
+            key, mode, confidence = self._find_key(chroma_sum / max(1, stream.n_frames))
+            key_info = KeyInfo(key=key, mode=mode, confidence=confidence, tonic=key.split()[0])
+            if partial.shape[1]:
+                coarse.append(partial.mean(axis=1, keepdims=True))
+            key_timeline = self.key_timeline(np.concatenate(coarse, axis=1), sr, hop_length * group) if coarse else []
+        except Exception as e:
+            print(f"Error analyzing key: {e}")
+            key_info, key_timeline = None, []
+        
+        try:
+            onset_env = stream.onset_envelope()
+            tempo, beat_frames = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=hop_length)
+            tempo = float(np.atleast_1d(tempo)[0])
+            beats = [float(t) for t in librosa.frames_to_time(beat_frames, sr=sr, hop_length=hop_length)]
+            time_signature = self.guess_time_signature(onset_env, beat_frames)
+        except Exception as e:
+            print(f"Error analyzing tempo: {e}")
+            tempo, beats, time_signature = None, [], None
+        
+        return {
+            "chords": chords,
+            "key": key_info,
+            "key_timeline": key_timeline,
+            "tempo": tempo,
+            "beats": beats,
+            "time_signature": time_signature,
+            "duration": duration
+        }
     
     def analyze_chords(self, audio_path: str, hop_length: int = 512) -> List[ChordInfo]:
         """
         Analiza los acordes de un archivo de audio
         """
         try:
-            # Cargar audio
-            y, sr = librosa.load(audio_path, sr=22050)
-            
-            # Extraer características cromáticas
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr, hop_length=hop_length)
-            
-            # Detectar segmentos de acordes
-            chord_segments = self._detect_chord_segments(chroma, sr, hop_length)
-            
-            # Analizar cada segmento
-            chords = []
-            for segment in chord_segments:
-                chord_info = self._analyze_chord_segment(chroma, segment)
-                if chord_info:
-                    chords.append(chord_info)
-            
-            return chords
+            return self.chords_from_session(AnalysisSession(audio_path, hop_length=hop_length))
             
         except Exception as e:
             print(f"Error analyzing chords: {e}")
             return []
     
-    def _detect_chord_segments(self, chroma: np.ndarray, sr: int, hop_length: int) -> List[Tuple[int, int]]:
+    def chords_from_session(self, session: AnalysisSession) -> List[ChordInfo]:
+        """
+        Detecta acordes sobre el cromagrama cacheado de la sesión
+        """
+        if self.resolution == "beat":
+            # Una columna por beat: decenas de veces menos columnas y cambios alineados al pulso
+            chroma, boundaries = session.beat_chroma(self.subdivisions)
+            min_length = 1
+        else:
+            chroma = session.chroma
+            boundaries = np.arange(chroma.shape[1] + 1)
+            min_length = 10  # Mínimo 10 frames
+        
+        # Instante de inicio de cada columna (y final de la última)
+        times = boundaries * session.hop_length / session.sr
+        
+        if self.method == "viterbi":
+            # Cada columna pesa lo que los frames que resume, así la penalización no depende de la resolución
+            return self._decode_chords(chroma, times, weights=np.diff(boundaries))
+        
+        # Detectar segmentos de acordes
+        chord_segments = self._detect_chord_segments(chroma, session.sr, session.hop_length, min_length)
+        
+        # Analizar todos los segmentos con una sola multiplicación de matrices
+        return self._analyze_chord_segments(chroma, chord_segments, times)
+    
+    def _decode_chords(self, chroma: np.ndarray, times: np.ndarray, weights: Optional[np.ndarray] = None) -> List[ChordInfo]:
+        """
+        Puntúa cada columna contra todas las plantillas y decodifica la secuencia más probable
+        """
+        if chroma.shape[1] == 0:
+            return []
+        
+        n_frames = chroma.shape[1]
+        weights = np.ones(n_frames) if weights is None else np.asarray(weights, dtype=float)
+        scores = self.score_frames(chroma)
+        path = self._viterbi(scores * weights, self.transition_penalty)
+        
+        # Tramos consecutivos con el mismo acorde
+        changes = np.flatnonzero(np.diff(path)) + 1
+        starts = np.concatenate([[0], changes])
+        ends = np.concatenate([changes, [n_frames]])
+        
+        # Confianza = similitud media (ponderada) del acorde elegido a lo largo del tramo
+        path_scores = np.concatenate([[0.0], np.cumsum(scores[path, np.arange(n_frames)] * weights)])
+        path_weights = np.concatenate([[0.0], np.cumsum(weights)])
+        confidences = (path_scores[ends] - path_scores[starts]) / (path_weights[ends] - path_weights[starts])
+        
+        chords = []
+        for start, end, confidence in zip(starts, ends, confidences):
+            chord_info = self._make_chord_info(self.chord_labels[path[start]], float(confidence),
+                                               float(times[start]), float(times[end]))
+            if chord_info:
+                chords.append(chord_info)
+        return chords
+    
+    @staticmethod
+    def _viterbi(scores: np.ndarray, penalty: float) -> np.ndarray:
+        """
+        Secuencia de estados más probable para una matriz de puntuaciones completa (n_chords, n_frames)
+        """
+        decoder = StreamingViterbi(penalty, max_lag=None)
+        committed, _ = decoder.push(scores)
+        tail, _ = decoder.finish()
+        return np.concatenate([committed, tail])
+    
+    def _detect_chord_segments(self, chroma: np.ndarray, sr: int, hop_length: int, min_length: int = 10) -> List[Tuple[int, int]]:
         """
         Detecta segmentos donde hay cambios de acordes
         """
@@ -90,33 +565,44 @@ class ChordAnalyzer:
         segments = []
         start = 0
         for change_point in change_points:
-            if change_point - start > 10:  # Mínimo 10 frames
+            if change_point - start > min_length:
                 segments.append((start, change_point))
                 start = change_point
         
         # Agregar último segmento
-        if chroma.shape[1] - start > 10:
+        if chroma.shape[1] - start > min_length:
             segments.append((start, chroma.shape[1]))
         
         return segments
     
-    def _analyze_chord_segment(self, chroma: np.ndarray, segment: Tuple[int, int]) -> Optional[ChordInfo]:
+    def _analyze_chord_segments(self, chroma: np.ndarray, segments: List[Tuple[int, int]], times: np.ndarray) -> List[ChordInfo]:
         """
-        Analiza un segmento específico para detectar el acorde
+        Analiza todos los segmentos a la vez: medias por suma acumulada y puntuación matricial
         """
-        start_frame, end_frame = segment
-        segment_chroma = chroma[:, start_frame:end_frame]
+        if not segments:
+            return []
         
-        # Promediar el cromagrama del segmento
-        avg_chroma = np.mean(segment_chroma, axis=1)
+        bounds = np.array(segments)
+        cumulative = np.concatenate([np.zeros((chroma.shape[0], 1)), np.cumsum(chroma, axis=1)], axis=1)
+        means = (cumulative[:, bounds[:, 1]] - cumulative[:, bounds[:, 0]]) / (bounds[:, 1] - bounds[:, 0])
         
-        # Encontrar el acorde más probable
-        best_chord, confidence = self._find_best_chord(avg_chroma)
+        scores = self.score_frames(means)
+        best = np.argmax(scores, axis=0)
+        confidences = scores[best, np.arange(len(segments))]
         
+        chords = []
+        for (start_frame, end_frame), chord_idx, confidence in zip(segments, best, confidences):
+            chord_info = self._make_chord_info(self.chord_labels[chord_idx], float(confidence),
+                                               float(times[start_frame]), float(times[end_frame]))
+            if chord_info:
+                chords.append(chord_info)
+        return chords
+    
+    def _make_chord_info(self, best_chord: str, confidence: float, start_time: float, end_time: float) -> Optional[ChordInfo]:
+        """
+        Construye el ChordInfo si la confianza supera el umbral
+        """
         if confidence > 0.3:  # Umbral de confianza
-            start_time = start_frame * 512 / 22050  # Convertir a tiempo
-            end_time = end_frame * 512 / 22050
-            
             return ChordInfo(
                 chord=best_chord,
                 confidence=confidence,
@@ -132,28 +618,13 @@ class ChordAnalyzer:
         """
         Encuentra el acorde que mejor coincide con el vector cromático
         """
-        best_chord = "C"
-        best_score = 0.0
+        scores = self.score_frames(np.asarray(chroma_vector, dtype=float).reshape(12, 1))[:, 0]
+        best_idx = int(np.argmax(scores))
         
-        # Probar cada nota raíz
-        for root_idx in range(12):
-            # Probar cada tipo de acorde
-            for chord_type, intervals in self.chord_types.items():
-                # Crear template del acorde
-                chord_template = np.zeros(12)
-                for interval in intervals:
-                    note_idx = (root_idx + interval) % 12
-                    chord_template[note_idx] = 1.0
-                
-                # Calcular similitud
-                similarity = np.dot(chroma_vector, chord_template) / (np.linalg.norm(chroma_vector) * np.linalg.norm(chord_template))
-                
-                if similarity > best_score:
-                    best_score = similarity
-                    root_note = self.note_names[root_idx]
-                    best_chord = f"{root_note} {chord_type}" if chord_type != 'major' else root_note
-        
-        return best_chord, best_score
+        # Sin similitud positiva se conserva el valor por defecto original
+        if scores[best_idx] <= 0:
+            return "C", 0.0
+        return self.chord_labels[best_idx], float(scores[best_idx])
     
     def _get_chord_type(self, chord: str) -> str:
         """
@@ -168,63 +639,103 @@ class ChordAnalyzer:
         Analiza la tonalidad de la canción
         """
         try:
-            y, sr = librosa.load(audio_path, sr=22050)
-            
-            # Extraer características cromáticas
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-            
-            # Promediar a lo largo del tiempo
-            avg_chroma = np.mean(chroma, axis=1)
-            
-            # Encontrar la tonalidad más probable
-            key, mode, confidence = self._find_key(avg_chroma)
-            
-            return KeyInfo(
-                key=key,
-                mode=mode,
-                confidence=confidence,
-                tonic=key.split()[0] if ' ' in key else key
-            )
+            return self.key_from_session(AnalysisSession(audio_path))
             
         except Exception as e:
             print(f"Error analyzing key: {e}")
             return None
     
+    def key_from_session(self, session: AnalysisSession) -> KeyInfo:
+        """
+        Tonalidad global a partir del cromagrama cacheado de la sesión
+        """
+        # Promediar a lo largo del tiempo
+        avg_chroma = np.mean(session.chroma, axis=1)
+        
+        # Encontrar la tonalidad más probable
+        key, mode, confidence = self._find_key(avg_chroma)
+        
+        return KeyInfo(
+            key=key,
+            mode=mode,
+            confidence=confidence,
+            tonic=key.split()[0] if ' ' in key else key
+        )
+    
     def _find_key(self, chroma_vector: np.ndarray) -> Tuple[str, str, float]:
         """
         Encuentra la tonalidad usando el algoritmo de Krumhansl-Schmuckler
         """
-        # Perfiles de tonalidad (Krumhansl-Schmuckler)
-        major_profile = [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88]
-        minor_profile = [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17]
+        scores = self.score_keys(np.asarray(chroma_vector, dtype=float).reshape(12, 1))[:, 0]
+        best_idx = int(np.argmax(scores))
         
-        best_key = "C major"
-        best_score = 0.0
-        best_mode = "major"
+        # Sin correlación positiva se conserva el valor por defecto original
+        if scores[best_idx] <= 0:
+            return "C major", "major", 0.0
+        key, mode = self.key_labels[best_idx]
+        return key, mode, float(scores[best_idx])
+    
+    def key_timeline(self, chroma: np.ndarray, sr: int, hop_length: int,
+                     window_seconds: float = KEY_WINDOW_SECONDS, hop_seconds: float = KEY_HOP_SECONDS) -> List[KeySegment]:
+        """
+        Tonalidad por ventanas deslizantes (modulaciones), fusionando ventanas consecutivas iguales
+        """
+        n_frames = chroma.shape[1]
+        if n_frames == 0:
+            return []
         
-        # Probar cada tonalidad
-        for root_idx in range(12):
-            # Rotar el perfil para cada nota raíz
-            major_rotated = np.roll(major_profile, root_idx)
-            minor_rotated = np.roll(minor_profile, root_idx)
-            
-            # Calcular correlación
-            major_corr = np.corrcoef(chroma_vector, major_rotated)[0, 1]
-            minor_corr = np.corrcoef(chroma_vector, minor_rotated)[0, 1]
-            
-            root_note = self.note_names[root_idx]
-            
-            if major_corr > best_score:
-                best_score = major_corr
-                best_key = f"{root_note} major"
-                best_mode = "major"
-            
-            if minor_corr > best_score:
-                best_score = minor_corr
-                best_key = f"{root_note} minor"
-                best_mode = "minor"
+        frame_rate = sr / hop_length
+        window = max(1, min(n_frames, int(round(window_seconds * frame_rate))))
+        step = max(1, int(round(hop_seconds * frame_rate)))
+        
+        # Medias de todas las ventanas con una suma acumulada y una sola matmul para las 24 tonalidades
+        starts = np.arange(0, n_frames - window + 1, step)
+        cumulative = np.concatenate([np.zeros((chroma.shape[0], 1)), np.cumsum(chroma, axis=1)], axis=1)
+        means = (cumulative[:, starts + window] - cumulative[:, starts]) / window
+        scores = self.score_keys(means)
+        best = np.argmax(scores, axis=0)
+        confidences = scores[best, np.arange(len(starts))]
+        
+        # Cada ventana representa el tramo alrededor de su centro
+        centers = (starts + window / 2) / frame_rate
+        bounds = np.concatenate([[0.0], (centers[:-1] + centers[1:]) / 2, [n_frames / frame_rate]])
+        
+        # Ventanas consecutivas con la misma tonalidad forman un solo tramo
+        changes = np.flatnonzero(np.diff(best)) + 1
+        run_starts = np.concatenate([[0], changes])
+        run_ends = np.concatenate([changes, [len(best)]])
+        
+        timeline = []
+        for run_start, run_end in zip(run_starts, run_ends):
+            key, mode = self.key_labels[best[run_start]]
+            timeline.append(KeySegment(
+                key=key,
+                mode=mode,
+                confidence=float(np.mean(confidences[run_start:run_end])),
+                tonic=key.split()[0],
+                start_time=float(bounds[run_start]),
+                end_time=float(bounds[run_end])
+            ))
+        return timeline
+    
+    def guess_time_signature(self, onset_env: np.ndarray, beat_frames: np.ndarray) -> str:
+        """
+        Compás estimado por el patrón de acentos: agrupa la fuerza de onset de cada beat
+        de a 3 y de a 4 y elige la agrupación con el tiempo fuerte más marcado
+        """
+        beat_frames = np.asarray(beat_frames, dtype=int)
+        if len(beat_frames) < 16 or len(onset_env) == 0:
+            return "4/4"
+        strengths = onset_env[np.clip(beat_frames, 0, len(onset_env) - 1)]
+        
+        contrast = {}
+        for meter in (3, 4):
+            usable = len(strengths) // meter * meter
+            profile = strengths[:usable].reshape(-1, meter).mean(axis=0)
+            contrast[meter] = (profile.max() - profile.mean()) / (profile.mean() + 1e-9)
         
-        return best_key, best_mode, best_score
+        # 4/4 salvo evidencia clara de ternario
+        return "3/4" if contrast[3] > 1.2 * contrast[4] else "4/4"
     
     def get_chord_progression(self, chords: List[ChordInfo]) -> List[str]:
         """
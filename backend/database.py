@@ -1,13 +1,27 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text, Float
+from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text, Float, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from datetime import datetime
+from pathlib import Path
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./moises_clone.db")
 
-engine = create_engine(DATABASE_URL)
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Workers and the flusher thread share the engine, so SQLite must allow cross-thread use
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if IS_SQLITE else {})
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets /status reads proceed while progress batches are being written
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -18,16 +32,30 @@ class TaskDB(Base):
     original_filename = Column(String)
     file_path = Column(String)
     separation_type = Column(String)
-    status = Column(String)
+    status = Column(String, index=True)
     progress = Column(Integer, default=0)
     stems = Column(Text)  # JSON string
     error = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    details = Column(Text)  # JSON string with the remaining task fields (timings, chords, key...)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     completed_at = Column(DateTime)
 
 def init_db():
-    """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
+    """Bring the database schema up to date (alembic migrations in migrations/)"""
+    from alembic import command
+    from alembic.config import Config
+
+    backend_dir = Path(__file__).resolve().parent
+    config = Config(str(backend_dir / "alembic.ini"))
+    config.set_main_option("script_location", str(backend_dir / "migrations"))
+    config.attributes["configure_logger"] = False
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        tables = inspect(connection).get_table_names()
+        if TaskDB.__tablename__ in tables and "alembic_version" not in tables:
+            # Created by create_all before migrations existed: start from the original schema
+            command.stamp(config, "0001")
+        command.upgrade(config, "head")
 
 def get_db():
     """Get database session"""
@@ -0,0 +1,394 @@
+"""
+Demucs Worker Pool - Procesos persistentes con el modelo cargado una sola vez
+"""
+
+import os
+import time
+import uuid
+import queue
+import asyncio
+import threading
+import multiprocessing as mp
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_MODEL = os.getenv("DEMUCS_MODEL", "htdemucs")
+DEFAULT_WORKERS = int(os.getenv("DEMUCS_WORKERS", "1"))
+DEFAULT_THREADS = int(os.getenv("DEMUCS_THREADS_PER_WORKER", "0"))
+# Most chunks one track is split into (0 = one per worker); the split only uses workers idle at submit time
+PARALLEL_CHUNKS = int(os.getenv("DEMUCS_PARALLEL_CHUNKS", "0"))
+
+
+def _segment_progress(model, report):
+    """tqdm stand-in for demucs.apply: reports the fraction of segments done across every model of a bag"""
+    passes = len(getattr(model, "models", None) or [model])
+    started = [0]
+
+    def track(iterable, **_):
+        index = started[0]
+        started[0] += 1
+        total = max(1, len(iterable))
+        for done, item in enumerate(iterable, 1):
+            yield item
+            # Resumed once the segment has been processed
+            report(min(1.0, (index + done / total) / passes))
+    return track
+
+
+def _apply_model(model, mix, report=None):
+    """Run the model on a (channels, samples) tensor the same way `demucs.separate` does"""
+    import types
+    import torch
+    import demucs.apply
+    from demucs.apply import apply_model
+
+    ref = mix.mean(0)
+    mean, std = ref.mean(), ref.std()
+    if std == 0:
+        std = torch.tensor(1.0)
+    mix = (mix - mean) / std
+    if report:
+        # apply_model only exposes progress as a tqdm bar over its segments
+        demucs.apply.tqdm = types.SimpleNamespace(tqdm=_segment_progress(model, report))
+    with torch.no_grad():
+        sources = apply_model(model, mix[None], split=True, overlap=0.25, progress=report is not None)[0]
+    return sources * std + mean
+
+
+def _worker_main(model_name: str, num_threads: int, job_queue, result_queue):
+    """Worker process: load the model once, then serve jobs until a None sentinel arrives"""
+    pid = os.getpid()
+    try:
+        load_start = time.perf_counter()
+        import torch
+        from demucs.pretrained import get_model
+        from demucs.audio import AudioFile, save_audio
+
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        model = get_model(model_name)
+        model.eval()
+        load_time = time.perf_counter() - load_start
+    except Exception as e:
+        result_queue.put(("failed", pid, repr(e)))
+        return
+
+    result_queue.put(("ready", pid, {
+        "model_load": load_time,
+        "samplerate": model.samplerate,
+        "audio_channels": model.audio_channels,
+        "sources": list(model.sources),
+    }))
+
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+
+        job_id, kind, payload = job
+        result_queue.put(("started", pid, job_id))
+        reported = [-1]
+
+        def report(fraction: float, job_id=job_id):
+            # Whole percents only: the queue carries at most 100 messages per job
+            percent = int(fraction * 100)
+            if percent > reported[0]:
+                reported[0] = percent
+                result_queue.put(("progress", pid, (job_id, percent / 100)))
+        try:
+            start = time.perf_counter()
+            if kind == "file":
+                wav = AudioFile(Path(payload["file_path"])).read(
+                    streams=0, samplerate=model.samplerate, channels=model.audio_channels
+                )
+                sources = _apply_model(model, wav, report if payload.get("progress") else None)
+                # Mismo layout que `python -m demucs`: <out>/<model>/<track>/<stem>.wav
+                track_dir = Path(payload["output_dir"]) / model_name / Path(payload["file_path"]).stem
+                track_dir.mkdir(parents=True, exist_ok=True)
+                result = {}
+                for source, name in zip(sources, model.sources):
+                    stem_path = track_dir / f"{name}.wav"
+                    save_audio(source, str(stem_path), samplerate=model.samplerate)
+                    result[name] = str(stem_path)
+            elif kind == "array":
+                mix = torch.from_numpy(np.ascontiguousarray(payload["audio"], dtype=np.float32))
+                sources = _apply_model(model, mix, report if payload.get("progress") else None)
+                result = {name: source.numpy() for source, name in zip(sources, model.sources)}
+            else:
+                raise ValueError(f"Unknown job kind: {kind}")
+
+            # El modelo ya está cargado: model_load es 0 en el camino caliente
+            timing = {
+                "model_load": 0.0,
+                "inference": time.perf_counter() - start,
+                "worker_model_load": load_time,
+                "worker": pid,
+            }
+            result_queue.put(("done", pid, (job_id, result, timing)))
+        except Exception as e:
+            result_queue.put(("error", pid, (job_id, repr(e))))
+
+
+class DemucsWorkerPool:
+    """Long-lived pool of Demucs processes that accept separation jobs over a queue"""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, num_workers: int = DEFAULT_WORKERS,
+                 threads_per_worker: int = DEFAULT_THREADS):
+        self.model_name = model_name
+        self.num_workers = num_workers
+        # 0 = share the cores evenly so N workers don't oversubscribe the CPU
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // max(1, num_workers))
+        self.parallel_chunks = PARALLEL_CHUNKS or num_workers
+        self.samplerate = 44100
+        self.audio_channels = 2
+        self.sources = ["drums", "bass", "other", "vocals"]
+
+        self._ctx = mp.get_context("spawn")
+        self._job_queue = None
+        self._result_queue = None
+        self._processes: Dict[int, Any] = {}
+        self._ready_workers = set()
+        self._pending: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Future, float]] = {}
+        self._progress: Dict[str, Callable[[float], None]] = {}
+        self._reserved = 0
+        self._running: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._stopping = False
+        self.load_times: Dict[int, float] = {}
+        self.failed_reason: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        """True when at least one worker has its model loaded"""
+        return bool(self._ready_workers)
+
+    @property
+    def available(self) -> bool:
+        """True while some worker is loading or serving; jobs queue until one is ready"""
+        return self.started and bool(self._processes)
+
+    @property
+    def started(self) -> bool:
+        return self._dispatcher is not None
+
+    def idle_workers(self) -> int:
+        """Ready workers with no job, minus jobs already waiting in the queue or reserved for them"""
+        with self._lock:
+            return self._idle_locked()
+
+    def _idle_locked(self) -> int:
+        running = set(self._running)
+        free = len(self._ready_workers - running)
+        # Pending jobs include the running ones
+        queued = len(self._pending) - len(running)
+        return max(0, free - queued - self._reserved)
+
+    def reserve(self, wanted: int) -> "Reservation":
+        """Claim up to `wanted` idle workers for the chunks of one job.
+
+        Two jobs starting together would otherwise both see the same idle workers
+        and interleave their chunks in the queue. Each chunk submitted with the
+        reservation turns one claimed slot into a queued job; release() returns the rest.
+        """
+        with self._lock:
+            count = max(0, min(wanted, self._idle_locked()))
+            self._reserved += count
+        return Reservation(self, count)
+
+    def start(self):
+        """Spawn the workers; model loading happens in the background"""
+        if self.started or self.num_workers <= 0:
+            return
+        self._stopping = False
+        self._job_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+        for _ in range(self.num_workers):
+            self._spawn_worker()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="demucs-dispatcher", daemon=True)
+        self._dispatcher.start()
+        print(f"Demucs worker pool starting: {self.num_workers} workers, model {self.model_name}")
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until a worker is ready or every worker failed"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.ready and self._processes:
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+        return self.ready
+
+    def stop(self, timeout: float = 10.0):
+        """Send a sentinel to every worker and join them"""
+        if not self.started:
+            return
+        self._stopping = True
+        for _ in list(self._processes):
+            self._job_queue.put(None)
+        for process in list(self._processes.values()):
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._dispatcher.join(timeout)
+        self._dispatcher = None
+        self._processes.clear()
+        self._ready_workers.clear()
+        self._fail_pending(RuntimeError("Demucs worker pool stopped"))
+
+    async def separate_file(self, file_path: str, output_dir: str,
+                            on_progress: Optional[Callable[[float], None]] = None) -> Tuple[Dict[str, str], Dict[str, float]]:
+        """Separate a file on disk; stems are written in the standard Demucs layout.
+
+        `on_progress(fraction)` is called on the caller's loop as inference advances.
+        """
+        return await self._submit("file", {"file_path": str(file_path), "output_dir": str(output_dir)}, on_progress)
+
+    async def separate_array(self, audio: np.ndarray, on_progress: Optional[Callable[[float], None]] = None,
+                             reservation: Optional["Reservation"] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, float]]:
+        """Separate a (channels, samples) float32 array already at `self.samplerate`"""
+        return await self._submit("array", {"audio": audio}, on_progress, reservation)
+
+    async def _submit(self, kind: str, payload: Dict, on_progress: Optional[Callable[[float], None]] = None,
+                      reservation: Optional["Reservation"] = None):
+        if not self.available:
+            raise RuntimeError("Demucs worker pool is not running")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            if reservation is not None and reservation.remaining > 0:
+                # The claimed slot is now accounted for as a queued job
+                reservation.remaining -= 1
+                self._reserved -= 1
+            self._pending[job_id] = (loop, future, time.perf_counter())
+            if on_progress:
+                self._progress[job_id] = on_progress
+        self._job_queue.put((job_id, kind, {**payload, "progress": on_progress is not None}))
+        return await future
+
+    def _spawn_worker(self):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.model_name, self.threads_per_worker, self._job_queue, self._result_queue),
+            daemon=True,
+        )
+        process.start()
+        self._processes[process.pid] = process
+
+    def _dispatch_loop(self):
+        while not (self._stopping and not self._processes_alive()):
+            try:
+                kind, pid, data = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                self._reap_dead_workers()
+                continue
+
+            if kind == "ready":
+                self._ready_workers.add(pid)
+                self.load_times[pid] = data["model_load"]
+                self.samplerate = data["samplerate"]
+                self.audio_channels = data["audio_channels"]
+                self.sources = data["sources"]
+                print(f"Demucs worker {pid} ready (model load {data['model_load']:.2f}s)")
+            elif kind == "failed":
+                self.failed_reason = data
+                self._processes.pop(pid, None)
+                print(f"Demucs worker {pid} failed to load model: {data}")
+                if not self._processes:
+                    self._fail_pending(RuntimeError(f"No Demucs workers available: {data}"))
+            elif kind == "started":
+                self._running[pid] = data
+            elif kind == "progress":
+                job_id, fraction = data
+                with self._lock:
+                    entry = self._pending.get(job_id)
+                    callback = self._progress.get(job_id)
+                if entry and callback:
+                    entry[0].call_soon_threadsafe(callback, fraction)
+            elif kind == "done":
+                job_id, result, timing = data
+                self._running.pop(pid, None)
+                self._resolve(job_id, result=result, timing=timing)
+            elif kind == "error":
+                job_id, error = data
+                self._running.pop(pid, None)
+                self._resolve(job_id, error=RuntimeError(f"Demucs error: {error}"))
+
+    def _processes_alive(self) -> bool:
+        return any(process.is_alive() for process in self._processes.values())
+
+    def _reap_dead_workers(self):
+        """Fail the job of any worker that died mid-inference and replace the worker"""
+        if self._stopping:
+            return
+        for pid, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            self._processes.pop(pid, None)
+            self._ready_workers.discard(pid)
+            job_id = self._running.pop(pid, None)
+            if job_id:
+                self._resolve(job_id, error=RuntimeError(f"Demucs worker {pid} exited with code {process.exitcode}"))
+            if pid in self.load_times:
+                print(f"Demucs worker {pid} died, respawning")
+                self._spawn_worker()
+
+    def _fail_pending(self, error: Exception):
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._progress.clear()
+        for loop, future, _ in pending:
+            loop.call_soon_threadsafe(self._set_exception, future, error)
+
+    def _resolve(self, job_id: str, result=None, timing=None, error: Optional[Exception] = None):
+        with self._lock:
+            entry = self._pending.pop(job_id, None)
+            self._progress.pop(job_id, None)
+        if not entry:
+            return
+        loop, future, submitted = entry
+        if error is not None:
+            loop.call_soon_threadsafe(self._set_exception, future, error)
+            return
+        timing = dict(timing)
+        timing["total"] = time.perf_counter() - submitted
+        timing["queue_wait"] = max(timing["total"] - timing["inference"], 0.0)
+        loop.call_soon_threadsafe(self._set_result, future, (result, timing))
+
+    @staticmethod
+    def _set_result(future: asyncio.Future, value):
+        if not future.done():
+            future.set_result(value)
+
+    @staticmethod
+    def _set_exception(future: asyncio.Future, error: Exception):
+        if not future.done():
+            future.set_exception(error)
+
+
+class Reservation:
+    """Idle workers claimed for one job's chunks (see DemucsWorkerPool.reserve)"""
+
+    def __init__(self, pool: DemucsWorkerPool, count: int):
+        self.pool = pool
+        self.count = count
+        self.remaining = count
+
+    def release(self):
+        """Give back the slots no chunk was submitted for"""
+        with self.pool._lock:
+            self.pool._reserved -= self.remaining
+            self.remaining = 0
+
+    def __enter__(self) -> "Reservation":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+# Global instance
+demucs_pool = DemucsWorkerPool()
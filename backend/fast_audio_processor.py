@@ -11,6 +11,8 @@ import librosa
 import soundfile as sf
 import numpy as np
 
+from analysis_context import AnalysisContext
+
 class FastAudioProcessor:
     def __init__(self):
         pass
@@ -116,14 +118,17 @@ class FastAudioProcessor:
             # Load the original audio
             audio, sr = librosa.load(file_path, sr=22050)
             
+            # Shared STFT/HPSS/pre-emphasis, computed once for all extractors
+            ctx = AnalysisContext(audio, sr)
+            
             # Create additional tracks quickly
             additional_tracks = {
-                "piano": self.extract_piano_fast(audio, sr, output_dir),
-                "guitar": self.extract_guitar_fast(audio, sr, output_dir),
-                "strings": self.extract_strings_fast(audio, sr, output_dir),
-                "brass": self.extract_brass_fast(audio, sr, output_dir),
-                "percussion": self.extract_percussion_fast(audio, sr, output_dir),
-                "synth": self.extract_synth_fast(audio, sr, output_dir),
+                "piano": self.extract_piano_fast(ctx, output_dir),
+                "guitar": self.extract_guitar_fast(ctx, output_dir),
+                "strings": self.extract_strings_fast(ctx, output_dir),
+                "brass": self.extract_brass_fast(ctx, output_dir),
+                "percussion": self.extract_percussion_fast(ctx, output_dir),
+                "synth": self.extract_synth_fast(ctx, output_dir),
                 "instrumental": self.create_instrumental_fast(basic_stems, output_dir)
             }
             
@@ -139,63 +144,61 @@ class FastAudioProcessor:
             print(f"Error creating extended tracks: {e}")
             return basic_stems
     
-    def extract_piano_fast(self, audio: np.ndarray, sr: int, output_dir: Path) -> str:
+    def extract_piano_fast(self, ctx: AnalysisContext, output_dir: Path) -> str:
         """Extract piano using fast processing"""
         try:
-            y_harmonic, _ = librosa.effects.hpss(audio)
-            piano = librosa.effects.preemphasis(y_harmonic)
+            piano = ctx.harmonic_preemphasized
             output_path = output_dir / "piano.wav"
-            sf.write(str(output_path), piano, sr)
+            sf.write(str(output_path), piano, ctx.sr)
             return str(output_path)
         except:
             return None
     
-    def extract_guitar_fast(self, audio: np.ndarray, sr: int, output_dir: Path) -> str:
+    def extract_guitar_fast(self, ctx: AnalysisContext, output_dir: Path) -> str:
         """Extract guitar using fast processing"""
         try:
-            guitar = librosa.effects.preemphasis(audio)
+            guitar = ctx.preemphasized
             output_path = output_dir / "guitar.wav"
-            sf.write(str(output_path), guitar, sr)
+            sf.write(str(output_path), guitar, ctx.sr)
             return str(output_path)
         except:
             return None
     
-    def extract_strings_fast(self, audio: np.ndarray, sr: int, output_dir: Path) -> str:
+    def extract_strings_fast(self, ctx: AnalysisContext, output_dir: Path) -> str:
         """Extract strings using fast processing"""
         try:
-            strings = librosa.effects.preemphasis(audio)
+            strings = ctx.preemphasized
             output_path = output_dir / "strings.wav"
-            sf.write(str(output_path), strings, sr)
+            sf.write(str(output_path), strings, ctx.sr)
             return str(output_path)
         except:
             return None
     
-    def extract_brass_fast(self, audio: np.ndarray, sr: int, output_dir: Path) -> str:
+    def extract_brass_fast(self, ctx: AnalysisContext, output_dir: Path) -> str:
         """Extract brass using fast processing"""
         try:
-            brass = librosa.effects.preemphasis(audio)
+            brass = ctx.preemphasized
             output_path = output_dir / "brass.wav"
-            sf.write(str(output_path), brass, sr)
+            sf.write(str(output_path), brass, ctx.sr)
             return str(output_path)
         except:
             return None
     
-    def extract_percussion_fast(self, audio: np.ndarray, sr: int, output_dir: Path) -> str:
+    def extract_percussion_fast(self, ctx: AnalysisContext, output_dir: Path) -> str:
         """Extract percussion using fast processing"""
         try:
-            _, y_percussive = librosa.effects.hpss(audio)
             output_path = output_dir / "percussion.wav"
-            sf.write(str(output_path), y_percussive, sr)
+            sf.write(str(output_path), ctx.percussive, ctx.sr)
             return str(output_path)
         except:
             return None
     
-    def extract_synth_fast(self, audio: np.ndarray, sr: int, output_dir: Path) -> str:
+    def extract_synth_fast(self, ctx: AnalysisContext, output_dir: Path) -> str:
         """Extract synth using fast processing"""
         try:
-            synth = librosa.effects.preemphasis(audio)
+            synth = ctx.preemphasized
             output_path = output_dir / "synth.wav"
-            sf.write(str(output_path), synth, sr)
+            sf.write(str(output_path), synth, ctx.sr)
             return str(output_path)
         except:
             return None
@@ -0,0 +1,115 @@
+"""
+HTTP Client - Sesión aiohttp compartida (pool de conexiones, timeouts y reintentos) para el tráfico B2
+"""
+
+import asyncio
+import os
+import random
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional
+
+import aiohttp
+
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "8"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+# Per-read timeout: large stems may take minutes in total, but a stalled socket should not
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "120"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF_SECONDS = float(os.getenv("HTTP_BACKOFF_SECONDS", "0.5"))
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class HttpClient:
+    """One pooled aiohttp session per event loop.
+
+    The API process has a single loop, so every B2 upload and download shares
+    one connection pool (keep-alive, one TCP/TLS handshake per connection).
+    Celery tasks run their own short-lived loops via asyncio.run; each gets its
+    own session, which the task closes when it ends.
+    """
+
+    def __init__(self, limit: int = HTTP_POOL_LIMIT, limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT,
+                 retries: int = HTTP_RETRIES, backoff: float = HTTP_BACKOFF_SECONDS):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self._lock = threading.Lock()
+
+    async def start(self):
+        """Create the current loop's session up front (FastAPI startup)"""
+        self.session
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.get(loop)
+            if session is None or session.closed:
+                connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                                 ttl_dns_cache=300)
+                session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+                self._sessions[loop] = session
+            return session
+
+    async def close(self):
+        """Close the current loop's session"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.pop(loop, None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, data: Any = None, retries: Optional[int] = None,
+                      **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Send a request, retrying connection errors and retryable statuses with backoff.
+
+        `data` may be a zero-argument callable that builds the body: form data and
+        file streams can only be sent once, so each attempt needs a fresh one.
+        """
+        attempts = (self.retries if retries is None else retries) + 1
+        for attempt in range(attempts):
+            body = data() if callable(data) else data
+            try:
+                response = await self.session.request(method, url, data=body, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt + 1 == attempts:
+                    raise
+                await self._wait(attempt, method, url, repr(e))
+                continue
+
+            if response.status in RETRY_STATUSES and attempt + 1 < attempts:
+                response.release()
+                await self._wait(attempt, method, url, f"HTTP {response.status}")
+                continue
+
+            try:
+                yield response
+            finally:
+                response.release()
+            return
+
+    async def _wait(self, attempt: int, method: str, url: str, reason: str):
+        # Exponential backoff with jitter so parallel uploads do not retry in lockstep
+        delay = self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+        print(f"Retrying {method} {url} in {delay:.2f}s ({reason})")
+        await asyncio.sleep(delay)
+
+
+async def closing_client(coro: Awaitable):
+    """Await `coro`, then close the current loop's session (for asyncio.run callers such as Celery tasks)"""
+    try:
+        return await coro
+    finally:
+        await http_client.close()
+
+
+# Global instance
+http_client = HttpClient()
@@ -0,0 +1,136 @@
+"""
+Job Scheduler - Cola con prioridades y concurrencia acotada por carril (separación / análisis)
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Awaitable, Callable, Dict, List, Optional, Any
+
+SEPARATION_SLOTS = int(os.getenv("SEPARATION_SLOTS", "2"))
+ANALYSIS_SLOTS = int(os.getenv("ANALYSIS_SLOTS", "2"))
+# Initial per-lane duration guess (seconds) until real jobs have been measured
+DEFAULT_ESTIMATES = {"separation": 120.0, "analysis": 20.0}
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    task_id: str = field(compare=False)
+    factory: Callable[[], Awaitable[Any]] = field(compare=False)
+
+
+class _Lane:
+    def __init__(self, name: str, slots: int):
+        self.name = name
+        self.slots = max(1, slots)
+        self.heap: List[_Job] = []
+        self.running: Dict[str, float] = {}  # task_id -> start time
+        self.durations = deque(maxlen=20)
+        self.wakeup = asyncio.Condition()
+        self.workers: List[asyncio.Task] = []
+
+    @property
+    def average_duration(self) -> float:
+        if self.durations:
+            return sum(self.durations) / len(self.durations)
+        return DEFAULT_ESTIMATES.get(self.name, 60.0)
+
+
+class JobScheduler:
+    """Runs background jobs in fixed-size lanes instead of one unbounded task per request"""
+
+    def __init__(self, lanes: Optional[Dict[str, int]] = None):
+        self.lane_slots = lanes or {"separation": SEPARATION_SLOTS, "analysis": ANALYSIS_SLOTS}
+        self._lanes: Dict[str, _Lane] = {}
+        self._seq = itertools.count()
+        self._queued: Dict[str, str] = {}  # task_id -> lane
+
+    def start(self):
+        """Create the lanes and their slot workers (needs a running event loop)"""
+        if self._lanes:
+            return
+        for name, slots in self.lane_slots.items():
+            lane = _Lane(name, slots)
+            lane.workers = [asyncio.create_task(self._worker(lane)) for _ in range(lane.slots)]
+            self._lanes[name] = lane
+        print(f"Job scheduler started: {self.lane_slots}")
+
+    async def stop(self):
+        for lane in self._lanes.values():
+            for worker in lane.workers:
+                worker.cancel()
+            await asyncio.gather(*lane.workers, return_exceptions=True)
+        self._lanes.clear()
+        self._queued.clear()
+
+    async def submit(self, lane_name: str, task_id: str, factory: Callable[[], Awaitable[Any]],
+                     priority: Priority = Priority.NORMAL):
+        """Queue `factory()` to run when a slot in `lane_name` frees up"""
+        lane = self._lanes[lane_name]
+        async with lane.wakeup:
+            heapq.heappush(lane.heap, _Job(int(priority), next(self._seq), task_id, factory))
+            self._queued[task_id] = lane_name
+            lane.wakeup.notify()
+
+    def position(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Queue position (0 = running) and a rough ETA to completion, or None if unknown"""
+        for lane in self._lanes.values():
+            if task_id in lane.running:
+                elapsed = time.monotonic() - lane.running[task_id]
+                return {"lane": lane.name, "position": 0,
+                        "eta_seconds": round(max(lane.average_duration - elapsed, 0.0), 1)}
+
+        lane_name = self._queued.get(task_id)
+        if lane_name is None:
+            return None
+        lane = self._lanes[lane_name]
+        job = next((job for job in lane.heap if job.task_id == task_id), None)
+        if job is None:
+            return None
+        ahead = sum(1 for other in lane.heap if other < job)
+        # Jobs ahead drain `slots` at a time, then this one runs
+        rounds = ahead // lane.slots + 1
+        return {"lane": lane.name, "position": ahead + 1,
+                "eta_seconds": round(rounds * lane.average_duration, 1)}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {"slots": lane.slots, "running": len(lane.running), "queued": len(lane.heap),
+                   "average_duration": round(lane.average_duration, 1)}
+            for name, lane in self._lanes.items()
+        }
+
+    async def _worker(self, lane: _Lane):
+        while True:
+            async with lane.wakeup:
+                await lane.wakeup.wait_for(lambda: bool(lane.heap))
+                job = heapq.heappop(lane.heap)
+            self._queued.pop(job.task_id, None)
+            lane.running[job.task_id] = time.monotonic()
+            try:
+                await job.factory()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Scheduled job {job.task_id} failed: {e}")
+            finally:
+                started = lane.running.pop(job.task_id, None)
+                if started is not None:
+                    lane.durations.append(time.monotonic() - started)
+
+
+# Global instance
+job_scheduler = JobScheduler()
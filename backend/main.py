@@ -1,22 +1,37 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
 import os
 import uuid
+import shutil
 import asyncio
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 import json
+import mimetypes
 
 from audio_processor_real import audio_processor
 from chord_analyzer import ChordAnalyzer
 from models import ProcessingTask, TaskStatus
 from database import get_db, init_db
 from b2_storage import b2_storage
+from demucs_worker import demucs_pool
+from separation_cache import separation_cache
+from upload_ingest import ingest_request, MAX_UPLOAD_MB
+from job_scheduler import job_scheduler, Priority
+from task_store import task_store, EXECUTION_BACKEND
+from http_client import http_client
+from waveform_peaks import build_peaks, describe_peaks, read_peaks_range
+from stem_pipeline import StemPipeline
+from progress_events import progress_events
 
-# In-memory task storage
-tasks_storage = {}
+if EXECUTION_BACKEND == "celery":
+    # Jobs go to external workers (see celery_worker.py); task state lives in the shared store
+    from celery_worker import separate_task, analyze_chords_task
+
+# "segmented" separates in overlapping windows with flat memory, for long recordings
+SEPARATION_MODES = ("standard", "segmented")
 
 app = FastAPI(
     title="Moises Clone API",
@@ -31,8 +46,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Peaks-Start"],
 )
 
+# Reject oversized uploads from Content-Length before the body is received
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    content_length = request.headers.get("content-length")
+    if request.method == "POST" and content_length and content_length.isdigit():
+        # Multipart framing adds a little on top of the file itself
+        if int(content_length) > MAX_UPLOAD_MB * 1024 * 1024 + 64 * 1024:
+            return JSONResponse(status_code=413, content={"detail": f"File exceeds {MAX_UPLOAD_MB} MB limit"})
+    return await call_next(request)
+
 # Static files (commented for demo)
 # app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -40,7 +66,29 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    if EXECUTION_BACKEND == "local":
+        # Jobs run in this process, so whatever was still running died with the previous one
+        interrupted = task_store.fail_interrupted()
+        if interrupted:
+            print(f"⚠️ Marked {interrupted} interrupted task(s) as failed")
+    # Every task write wakes the SSE streams of that task
+    task_store.add_listener(progress_events.notify)
+    # One pooled HTTP session for all B2 traffic
+    await http_client.start()
     await b2_storage.initialize()
+    separation_cache.load()
+    if EXECUTION_BACKEND == "local":
+        # Load Demucs once in long-lived workers instead of per job; with Celery the workers separate
+        demucs_pool.start()
+    job_scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_scheduler.stop()
+    demucs_pool.stop()
+    await http_client.close()
+    # Write any progress still waiting in the batch
+    task_store.close()
 
 # Audio processor instance (already imported)
 
@@ -50,20 +98,21 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "OK", "message": "Backend is running"}
+    return {"status": "OK", "message": "Backend is running", "scheduler": job_scheduler.stats(),
+            "event_streams": progress_events.subscribers()}
 
 @app.post("/upload")
 async def upload_audio(
+    request: Request,
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
     separation_type: str = "2stems",
     separation_options: Optional[str] = None,
-    hi_fi: bool = False
+    hi_fi: bool = False,
+    priority: str = "normal"
 ):
-    """Upload audio file and start separation process"""
+    """Upload audio file (multipart field `file`) and start separation process"""
     
-    if not file.content_type.startswith("audio/"):
-        raise HTTPException(status_code=400, detail="File must be audio")
+    job_priority = parse_priority(priority)
     
     # Generate unique task ID
     task_id = str(uuid.uuid4())
@@ -73,10 +122,8 @@ async def upload_audio(
     upload_dir.mkdir(parents=True, exist_ok=True)
     
     # Save uploaded file
-    file_path = upload_dir / f"original.{file.filename.split('.')[-1]}"
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    upload = await save_upload(request, upload_dir, require_audio_type=True)
+    file_path = Path(upload.path)
     
     # Parse separation options if provided
     custom_tracks = None
@@ -90,37 +137,46 @@ async def upload_audio(
     # Create processing task
     task = ProcessingTask(
         id=task_id,
-        original_filename=file.filename,
+        original_filename=upload.filename,
         file_path=str(file_path),
         separation_type=separation_type,
         status=TaskStatus.PROCESSING
     )
+    task_store.save(task)
     
-    # Start background processing with options
-    background_tasks.add_task(process_audio, task, custom_tracks, hi_fi)
+    # Start background processing with options (or reuse a cached/in-flight result)
+    cached = await start_separation(background_tasks, task, upload.sha256, custom_tracks, hi_fi, priority=job_priority)
     
     return {
         "task_id": task_id,
-        "status": "processing",
-        "message": "Audio upload successful, processing started",
+        "status": task.status,
+        "message": "Audio upload successful, processing started" if not cached else "Cached separation found",
         "separation_type": separation_type,
-        "hi_fi": hi_fi
+        "hi_fi": hi_fi,
+        "cached": cached
     }
 
 @app.post("/separate")
 async def separate_audio_direct(
+    request: Request,
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
     separation_type: str = "vocals-instrumental",
     separation_options: Optional[str] = None,
     hi_fi: bool = False,
     song_id: Optional[str] = None,
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    mode: str = "standard",
+    priority: str = "normal"
 ):
-    """Separate audio directly from uploaded file"""
+    """Separate audio directly from uploaded file (multipart field `file`)"""
     
-    if not file.content_type.startswith("audio/"):
-        raise HTTPException(status_code=400, detail="File must be audio")
+    if mode not in SEPARATION_MODES:
+        raise HTTPException(status_code=400, detail=f"Mode must be one of: {', '.join(SEPARATION_MODES)}")
+    # Segmented separation streams windows through the worker pool; without workers it would fail once queued
+    if mode == "segmented" and EXECUTION_BACKEND == "local" and not demucs_pool.available:
+        raise HTTPException(status_code=400, detail="Segmented mode requires Demucs workers (DEMUCS_WORKERS > 0)")
+    
+    job_priority = parse_priority(priority)
     
     # Generate unique task ID
     task_id = str(uuid.uuid4())
@@ -130,12 +186,8 @@ async def separate_audio_direct(
     upload_dir.mkdir(parents=True, exist_ok=True)
     
     # Save uploaded file directly
-    file_ext = file.filename.split('.')[-1] if '.' in file.filename else 'mp3'
-    file_path = upload_dir / f"original.{file_ext}"
-    
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    upload = await save_upload(request, upload_dir, require_audio_type=True)
+    file_path = Path(upload.path)
     
     # Parse separation options if provided
     custom_tracks = None
@@ -148,23 +200,25 @@ async def separate_audio_direct(
     # Create processing task
     task = ProcessingTask(
         id=task_id,
-        original_filename=file.filename,
+        original_filename=upload.filename,
         file_path=str(file_path),
         separation_type=separation_type,
         status=TaskStatus.PROCESSING
     )
     
     # Store task in memory
-    tasks_storage[task_id] = task
+    task_store.save(task)
     
-    # Start background processing with options
-    background_tasks.add_task(process_audio, task, custom_tracks, hi_fi)
+    # Start background processing with options (or reuse a cached/in-flight result)
+    cached = await start_separation(background_tasks, task, upload.sha256, custom_tracks, hi_fi, mode, job_priority)
     
     return {
         "task_id": task_id,
-        "status": "processing",
-        "message": "Audio separation started",
-        "filename": file.filename
+        "status": task.status,
+        "message": "Audio separation started" if not cached else "Cached separation found",
+        "filename": upload.filename,
+        "mode": mode,
+        "cached": cached
     }
 
 @app.get("/status/{task_id}")
@@ -173,23 +227,83 @@ async def get_status(task_id: str):
     task = await get_task_status(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+    return status_payload(task)
+
+@app.get("/status/{task_id}/events")
+async def stream_status(task_id: str):
+    """Push the /status payload as Server-Sent Events whenever it changes, until the task finishes"""
+    if not await get_task_status(task_id):
+        raise HTTPException(status_code=404, detail="Task not found")
     
-    # Return B2 URLs directly (already uploaded to B2)
+    async def snapshot():
+        task = await get_task_status(task_id)
+        return status_payload(task) if task else None
+    
+    return StreamingResponse(
+        progress_events.stream(task_id, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def status_payload(task: ProcessingTask) -> Dict:
+    """Body of /status, also sent by the event stream"""
+    task_id = task.id
+    # Return B2 URLs directly (already uploaded to B2); while processing, only the stems that are ready
     stems_urls = None
-    if task.status == TaskStatus.COMPLETED and task.stems:
+    renditions = None
+    stem_states = None
+    if task.status in (TaskStatus.PROCESSING, TaskStatus.COMPLETED) and task.stems:
         stems_urls = task.stems  # These are already B2 URLs
+        renditions = task.renditions  # Per-format URLs: {stem: {flac, opus, aac, ...}}
+    if task.status != TaskStatus.FAILED:
+        # separating -> encoding -> uploading -> ready (or failed), per stem
+        stem_states = task.stem_states
+        if not stem_states and task.status == TaskStatus.COMPLETED and task.stems:
+            # Served from the cache or a joined job: everything is ready
+            stem_states = {name: {"state": "ready", "url": url} for name, url in task.stems.items()}
     
     return {
         "task_id": task_id,
         "status": task.status,
         "progress": task.progress,
         "stems": stems_urls,
-        "bpm": 126,  # Default BPM
-        "key": "E",  # Default key
-        "timeSignature": "4/4",  # Default time signature
-        "duration": "5:00"  # Default duration
+        "stem_states": stem_states,
+        "renditions": renditions,
+        "queue": job_scheduler.position(task_id),
+        "timings": task.timings,
+        **format_status_metadata(task.analysis)
     }
 
+@app.get("/api/peaks/{task_id}")
+async def get_peaks_info(task_id: str):
+    """Zoom levels available for each stem's waveform"""
+    task = await get_task_status(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    peaks = {}
+    for stem, path in (task.peaks or {}).items():
+        if os.path.exists(path):
+            peaks[stem] = describe_peaks(Path(path))
+    return {"task_id": task_id, "peaks": peaks}
+
+@app.get("/api/peaks/{task_id}/{stem}")
+async def get_peaks(task_id: str, stem: str, start: float = 0.0, end: Optional[float] = None, pixels: int = 2000):
+    """Min/max peaks of one stem for [start, end) seconds, as an audiowaveform .dat (8-bit) payload"""
+    task = await get_task_status(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    path = (task.peaks or {}).get(stem)
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Peaks not available for this stem")
+    
+    data, first_peak_time = await asyncio.to_thread(read_peaks_range, Path(path), start, end, pixels)
+    return Response(
+        content=data,
+        media_type="application/octet-stream",
+        headers={"X-Peaks-Start": f"{first_peak_time:.6f}", "Cache-Control": "public, max-age=86400"}
+    )
+
 @app.get("/audio/{path:path}")
 async def serve_audio(path: str):
     """Serve audio files from B2 to avoid CORS issues"""
@@ -197,10 +311,10 @@ async def serve_audio(path: str):
         # Download file from B2
         file_content = await b2_storage.download_file(path)
         
-        # Return as streaming response
+        # Return as streaming response (WAV, FLAC, Opus or AAC rendition)
         return StreamingResponse(
             file_content,
-            media_type="audio/wav",
+            media_type=mimetypes.guess_type(path)[0] or "audio/wav",
             headers={
                 "Access-Control-Allow-Origin": "*",
                 "Access-Control-Allow-Methods": "GET",
@@ -236,25 +350,135 @@ async def download_stem(task_id: str, stem_name: str):
         media_type="audio/wav"
     )
 
-async def process_audio(task: ProcessingTask, custom_tracks: Optional[Dict] = None, hi_fi: bool = False):
+async def save_upload(request: Request, upload_dir: Path, name: str = "original", default_ext: str = "mp3",
+                      require_audio_type: bool = False):
+    """Stream the request's file part to disk (hash + header probe); drop the task directory if it is rejected"""
+    try:
+        upload = await ingest_request(request, upload_dir, name, default_ext, require_audio_type=require_audio_type)
+    except Exception:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise
+    print(f"Received {upload.size / 1e6:.1f} MB {upload.probe.format} "
+          f"({upload.probe.sample_rate} Hz, {upload.probe.duration or 0:.0f}s)")
+    return upload
+
+def parse_priority(priority: str) -> Priority:
+    """Map the `priority` query value (high/normal/low) to a scheduler priority class"""
+    try:
+        return Priority[priority.upper()]
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Priority must be one of: high, normal, low")
+
+async def start_separation(background_tasks: BackgroundTasks, task: ProcessingTask, audio_hash: str,
+                           custom_tracks: Optional[Dict] = None, hi_fi: bool = False, mode: str = "standard",
+                           priority: Priority = Priority.NORMAL) -> bool:
+    """Serve from the stem cache, join an identical in-flight job, or schedule a new one.
+    
+    Returns True when the task was completed from the cache.
+    """
+    options = custom_tracks if task.separation_type == "custom" else None
+    cache_key = separation_cache.make_key(audio_hash, task.separation_type, demucs_pool.model_name, hi_fi, options)
+    
+    cached_stems = separation_cache.get(cache_key)
+    if cached_stems:
+        print(f"Cache hit for task {task.id}: {cache_key[:12]}")
+        task.stems = cached_stems
+        extras = separation_cache.extras(cache_key)
+        task.analysis, task.peaks = extras.get("analysis"), extras.get("peaks")
+        task.renditions = extras.get("renditions")
+        task.status = TaskStatus.COMPLETED
+        task.progress = 100
+        task_store.save(task)
+        # The stems already exist; the fresh upload is not needed
+        shutil.rmtree(Path(task.file_path).parent, ignore_errors=True)
+        return True
+    
+    if EXECUTION_BACKEND == "celery":
+        # In-flight futures are process-local, so identical jobs are only coalesced in local mode
+        task.status = TaskStatus.PENDING
+        task_store.save(task)
+        await asyncio.to_thread(
+            separate_task.apply_async,
+            args=[task.id, custom_tracks, hi_fi, mode, cache_key],
+            priority=celery_priority(priority)
+        )
+        return False
+    
+    leader = separation_cache.inflight(cache_key)
+    if leader:
+        print(f"Joining in-flight separation for task {task.id}: {cache_key[:12]}")
+        background_tasks.add_task(follow_separation, task, leader, cache_key)
+    else:
+        separation_cache.begin(cache_key)
+        task.status = TaskStatus.PENDING
+        task_store.save(task)
+        await job_scheduler.submit(
+            "separation", task.id,
+            lambda: process_audio(task, custom_tracks, hi_fi, mode, cache_key),
+            priority
+        )
+    return False
+
+def celery_priority(priority: Priority) -> int:
+    """Redis transport priorities run 0 (highest) to 9"""
+    return int(priority) * 3
+
+async def follow_separation(task: ProcessingTask, leader: asyncio.Future, cache_key: str):
+    """Wait for an identical job that is already running and take its stems"""
+    try:
+        task.stems = await asyncio.shield(leader)
+        extras = separation_cache.extras(cache_key)
+        task.analysis, task.peaks = extras.get("analysis"), extras.get("peaks")
+        task.renditions = extras.get("renditions")
+        task.status = TaskStatus.COMPLETED
+        task.progress = 100
+    except Exception as e:
+        task.status = TaskStatus.FAILED
+        task.error = str(e)
+    finally:
+        task_store.save(task)
+        shutil.rmtree(Path(task.file_path).parent, ignore_errors=True)
+
+async def process_audio(task: ProcessingTask, custom_tracks: Optional[Dict] = None, hi_fi: bool = False, mode: str = "standard", cache_key: Optional[str] = None):
     """Background task to process audio"""
+    metadata = None
+    pipeline = None
     try:
         # Update task status
         task.status = TaskStatus.PROCESSING
         task.progress = 10
+        task_store.save(task)
+        
+        # Each stem is encoded and uploaded as soon as separation finalizes it
+        pipeline = StemPipeline(task, Path(task.file_path).parent / "renditions", lambda: task_store.update_progress(task))
         
         # Process based on separation type
         if task.separation_type == "custom" and custom_tracks:
+            pipeline.expect(name for name, enabled in custom_tracks.items() if enabled)
+            
+            # The extended tracks decode the whole song; metadata is analyzed from that copy
+            def start_metadata(audio, sr):
+                nonlocal metadata
+                metadata = asyncio.create_task(analyze_metadata(task, (audio, sr)))
+            
             # Custom track separation with REAL AI
             stems = await audio_processor.separate_custom_tracks(
                 task.file_path,
                 custom_tracks,
-                hi_fi
+                hi_fi,
+                on_stem=pipeline.add,
+                on_audio=start_metadata
             )
         else:
+            # Duration/tempo/key run as a pipeline stage next to separation, not as a second job
+            metadata = asyncio.create_task(analyze_metadata(task))
             # Use REAL Demucs AI processing for best quality
             def update_progress(progress: int, message: str = ""):
+                # Demucs reports many fractions per percent; only actual changes are written and pushed
+                if progress == task.progress:
+                    return
                 task.progress = progress
+                task_store.update_progress(task)
                 print(f"Progress: {progress}% - {message}")
             
             # Determinar qué tracks solicitar basado en separation_type
@@ -263,79 +487,116 @@ async def process_audio(task: ProcessingTask, custom_tracks: Optional[Dict] = No
                 requested_tracks = ["vocals", "instrumental"]
             elif task.separation_type == "vocals-drums-bass-other":
                 requested_tracks = ["vocals", "drums", "bass", "other"]
+            pipeline.expect(requested_tracks or ["vocals", "drums", "bass", "other"])
             
-            stems = await audio_processor.separate_with_demucs(task.file_path, update_progress, requested_tracks)
+            if mode == "segmented":
+                stems = await audio_processor.separate_segmented(task.file_path, update_progress, requested_tracks)
+            else:
+                task.timings = {}
+                stems = await audio_processor.separate_with_demucs(task.file_path, update_progress, requested_tracks,
+                                                                   task.timings, on_stem=pipeline.add)
         
-        # Upload stems to B2 for online playback
-        print(f"Uploading {len(stems)} stems to B2...")
+        # Stems not handed over during separation (segmented mode) start their encode/upload now
+        for name, path in stems.items():
+            pipeline.add(name, path)
+        print(f"Waiting for {len(stems)} stems to be encoded and uploaded to B2...")
         task.progress = 85
-        b2_stems = await upload_stems_to_b2(stems, task.id)
+        task_store.update_progress(task)
+        # Waveform peaks are built from the local stems while the last ones encode and upload
+        peaks = asyncio.create_task(generate_peaks(task, stems))
+        b2_stems = await pipeline.finish()
+        task.timings = {**(task.timings or {}), "encode": pipeline.encode_stats, "upload": pipeline.upload_stats}
+        task.peaks = await peaks
         task.progress = 95
+        task_store.update_progress(task)
+        
+        # Extended tracks that failed before decoding leave the metadata to be read from the file
+        task.analysis = await (metadata or analyze_metadata(task))
+        
+        if cache_key:
+            # A partial result is returned to this job (and any joined ones) but never cached
+            if pipeline.complete():
+                b2_stems = await asyncio.to_thread(separation_cache.put, cache_key, stems, b2_stems, task.analysis,
+                                                   task.peaks, task.renditions)
+            else:
+                print(f"Not caching incomplete separation for task {task.id}")
+            separation_cache.finish(cache_key, b2_stems)
         
         # Update task with B2 URLs
         task.stems = b2_stems
         task.status = TaskStatus.COMPLETED
         task.progress = 100
+        task_store.save(task)
         
         print(f"Audio processing completed with B2 URLs: {b2_stems}")
         
     except Exception as e:
+        if metadata:
+            metadata.cancel()
+        if pipeline:
+            pipeline.cancel()
+        if cache_key:
+            separation_cache.finish(cache_key, error=e)
         task.status = TaskStatus.FAILED
         task.error = str(e)
+        task_store.save(task)
         print(f"Processing error: {e}")
 
-async def upload_stems_to_b2(stems: Dict[str, str], task_id: str) -> Dict[str, str]:
-    """Upload separated stems to B2 and return URLs"""
+async def analyze_metadata(task: ProcessingTask, audio: Optional[Tuple] = None) -> Optional[Dict]:
+    """Song metadata for /status, from `audio` (y, sr) when already decoded; a failure here never fails the separation"""
     try:
-        import aiohttp
-        import aiofiles
-        
-        b2_stems = {}
-        
-        for stem_name, stem_path in stems.items():
-            if os.path.exists(stem_path):
-                print(f"Uploading {stem_name} to B2...")
-                
-                # Read file
-                async with aiofiles.open(stem_path, 'rb') as f:
-                    file_data = await f.read()
-                
-                # Create FormData
-                form_data = aiohttp.FormData()
-                form_data.add_field('file', file_data, filename=f"{stem_name}.wav", content_type='audio/wav')
-                form_data.add_field('userId', 'system')
-                form_data.add_field('songId', task_id)
-                form_data.add_field('trackName', stem_name)
-                form_data.add_field('folder', 'stems')
-                
-                # Upload to B2 via proxy
-                async with aiohttp.ClientSession() as session:
-                    async with session.post('http://localhost:3001/api/upload', data=form_data) as response:
-                        if response.status == 200:
-                            result = await response.json()
-                            b2_url = result.get('downloadUrl', '')
-                            b2_stems[stem_name] = b2_url
-                            print(f"SUCCESS: {stem_name} uploaded to B2: {b2_url}")
-                        else:
-                            print(f"ERROR: Failed to upload {stem_name}: {response.status}")
-        
-        return b2_stems
-        
+        loop = asyncio.get_running_loop()
+        analysis = await loop.run_in_executor(audio_processor.extract_executor, audio_processor.analyze_audio,
+                                              task.file_path, audio)
+        print(f"Metadata for task {task.id}: {analysis['tempo'] or 0:.1f} BPM, {analysis['key']}, "
+              f"{analysis['time_signature']}, {analysis['duration']:.1f}s")
+        return analysis
+    except Exception as e:
+        print(f"Metadata analysis error: {e}")
+        return None
+
+async def generate_peaks(task: ProcessingTask, stems: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """Waveform peak pyramids for the UI; a failure here never fails the separation"""
+    try:
+        loop = asyncio.get_running_loop()
+        output_dir = Path(task.file_path).parent / "peaks"
+        return await loop.run_in_executor(audio_processor.extract_executor, build_peaks, stems, output_dir)
     except Exception as e:
-        print(f"ERROR uploading stems to B2: {e}")
-        return stems  # Return local paths as fallback
+        print(f"Peaks generation error: {e}")
+        return None
+
+def format_status_metadata(analysis: Optional[Dict]) -> Dict:
+    """bpm/key/timeSignature/duration as the frontend displays them (None until analyzed)"""
+    if not analysis:
+        return {"bpm": None, "key": None, "timeSignature": None, "duration": None, "durationSeconds": None}
+    
+    key = None
+    if analysis.get("key"):
+        # "E minor" -> "Em", "E major" -> "E"
+        key = analysis["key"].split()[0] + ("m" if analysis.get("mode") == "minor" else "")
+    
+    duration = analysis.get("duration")
+    minutes, seconds = divmod(int(round(duration)), 60) if duration is not None else (0, 0)
+    return {
+        "bpm": round(analysis["tempo"]) if analysis.get("tempo") else None,
+        "key": key,
+        "timeSignature": analysis.get("time_signature"),
+        "duration": f"{minutes}:{seconds:02d}" if duration is not None else None,
+        "durationSeconds": duration
+    }
 
 async def get_task_status(task_id: str) -> Optional[ProcessingTask]:
-    """Get task status from memory storage"""
-    return tasks_storage.get(task_id)
+    """Get task status from the task store"""
+    return task_store.get(task_id)
 
 # Chord Analysis Endpoints
 @app.post("/api/analyze-chords")
 async def analyze_chords(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
+    request: Request,
+    priority: str = "normal"
 ):
     """Analyze chords and key of an audio file"""
+    job_priority = parse_priority(priority)
     try:
         # Generate unique task ID
         task_id = str(uuid.uuid4())
@@ -343,37 +604,43 @@ async def analyze_chords(
         # Save uploaded file
         upload_dir = Path("uploads") / task_id
         upload_dir.mkdir(parents=True, exist_ok=True)
-        file_path = upload_dir / "audio.wav"
-        
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        upload = await save_upload(request, upload_dir, "audio", "wav")
+        file_path = Path(upload.path)
         
         # Create task
         task = ProcessingTask(
             id=task_id,
-            status=TaskStatus.PROCESSING,
+            original_filename=upload.filename,
+            separation_type="chords",
+            status=TaskStatus.PENDING,
             file_path=str(file_path),
             progress=0
         )
-        tasks_storage[task_id] = task
+        task_store.save(task)
         
-        # Start chord analysis in background
-        background_tasks.add_task(process_chord_analysis, task)
+        if EXECUTION_BACKEND == "celery":
+            await asyncio.to_thread(
+                analyze_chords_task.apply_async, args=[task_id], priority=celery_priority(job_priority)
+            )
+        else:
+            # Chord/key jobs are cheap: they get their own lane so they never wait behind separations
+            await job_scheduler.submit("analysis", task_id, lambda: process_chord_analysis(task), job_priority)
         
         return {
             "task_id": task_id,
-            "status": "processing",
+            "status": task.status,
             "message": "Chord analysis started"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/chord-analysis/{task_id}")
 async def get_chord_analysis(task_id: str):
     """Get chord analysis results"""
-    task = tasks_storage.get(task_id)
+    task = await get_task_status(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
@@ -381,9 +648,13 @@ async def get_chord_analysis(task_id: str):
         "task_id": task_id,
         "status": task.status,
         "progress": task.progress,
-        "chords": task.chords if hasattr(task, 'chords') else None,
-        "key": task.key if hasattr(task, 'key') else None,
-        "error": task.error if hasattr(task, 'error') else None
+        "queue": job_scheduler.position(task_id),
+        "chords": task.chords,
+        "key": task.key,
+        "key_timeline": task.key_timeline,
+        "tempo": task.tempo,
+        "beats": task.beats,
+        "error": task.error
     }
 
 async def process_chord_analysis(task: ProcessingTask):
@@ -395,14 +666,14 @@ async def process_chord_analysis(task: ProcessingTask):
         # Update progress
         task.progress = 20
         task.status = TaskStatus.PROCESSING
+        task_store.save(task)
         
-        # Analyze chords
-        chords = analyzer.analyze_chords(task.file_path)
-        task.progress = 60
-        
-        # Analyze key
-        key_info = analyzer.analyze_key(task.file_path)
+        # Chords, key and tempo from a single decode, off the event loop
+        analysis = await asyncio.to_thread(analyzer.analyze_all, task.file_path)
+        chords = analysis["chords"]
+        key_info = analysis["key"]
         task.progress = 80
+        task_store.update_progress(task)
         
         # Save results
         task.chords = [
@@ -424,14 +695,31 @@ async def process_chord_analysis(task: ProcessingTask):
             "tonic": key_info.tonic if key_info else "Unknown"
         } if key_info else None
         
+        task.key_timeline = [
+            {
+                "key": segment.key,
+                "mode": segment.mode,
+                "confidence": segment.confidence,
+                "tonic": segment.tonic,
+                "start_time": segment.start_time,
+                "end_time": segment.end_time
+            }
+            for segment in analysis["key_timeline"]
+        ]
+        
+        task.tempo = analysis["tempo"]
+        task.beats = analysis["beats"]
+        
         task.progress = 100
         task.status = TaskStatus.COMPLETED
+        task_store.save(task)
         
         print(f"Chord analysis completed for task {task.id}")
         
     except Exception as e:
         task.status = TaskStatus.FAILED
         task.error = str(e)
+        task_store.save(task)
         print(f"Chord analysis error: {e}")
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+"""tasks table as originally created by Base.metadata.create_all
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "tasks",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("original_filename", sa.String()),
+        sa.Column("file_path", sa.String()),
+        sa.Column("separation_type", sa.String()),
+        sa.Column("status", sa.String()),
+        sa.Column("progress", sa.Integer()),
+        sa.Column("stems", sa.Text()),
+        sa.Column("error", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("completed_at", sa.DateTime()),
+    )
+    op.create_index("ix_tasks_id", "tasks", ["id"])
+
+
+def downgrade():
+    op.drop_index("ix_tasks_id", table_name="tasks")
+    op.drop_table("tasks")
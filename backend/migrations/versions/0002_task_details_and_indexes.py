@@ -0,0 +1,33 @@
+"""details column for the remaining task fields; status and created_at indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases upgraded by the old init_db may already have these
+    inspector = sa.inspect(op.get_bind())
+    if "details" not in {column["name"] for column in inspector.get_columns("tasks")}:
+        op.add_column("tasks", sa.Column("details", sa.Text()))
+    indexes = {index["name"] for index in inspector.get_indexes("tasks")}
+    if "ix_tasks_status" not in indexes:
+        op.create_index("ix_tasks_status", "tasks", ["status"])
+    if "ix_tasks_created_at" not in indexes:
+        op.create_index("ix_tasks_created_at", "tasks", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_tasks_created_at", table_name="tasks")
+    op.drop_index("ix_tasks_status", table_name="tasks")
+    with op.batch_alter_table("tasks") as batch:
+        batch.drop_column("details")
@@ -0,0 +1,72 @@
+"""
+Mixdown - Suma de stems bloque a bloque (memoria O(bloque), conserva estéreo)
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import soundfile as sf
+
+BLOCK_FRAMES = 65536
+
+
+def mixdown(stem_paths: Sequence[str], output_path: str, gains: Optional[Sequence[float]] = None,
+            block_frames: int = BLOCK_FRAMES, subtype: Optional[str] = None) -> str:
+    """Sum N stems into one file, reading and writing one block at a time.
+
+    Stems must share a sample rate. The output has as many channels as the
+    widest input (mono stems are spread to every channel) and lasts as long as
+    the longest stem; stems that end early contribute silence.
+    """
+    if not stem_paths:
+        raise ValueError("No stems to mix")
+    gains = list(gains) if gains is not None else [1.0] * len(stem_paths)
+    if len(gains) != len(stem_paths):
+        raise ValueError("One gain per stem is required")
+
+    inputs = [sf.SoundFile(str(path)) for path in stem_paths]
+    try:
+        samplerate = inputs[0].samplerate
+        if any(f.samplerate != samplerate for f in inputs):
+            raise ValueError("Stems have different sample rates")
+        channels = max(f.channels for f in inputs)
+        subtype = subtype or inputs[0].subtype
+
+        # Preallocated once: the mix accumulator and one read buffer per channel layout
+        mix = np.empty((block_frames, channels), dtype=np.float32)
+        buffers = {f.channels: np.empty((block_frames, f.channels), dtype=np.float32) for f in inputs}
+
+        with sf.SoundFile(str(output_path), mode="w", samplerate=samplerate, channels=channels, subtype=subtype) as out:
+            while True:
+                mix.fill(0.0)
+                frames = 0
+                for f, gain in zip(inputs, gains):
+                    buffer = buffers[f.channels]
+                    n = len(f.read(block_frames, dtype="float32", always_2d=True, out=buffer))
+                    if n == 0:
+                        continue
+                    if gain != 1.0:
+                        np.multiply(buffer[:n], gain, out=buffer[:n])
+                    # (n, 1) broadcasts across channels, (n, channels) adds element-wise
+                    mix[:n] += buffer[:n]
+                    frames = max(frames, n)
+                if frames == 0:
+                    break
+                block = mix[:frames]
+                np.clip(block, -1.0, 1.0, out=block)
+                out.write(block)
+    finally:
+        for f in inputs:
+            f.close()
+
+    return str(output_path)
+
+
+def mix_stems(stems: Dict[str, str], names: List[str], output_path: str,
+              gains: Optional[Dict[str, float]] = None) -> Optional[str]:
+    """Mix the named stems that exist in `stems` (e.g. drums + bass + other -> instrumental)"""
+    selected = [name for name in names if name in stems]
+    if not selected:
+        return None
+    gains = gains or {}
+    return mixdown([stems[name] for name in selected], output_path, [gains.get(name, 1.0) for name in selected])
@@ -1,6 +1,6 @@
 from enum import Enum
-from pydantic import BaseModel
-from typing import Optional, Dict, List
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, List, Any
 from datetime import datetime
 
 class TaskStatus(str, Enum):
@@ -17,14 +17,29 @@ class SeparationType(str, Enum):
 
 class ProcessingTask(BaseModel):
     id: str
-    original_filename: str
+    original_filename: Optional[str] = None
     file_path: str
-    separation_type: str
+    separation_type: Optional[str] = None
     status: TaskStatus
     progress: int = 0
     stems: Optional[Dict[str, str]] = None
     error: Optional[str] = None
-    created_at: datetime = datetime.now()
+    timings: Optional[Dict[str, Any]] = None
+    # Song metadata computed alongside separation (duration, tempo, key, time signature)
+    analysis: Optional[Dict[str, Any]] = None
+    # Local waveform peak pyramids per stem (served by /api/peaks)
+    peaks: Optional[Dict[str, str]] = None
+    # Uploaded delivery renditions per stem: {stem: {format: URL}} (flac, opus, aac, wav)
+    renditions: Optional[Dict[str, Dict[str, str]]] = None
+    # Per-stem pipeline state while processing: {stem: {"state": separating|encoding|uploading|ready|failed, ...}}
+    stem_states: Optional[Dict[str, Dict[str, Any]]] = None
+    # Chord analysis results
+    chords: Optional[List[Dict[str, Any]]] = None
+    key: Optional[Dict[str, Any]] = None
+    key_timeline: Optional[List[Dict[str, Any]]] = None
+    tempo: Optional[float] = None
+    beats: Optional[List[float]] = None
+    created_at: datetime = Field(default_factory=datetime.now)
     completed_at: Optional[datetime] = None
 
 class AudioAnalysis(BaseModel):
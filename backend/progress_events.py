@@ -0,0 +1,93 @@
+"""
+Progress Events - Estado de tareas empujado a los clientes (Server-Sent Events) en vez de polling de /status
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+# At most one event per interval per stream; intermediate updates collapse into the latest state
+PROGRESS_PUSH_INTERVAL = float(os.getenv("PROGRESS_PUSH_INTERVAL", "0.25"))
+# Re-read the store this often when nothing was pushed (jobs running in external workers)
+SSE_POLL_SECONDS = float(os.getenv("SSE_POLL_SECONDS", "1.0"))
+# Comment lines keep idle connections open through proxies
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+TERMINAL_STATES = ("completed", "failed")
+
+
+class ProgressEvents:
+    """Wakes the SSE streams of a task whenever the task store writes it.
+
+    `notify` may be called from any thread (progress callbacks, the store's
+    flusher); it only sets an asyncio.Event on each subscriber's loop. Each
+    stream then sends the latest state at most once per `interval`, so a burst
+    of progress updates costs one event, and only when something changed.
+    """
+
+    def __init__(self, interval: float = PROGRESS_PUSH_INTERVAL, poll: float = SSE_POLL_SECONDS,
+                 heartbeat: float = SSE_HEARTBEAT_SECONDS):
+        self.interval = interval
+        self.poll = poll
+        self.heartbeat = heartbeat
+        self._subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self._lock = threading.Lock()
+
+    def notify(self, task_id: str):
+        with self._lock:
+            subscribers = list(self._subscribers.get(task_id, ()))
+        for loop, event in subscribers:
+            loop.call_soon_threadsafe(event.set)
+
+    def subscribers(self) -> int:
+        with self._lock:
+            return sum(len(streams) for streams in self._subscribers.values())
+
+    async def stream(self, task_id: str, snapshot: Callable[[], Awaitable[Optional[Dict]]]) -> AsyncIterator[str]:
+        """SSE frames with `snapshot()` each time it changes, until the task completes or fails"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._subscribers.setdefault(task_id, set()).add(subscriber)
+        event = subscriber[1]
+        try:
+            # Tell the browser how soon to reconnect if the connection drops
+            yield f"retry: {int(self.poll * 1000)}\n\n"
+            last, last_write = None, time.monotonic()
+            while True:
+                event.clear()
+                state = await snapshot()
+                if state is None:
+                    yield f"event: error\ndata: {json.dumps({'detail': 'Task not found'})}\n\n"
+                    return
+                # Compared serialized: the snapshot may share live dicts with the task being updated
+                data = json.dumps(state, default=str)
+                if data != last:
+                    yield f"data: {data}\n\n"
+                    last, last_write = data, time.monotonic()
+                    if state.get("status") in TERMINAL_STATES:
+                        return
+                elif time.monotonic() - last_write >= self.heartbeat:
+                    yield ": keep-alive\n\n"
+                    last_write = time.monotonic()
+
+                # Coalesce: whatever arrives during the interval goes out as one event
+                await asyncio.sleep(self.interval)
+                if not event.is_set():
+                    try:
+                        await asyncio.wait_for(event.wait(), timeout=self.poll)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            with self._lock:
+                streams = self._subscribers.get(task_id)
+                if streams is not None:
+                    streams.discard(subscriber)
+                    if not streams:
+                        del self._subscribers[task_id]
+
+
+# Global instance
+progress_events = ProgressEvents()
@@ -0,0 +1,176 @@
+"""
+S3 Client - Subidas multipart S3-compatibles directas a B2 (sin pasar por el proxy Node)
+"""
+
+import asyncio
+import math
+import os
+import random
+import threading
+from typing import Dict
+from urllib.parse import quote
+
+import boto3
+from botocore.config import Config
+
+B2_ENDPOINT = os.getenv("B2_ENDPOINT", "https://s3.us-east-005.backblazeb2.com")
+B2_REGION = os.getenv("B2_REGION", "us-east-005")
+B2_BUCKET_NAME = os.getenv("B2_BUCKET_NAME", "moises2")
+B2_APPLICATION_KEY_ID = os.getenv("B2_APPLICATION_KEY_ID", "")
+B2_APPLICATION_KEY = os.getenv("B2_APPLICATION_KEY", "")
+# B2 requires parts of at least 5 MB (except the last one)
+S3_PART_SIZE_MB = int(os.getenv("S3_PART_SIZE_MB", "8"))
+S3_PART_CONCURRENCY = int(os.getenv("S3_PART_CONCURRENCY", "4"))
+S3_PART_RETRIES = int(os.getenv("S3_PART_RETRIES", "3"))
+# Rounds over the missing parts before the upload is aborted
+S3_UPLOAD_ROUNDS = int(os.getenv("S3_UPLOAD_ROUNDS", "2"))
+# Same ACL the proxy sets; empty to omit it (stand-ins or private buckets)
+S3_OBJECT_ACL = os.getenv("S3_OBJECT_ACL", "public-read")
+
+
+class S3Uploader:
+    """Uploads files to an S3-compatible bucket, in parallel parts for large files.
+
+    boto3 is synchronous, so every call runs in a worker thread. Each part is
+    read from disk only when it is sent, so memory is bounded by
+    part size x part concurrency. A failed part is retried on its own; after
+    that, another round re-lists the parts the store already has and only sends
+    the missing ones before the upload is completed (or aborted).
+    """
+
+    def __init__(self, endpoint: str = B2_ENDPOINT, bucket: str = B2_BUCKET_NAME, region: str = B2_REGION,
+                 key_id: str = B2_APPLICATION_KEY_ID, key: str = B2_APPLICATION_KEY,
+                 part_size: int = S3_PART_SIZE_MB * 1024 * 1024, part_concurrency: int = S3_PART_CONCURRENCY,
+                 part_retries: int = S3_PART_RETRIES, rounds: int = S3_UPLOAD_ROUNDS, acl: str = S3_OBJECT_ACL):
+        self.endpoint = endpoint.rstrip("/")
+        self.bucket = bucket
+        self.region = region
+        self.key_id = key_id
+        self.key = key
+        self.part_size = part_size
+        self.part_concurrency = max(1, part_concurrency)
+        self.part_retries = part_retries
+        self.rounds = max(1, rounds)
+        self.acl = acl
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.key_id and self.key)
+
+    @property
+    def client(self):
+        # boto3 clients are thread-safe; one is shared by every upload thread
+        with self._lock:
+            if self._client is None:
+                self._client = boto3.client(
+                    "s3",
+                    endpoint_url=self.endpoint,
+                    region_name=self.region,
+                    aws_access_key_id=self.key_id,
+                    aws_secret_access_key=self.key,
+                    config=Config(max_pool_connections=max(10, 4 * self.part_concurrency),
+                                  retries={"mode": "standard", "max_attempts": 3},
+                                  s3={"addressing_style": "path"})
+                )
+            return self._client
+
+    def public_url(self, key: str) -> str:
+        return f"{self.endpoint}/{self.bucket}/{quote(key)}"
+
+    def presigned_url(self, key: str, expires: int = 3600) -> str:
+        """Signed GET URL (works for private buckets too); computed locally, no request"""
+        return self.client.generate_presigned_url("get_object", Params={"Bucket": self.bucket, "Key": key},
+                                                  ExpiresIn=expires)
+
+    async def upload_file(self, file_path: str, key: str, content_type: str = "application/octet-stream") -> str:
+        """Upload a file and return its public URL"""
+        size = os.path.getsize(file_path)
+        extra = {"ContentType": content_type}
+        if self.acl:
+            extra["ACL"] = self.acl
+
+        if size <= self.part_size:
+            await asyncio.to_thread(self._put_object, file_path, key, extra)
+        else:
+            await self._upload_multipart(file_path, key, size, extra)
+        return self.public_url(key)
+
+    def _put_object(self, file_path: str, key: str, extra: Dict):
+        with open(file_path, "rb") as f:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=f, **extra)
+
+    async def _upload_multipart(self, file_path: str, key: str, size: int, extra: Dict):
+        created = await asyncio.to_thread(self.client.create_multipart_upload, Bucket=self.bucket, Key=key, **extra)
+        upload_id = created["UploadId"]
+        n_parts = math.ceil(size / self.part_size)
+        semaphore = asyncio.Semaphore(self.part_concurrency)
+        done: Dict[int, str] = {}
+
+        try:
+            for round_idx in range(self.rounds):
+                if round_idx:
+                    # Resume: keep every part the store already holds in full
+                    done.update(await asyncio.to_thread(self._list_parts, key, upload_id, size))
+                missing = [number for number in range(1, n_parts + 1) if number not in done]
+                if not missing:
+                    break
+                results = await asyncio.gather(
+                    *(self._upload_part(file_path, key, upload_id, number, semaphore) for number in missing),
+                    return_exceptions=True
+                )
+                for number, result in zip(missing, results):
+                    if isinstance(result, Exception):
+                        print(f"Part {number}/{n_parts} of {key} failed: {result}")
+                    else:
+                        done[number] = result
+
+            if len(done) < n_parts:
+                raise Exception(f"{n_parts - len(done)} of {n_parts} parts failed for {key}")
+
+            await asyncio.to_thread(
+                self.client.complete_multipart_upload, Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": [{"PartNumber": number, "ETag": done[number]} for number in sorted(done)]}
+            )
+        except BaseException:
+            try:
+                await asyncio.to_thread(self.client.abort_multipart_upload, Bucket=self.bucket, Key=key,
+                                        UploadId=upload_id)
+            except Exception as e:
+                print(f"Could not abort multipart upload of {key}: {e}")
+            raise
+
+    async def _upload_part(self, file_path: str, key: str, upload_id: str, number: int,
+                           semaphore: asyncio.Semaphore) -> str:
+        async with semaphore:
+            for attempt in range(self.part_retries + 1):
+                try:
+                    return await asyncio.to_thread(self._put_part, file_path, key, upload_id, number)
+                except Exception:
+                    if attempt == self.part_retries:
+                        raise
+                    await asyncio.sleep(0.5 * (2 ** attempt) + random.uniform(0, 0.5))
+
+    def _put_part(self, file_path: str, key: str, upload_id: str, number: int) -> str:
+        with open(file_path, "rb") as f:
+            f.seek((number - 1) * self.part_size)
+            body = f.read(self.part_size)
+        response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                           PartNumber=number, Body=body)
+        return response["ETag"]
+
+    def _list_parts(self, key: str, upload_id: str, size: int) -> Dict[int, str]:
+        parts = {}
+        paginator = self.client.get_paginator("list_parts")
+        for page in paginator.paginate(Bucket=self.bucket, Key=key, UploadId=upload_id):
+            for part in page.get("Parts", []):
+                number = part["PartNumber"]
+                expected = min(self.part_size, size - (number - 1) * self.part_size)
+                if part["Size"] == expected:
+                    parts[number] = part["ETag"]
+        return parts
+
+
+# Global instance
+s3_uploader = S3Uploader()
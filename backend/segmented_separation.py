@@ -0,0 +1,230 @@
+"""
+Segmented Separation - Separación por ventanas con overlap-add y memoria acotada
+"""
+
+import os
+import asyncio
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Callable, Iterator, Tuple
+
+import numpy as np
+import soundfile as sf
+
+WINDOW_SECONDS = float(os.getenv("SEGMENT_WINDOW_SECONDS", "30"))
+OVERLAP_SECONDS = float(os.getenv("SEGMENT_OVERLAP_SECONDS", "2"))
+
+
+def plan_windows(total_frames: int, window: int, overlap: int) -> List[Tuple[int, int]]:
+    """Return (start, length) for overlapping windows covering `total_frames`"""
+    if window <= overlap:
+        raise ValueError("Window must be longer than the overlap")
+    hop = window - overlap
+    windows = []
+    start = 0
+    while True:
+        length = min(window, total_frames - start)
+        windows.append((start, length))
+        if start + length >= total_frames:
+            break
+        start += hop
+    return windows
+
+
+def prepare_input(file_path: str, samplerate: int, output_dir: Path) -> str:
+    """Make sure the input is seekable with soundfile at the model sample rate.
+
+    Anything else (mp3 on old libsndfile, m4a, other sample rates) is transcoded
+    once by ffmpeg, which streams and never holds the whole track in memory.
+    """
+    try:
+        info = sf.info(file_path)
+        if info.samplerate == samplerate:
+            return file_path
+    except Exception:
+        pass
+
+    converted = output_dir / f"input_{samplerate}.wav"
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", file_path, "-ar", str(samplerate), "-ac", "2", str(converted)]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg error: {result.stderr.decode()}")
+    return str(converted)
+
+
+def read_windows(path: str, window: int, overlap: int, channels: int = 2) -> Iterator[Tuple[int, np.ndarray, bool]]:
+    """Yield (index, (channels, frames) float32 block, is_last) without loading the whole file"""
+    with sf.SoundFile(path) as f:
+        windows = plan_windows(f.frames, window, overlap)
+        for index, (start, length) in enumerate(windows):
+            f.seek(start)
+            block = f.read(length, dtype="float32", always_2d=True).T
+            yield index, match_channels(block, channels), index == len(windows) - 1
+
+
+def match_channels(block: np.ndarray, channels: int) -> np.ndarray:
+    """Convert a (channels, frames) block to the requested channel count"""
+    if block.shape[0] == channels:
+        return np.ascontiguousarray(block)
+    if block.shape[0] == 1:
+        return np.repeat(block, channels, axis=0)
+    return np.ascontiguousarray(block[:channels])
+
+
+class OverlapAddWriter:
+    """Crossfade consecutive separated windows and write each stem incrementally.
+
+    Only the overlap tail of the previous window is kept per stem, so memory is
+    O(window) no matter how long the track is. Windows must be added in order.
+    """
+
+    def __init__(self, paths: Dict[str, str], samplerate: int, channels: int, overlap: int, subtype: str = "PCM_16"):
+        self.overlap = overlap
+        self.fade_in = np.linspace(0.0, 1.0, overlap, endpoint=False, dtype=np.float32) if overlap else None
+        self.files = {
+            name: sf.SoundFile(path, mode="w", samplerate=samplerate, channels=channels, subtype=subtype)
+            for name, path in paths.items()
+        }
+        self.tails: Dict[str, Optional[np.ndarray]] = {name: None for name in paths}
+
+    def add(self, stems: Dict[str, np.ndarray], last: bool = False):
+        """Add one separated window; each stem is (channels, frames)"""
+        for name, audio in stems.items():
+            if name not in self.files:
+                continue
+            tail = self.tails[name]
+            if tail is not None:
+                head = audio[:, :self.overlap]
+                audio = audio.copy()
+                audio[:, :self.overlap] = tail * (1.0 - self.fade_in) + head * self.fade_in
+
+            if last or not self.overlap:
+                body, self.tails[name] = audio, None
+            else:
+                body, self.tails[name] = audio[:, :-self.overlap], audio[:, -self.overlap:].copy()
+
+            self.files[name].write(np.clip(body, -1.0, 1.0).T)
+
+    def close(self):
+        """Flush any pending tail and close the output files"""
+        for name, f in self.files.items():
+            tail = self.tails[name]
+            if tail is not None:
+                f.write(np.clip(tail, -1.0, 1.0).T)
+                self.tails[name] = None
+            f.close()
+
+
+def derive_stems(sources: Dict[str, np.ndarray], requested_tracks: Optional[List[str]]) -> Dict[str, np.ndarray]:
+    """Map raw Demucs sources to the tracks requested by the API (e.g. vocals + instrumental)"""
+    stems = dict(sources)
+    if requested_tracks and "instrumental" in requested_tracks:
+        accompaniment = [audio for name, audio in sources.items() if name != "vocals"]
+        if accompaniment:
+            instrumental = accompaniment[0].copy()
+            for audio in accompaniment[1:]:
+                instrumental += audio
+            stems["instrumental"] = instrumental
+    if requested_tracks:
+        stems = {name: audio for name, audio in stems.items() if name in requested_tracks}
+    return stems
+
+
+def plan_chunk_length(total_frames: int, num_chunks: int, overlap: int) -> int:
+    """Window length so that `num_chunks` windows sharing `overlap` frames cover the whole track"""
+    num_chunks = max(1, num_chunks)
+    chunk = -(-(total_frames + (num_chunks - 1) * overlap) // num_chunks)
+    return max(chunk, overlap + 1)
+
+
+async def separate_parallel(file_path: str, output_dir: Path, pool, num_chunks: int,
+                            overlap_seconds: float = OVERLAP_SECONDS,
+                            on_progress: Optional[Callable[[float], None]] = None, reservation=None) -> Dict[str, str]:
+    """Split one track into overlapping chunks, separate them concurrently and stitch them.
+
+    Each chunk goes to a different pool worker, so wall time scales down with the
+    number of workers. Stems are written in the standard Demucs layout
+    (<output_dir>/<model>/<track>/<stem>.wav).
+    """
+    samplerate, channels = pool.samplerate, pool.audio_channels
+    track_dir = output_dir / pool.model_name / Path(file_path).stem
+    track_dir.mkdir(parents=True, exist_ok=True)
+
+    input_path = await asyncio.to_thread(prepare_input, file_path, samplerate, output_dir)
+    overlap = int(overlap_seconds * samplerate)
+    window = plan_chunk_length(sf.info(input_path).frames, num_chunks, overlap)
+
+    # Submit every chunk before awaiting any so all workers start at once
+    chunks = await asyncio.to_thread(list, read_windows(input_path, window, overlap, channels))
+    # Overall progress is the mean of the chunks' progress
+    done = [0.0] * len(chunks)
+
+    def chunk_progress(index: int):
+        def report(fraction: float):
+            done[index] = fraction
+            on_progress(sum(done) / len(done))
+        return report if on_progress else None
+    jobs = [(asyncio.ensure_future(pool.separate_array(block, chunk_progress(index), reservation)), last)
+            for index, block, last in chunks]
+    del chunks
+
+    paths = {name: str(track_dir / f"{name}.wav") for name in pool.sources}
+    writer = OverlapAddWriter(paths, samplerate, channels, overlap)
+    try:
+        # Stitch in order; later chunks that finish early simply wait in their futures
+        for job, last in jobs:
+            sources, _ = await job
+            await asyncio.to_thread(writer.add, sources, last)
+    except Exception:
+        for job, _ in jobs:
+            job.cancel()
+        raise
+    finally:
+        writer.close()
+
+    return paths
+
+
+async def separate_segmented(file_path: str, output_dir: Path, pool, requested_tracks: Optional[List[str]] = None,
+                             task_callback: Optional[Callable] = None, window_seconds: float = WINDOW_SECONDS,
+                             overlap_seconds: float = OVERLAP_SECONDS) -> Dict[str, str]:
+    """Separate a track window by window through the worker pool, writing stems straight to disk"""
+    if not pool.available:
+        raise RuntimeError("Segmented separation requires the Demucs worker pool (DEMUCS_WORKERS > 0)")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    samplerate, channels = pool.samplerate, pool.audio_channels
+    window = int(window_seconds * samplerate)
+    overlap = int(overlap_seconds * samplerate)
+
+    input_path = await asyncio.to_thread(prepare_input, file_path, samplerate, output_dir)
+    total_windows = len(plan_windows(sf.info(input_path).frames, window, overlap))
+
+    names = list(pool.sources)
+    if requested_tracks:
+        names = [name for name in list(pool.sources) + ["instrumental"] if name in requested_tracks]
+    paths = {name: str(output_dir / f"{name}.wav") for name in names}
+
+    writer = OverlapAddWriter(paths, samplerate, channels, overlap)
+    windows = read_windows(input_path, window, overlap, channels)
+    try:
+        while True:
+            item = await asyncio.to_thread(next, windows, None)
+            if item is None:
+                break
+            index, block, last = item
+
+            def window_progress(fraction: float, index=index):
+                task_callback(40 + int(30 * (index + fraction) / total_windows),
+                              f"Separating window {index + 1}/{total_windows}")
+            sources, _ = await pool.separate_array(block, window_progress if task_callback else None)
+            stems = derive_stems(sources, requested_tracks)
+            await asyncio.to_thread(writer.add, stems, last)
+            if task_callback:
+                task_callback(40 + int(30 * (index + 1) / total_windows),
+                              f"Separated window {index + 1}/{total_windows}")
+    finally:
+        windows.close()
+        writer.close()
+
+    return paths
@@ -0,0 +1,167 @@
+"""
+Separation Cache - Caché de stems direccionada por contenido (hash del audio + modelo + opciones)
+"""
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Any
+
+CACHE_DIR = os.getenv("STEM_CACHE_DIR", "cache/stems")
+CACHE_MAX_MB = int(os.getenv("STEM_CACHE_MAX_MB", "5120"))
+MANIFEST = "manifest.json"
+
+
+class SeparationCache:
+    """On-disk stem store with an LRU size bound and in-flight request coalescing"""
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = CACHE_MAX_MB * 1024 * 1024):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # key -> bytes, oldest first
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @staticmethod
+    def make_key(audio_hash: str, separation_type: str, model: str, hi_fi: bool,
+                 options: Optional[Dict[str, Any]] = None) -> str:
+        """Combine the audio digest with everything that changes the separation output"""
+        params = json.dumps({
+            "audio": audio_hash,
+            "separation_type": separation_type,
+            "model": model,
+            "hi_fi": bool(hi_fi),
+            "options": options or None,
+        }, sort_keys=True)
+        return hashlib.sha256(params.encode()).hexdigest()
+
+    def load(self):
+        """Rebuild the LRU index from the manifests on disk (oldest access first)"""
+        with self._lock:
+            self._index.clear()
+            entries = []
+            if self.root.exists():
+                for manifest in self.root.glob(f"*/{MANIFEST}"):
+                    try:
+                        size = json.loads(manifest.read_text()).get("size", 0)
+                        entries.append((manifest.stat().st_mtime, manifest.parent.name, size))
+                    except (OSError, ValueError):
+                        shutil.rmtree(manifest.parent, ignore_errors=True)
+            for _, key, size in sorted(entries):
+                self._index[key] = size
+            self._loaded = True
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """Return cached stems (B2 URLs, or local cached paths) and mark the entry as recently used"""
+        if not self._loaded:
+            self.load()
+        with self._lock:
+            if key not in self._index:
+                return None
+            manifest_path = self.root / key / MANIFEST
+            try:
+                manifest = json.loads(manifest_path.read_text())
+            except (OSError, ValueError):
+                self._drop(key)
+                return None
+            if any(not Path(path).exists() for path in manifest["local"].values()):
+                self._drop(key)
+                return None
+            self._index.move_to_end(key)
+            os.utime(manifest_path)
+        return manifest["stems"]
+
+    def put(self, key: str, local_stems: Dict[str, str], result_stems: Dict[str, str],
+            analysis: Optional[Dict[str, Any]] = None, peaks: Optional[Dict[str, str]] = None,
+            renditions: Optional[Dict[str, Dict[str, str]]] = None) -> Dict[str, str]:
+        """Copy the produced stems (and waveform peaks) into the store and record what clients are returned"""
+        if not self._loaded:
+            self.load()
+        entry_dir = self.root / key
+        entry_dir.mkdir(parents=True, exist_ok=True)
+
+        local = {}
+        size = 0
+        for name, path in local_stems.items():
+            if not Path(path).exists():
+                continue
+            cached_path = entry_dir / f"{name}{Path(path).suffix}"
+            shutil.copy2(path, cached_path)
+            local[name] = str(cached_path)
+            size += cached_path.stat().st_size
+
+        cached_peaks = {}
+        for name, path in (peaks or {}).items():
+            if Path(path).exists():
+                cached_path = entry_dir / f"{name}.peaks"
+                shutil.copy2(path, cached_path)
+                cached_peaks[name] = str(cached_path)
+                size += cached_path.stat().st_size
+
+        # Stems that were not uploaded to B2 are served from the cache copy
+        stems = {
+            name: url if url and url.startswith("http") else local.get(name, url)
+            for name, url in result_stems.items()
+        }
+        manifest = {"stems": stems, "local": local, "analysis": analysis, "peaks": cached_peaks,
+                    "renditions": renditions, "size": size, "created_at": time.time()}
+        (entry_dir / MANIFEST).write_text(json.dumps(manifest))
+
+        with self._lock:
+            self._index[key] = size
+            self._index.move_to_end(key)
+            self._evict()
+        return stems
+
+    def extras(self, key: str) -> Dict[str, Any]:
+        """Song metadata, waveform peaks and rendition URLs stored with a cached separation"""
+        try:
+            manifest = json.loads((self.root / key / MANIFEST).read_text())
+        except (OSError, ValueError):
+            return {}
+        return {"analysis": manifest.get("analysis"), "peaks": manifest.get("peaks"),
+                "renditions": manifest.get("renditions")}
+
+    def _evict(self):
+        total = sum(self._index.values())
+        while total > self.max_bytes and len(self._index) > 1:
+            oldest, size = next(iter(self._index.items()))
+            self._drop(oldest)
+            total -= size
+            print(f"Evicted cached separation {oldest[:12]} ({size / 1e6:.1f} MB)")
+
+    def _drop(self, key: str):
+        self._index.pop(key, None)
+        shutil.rmtree(self.root / key, ignore_errors=True)
+
+    # In-flight coalescing: identical concurrent requests wait on one job
+
+    def inflight(self, key: str) -> Optional[asyncio.Future]:
+        return self._inflight.get(key)
+
+    def begin(self, key: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        return future
+
+    def finish(self, key: str, stems: Optional[Dict[str, str]] = None, error: Optional[Exception] = None):
+        future = self._inflight.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            # Avoid "exception was never retrieved" when nobody joined
+            future.exception()
+        else:
+            future.set_result(stems)
+
+
+# Global instance
+separation_cache = SeparationCache()
@@ -0,0 +1,122 @@
+"""
+Stem Encoder - Renditions comprimidas de cada stem (FLAC para descargas, Opus/AAC para reproducción)
+"""
+
+import os
+import json
+import asyncio
+import shutil
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Renditions produced per stem; the WAV itself is only uploaded when UPLOAD_WAV_STEMS=1
+DELIVERY_FORMATS = tuple(f for f in os.getenv("DELIVERY_FORMATS", "flac,opus,aac").split(",") if f)
+# Rendition returned in the `stems` map (what the players load); AAC plays everywhere, including iOS
+PLAYBACK_FORMAT = os.getenv("PLAYBACK_FORMAT", "aac")
+OPUS_BITRATE = os.getenv("OPUS_BITRATE", "96k")
+AAC_BITRATE = os.getenv("AAC_BITRATE", "128k")
+# Concurrent ffmpeg processes (each encodes one rendition of one stem)
+ENCODE_WORKERS = int(os.getenv("ENCODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+UPLOAD_WAV_STEMS = os.getenv("UPLOAD_WAV_STEMS", "0") == "1"
+MANIFEST = "renditions.json"
+
+# format -> (extension, content type, ffmpeg codec arguments)
+FORMATS: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+    "flac": (".flac", "audio/flac", ("-c:a", "flac", "-compression_level", "5")),
+    "opus": (".opus", "audio/ogg", ("-c:a", "libopus", "-b:a", OPUS_BITRATE, "-vbr", "on", "-application", "audio")),
+    # faststart puts the index first so playback can begin before the whole file arrives
+    "aac": (".m4a", "audio/mp4", ("-c:a", "aac", "-b:a", AAC_BITRATE, "-movflags", "+faststart")),
+}
+
+
+class StemEncoder:
+    """Transcodes stems with ffmpeg, one subprocess per rendition, `workers` at a time.
+
+    Encoding happens outside the interpreter, so the renditions of all stems
+    really run in parallel and the event loop only waits on the processes.
+    """
+
+    def __init__(self, formats: Tuple[str, ...] = DELIVERY_FORMATS, workers: int = ENCODE_WORKERS):
+        unknown = [f for f in formats if f not in FORMATS]
+        if unknown:
+            raise ValueError(f"Unknown delivery formats: {', '.join(unknown)}")
+        self.formats = formats
+        self.workers = max(1, workers)
+        self.available = shutil.which("ffmpeg") is not None
+        self._slots = None
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        """Process-wide bound on ffmpeg processes, shared by every job (one per event loop)"""
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.workers))
+        return self._slots[1]
+
+    async def encode_stem(self, stem_name: str, stem_path: str, output_dir: Path,
+                          semaphore: Optional[asyncio.Semaphore] = None) -> Dict[str, str]:
+        """Encode one stem into every format at once; returns {format: path} for the renditions that succeeded.
+
+        The ffmpeg processes share the encoder's process-wide `slots` unless another `semaphore` is passed.
+        """
+        if not self.available:
+            return {}
+        output_dir.mkdir(parents=True, exist_ok=True)
+        semaphore = semaphore or self.slots
+
+        async def encode(fmt: str) -> str:
+            async with semaphore:
+                return await self.encode_file(stem_path, output_dir / f"{stem_name}{FORMATS[fmt][0]}", fmt)
+
+        results = await asyncio.gather(*(encode(fmt) for fmt in self.formats), return_exceptions=True)
+        renditions = {}
+        for fmt, result in zip(self.formats, results):
+            if isinstance(result, Exception):
+                print(f"❌ Error encoding stem: {result}")
+            else:
+                renditions[fmt] = result
+        return renditions
+
+    async def encode_file(self, source: str, target: Path, fmt: str) -> str:
+        """One ffmpeg run: source WAV -> `fmt` rendition at `target`"""
+        cmd = ["ffmpeg", "-y", "-v", "error", "-i", source, "-vn", "-map_metadata", "-1",
+               *FORMATS[fmt][2], str(target)]
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            target.unlink(missing_ok=True)
+            raise Exception(f"ffmpeg error ({Path(source).name} -> {fmt}): {stderr.decode().strip()}")
+        return str(target)
+
+    def write_manifest(self, path: Path, stems: Dict[str, str], renditions: Dict[str, Dict[str, str]]) -> Dict:
+        """renditions.json: per stem, the source size and each rendition's file, size and content type"""
+        manifest = {}
+        for stem_name, formats in renditions.items():
+            manifest[stem_name] = {
+                "source_bytes": os.path.getsize(stems[stem_name]),
+                "formats": {
+                    fmt: {"path": rendition, "bytes": os.path.getsize(rendition), "content_type": FORMATS[fmt][1]}
+                    for fmt, rendition in formats.items()
+                }
+            }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(manifest, indent=2))
+        return manifest
+
+
+def playback_url(formats: Dict[str, str], fallback: Optional[str] = None) -> Optional[str]:
+    """URL the players should load: the playback rendition, else any compressed one, else the WAV"""
+    if PLAYBACK_FORMAT in formats:
+        return formats[PLAYBACK_FORMAT]
+    for fmt in ("aac", "opus", "flac"):
+        if fmt in formats:
+            return formats[fmt]
+    return fallback
+
+
+# Global instance
+stem_encoder = StemEncoder()
@@ -0,0 +1,126 @@
+"""
+Stem Pipeline - Cada stem pasa por encode → upload en cuanto la separación lo entrega, sin esperar a los demás
+"""
+
+import os
+import time
+import asyncio
+from pathlib import Path
+from typing import Callable, Dict, Iterable
+
+from b2_uploader import B2Uploader, b2_uploader
+from models import ProcessingTask
+from stem_encoder import StemEncoder, stem_encoder, playback_url, MANIFEST, UPLOAD_WAV_STEMS
+
+# Per-stem states reported by /status, in order
+STEM_STATES = ("separating", "encoding", "uploading", "ready", "failed")
+
+
+class StemPipeline:
+    """Encodes and uploads each stem as soon as separation hands it over.
+
+    Stems move independently and overlap with the rest of the separation
+    (instrumental mixdown, extended tracks): vocals can be playable while the
+    other tracks are still being produced. ffmpeg processes share one bound
+    (the encoder's workers) and uploads another (the uploader's concurrency),
+    both held by the encoder and uploader, so concurrent jobs share them too.
+    Every change is written to the task: `stem_states` per stem, and the
+    stem's playback URL in `stems` once it is ready; `publish` persists it.
+    """
+
+    def __init__(self, task: ProcessingTask, output_dir: Path, publish: Callable[[], None],
+                 user_id: str = "system", encoder: StemEncoder = stem_encoder, uploader: B2Uploader = b2_uploader):
+        self.task = task
+        self.output_dir = output_dir
+        self.publish = publish
+        self.user_id = user_id
+        self.encoder = encoder
+        self.uploader = uploader
+        self.local: Dict[str, str] = {}
+        self.renditions: Dict[str, Dict[str, str]] = {}
+        self.encode_stats: Dict[str, float] = {}
+        self.upload_stats: Dict[str, Dict] = {}
+        self._jobs: Dict[str, asyncio.Task] = {}
+        task.stems, task.renditions, task.stem_states = {}, {}, {}
+
+    def expect(self, names: Iterable[str]):
+        """Announce the stems the separation is producing"""
+        for name in names:
+            self.task.stem_states.setdefault(name, {"state": "separating"})
+        self.publish()
+
+    def add(self, name: str, path: str):
+        """Hand over a finalized stem; its encode and upload start right away (call from the event loop)"""
+        if name in self._jobs or not path or not os.path.exists(path):
+            return
+        self.local[name] = path
+        self._set(name, "encoding")
+        self._jobs[name] = asyncio.create_task(self._run(name, path))
+
+    async def finish(self) -> Dict[str, str]:
+        """Wait for every stem and write the renditions manifest.
+
+        Returns the stems map; a stem that could not be uploaded keeps its local
+        path, as before, so the separation itself never fails here.
+        """
+        await asyncio.gather(*self._jobs.values())
+        for name, info in self.task.stem_states.items():
+            if info["state"] == "separating":
+                self.task.stem_states[name] = {"state": "failed", "error": "Stem was not produced"}
+        self.encoder.write_manifest(self.output_dir / MANIFEST, self.local, self.renditions)
+
+        total_bytes = sum(stem["bytes"] for stem in self.upload_stats.values())
+        self.upload_stats = {"stems": self.upload_stats, "bytes": total_bytes, "concurrency": self.uploader.concurrency}
+        return {name: self.task.stems.get(name, path) for name, path in self.local.items()}
+
+    def complete(self) -> bool:
+        """Every expected stem was produced (uploaded, or at least kept locally)"""
+        return all(info["state"] == "ready" or name in self.local for name, info in self.task.stem_states.items())
+
+    def cancel(self):
+        for job in self._jobs.values():
+            job.cancel()
+
+    async def _run(self, name: str, path: str):
+        try:
+            start = time.perf_counter()
+            formats = await self.encoder.encode_stem(name, path, self.output_dir, self.encoder.slots)
+            self.encode_stats[name] = round(time.perf_counter() - start, 3)
+            if formats:
+                self.renditions[name] = formats
+
+            deliverables = dict(formats)
+            if UPLOAD_WAV_STEMS or not formats:
+                deliverables["wav"] = path
+            self._set(name, "uploading")
+            results = await asyncio.gather(*(self._upload(name, fmt, file_path) for fmt, file_path in deliverables.items()),
+                                           return_exceptions=True)
+
+            urls = {}
+            for fmt, result in zip(deliverables, results):
+                if isinstance(result, Exception):
+                    print(f"❌ Error uploading {name} ({fmt}): {result}")
+                elif result:
+                    urls[fmt] = result
+            url = playback_url(urls, urls.get("wav"))
+            if not url:
+                raise Exception("No rendition could be uploaded")
+
+            self.task.renditions[name] = urls
+            self.task.stems[name] = url
+            self._set(name, "ready", url=url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Stem {name} failed: {e}")
+            self._set(name, "failed", error=str(e))
+
+    async def _upload(self, name: str, fmt: str, file_path: str) -> str:
+        async with self.uploader.slots:
+            # The format is part of the object name ("vocals_flac.flac")
+            return await self.uploader.upload_stem_to_b2(file_path, self.user_id, self.task.id, f"{name}_{fmt}",
+                                                         self.upload_stats)
+
+    def _set(self, name: str, state: str, **info):
+        self.task.stem_states[name] = {"state": state, **info}
+        self.publish()
@@ -0,0 +1,131 @@
+"""
+Streaming Chroma - Cromagrama y envolvente de onsets por bloques (memoria acotada por el bloque)
+"""
+
+import os
+from typing import Iterator, List
+
+import librosa
+import numpy as np
+import soundfile as sf
+import soxr
+
+# Audio read per block; memory stays proportional to this, not to the file length
+STREAM_BLOCK_SECONDS = float(os.getenv("STREAM_BLOCK_SECONDS", "10"))
+# Tuning is estimated from the start of the file (the batch path uses the whole file)
+STREAM_TUNING_SECONDS = float(os.getenv("STREAM_TUNING_SECONDS", "30"))
+
+
+def read_mono_blocks(audio_path: str, sr: int, block_seconds: float = STREAM_BLOCK_SECONDS) -> Iterator[np.ndarray]:
+    """Mono float32 blocks at `sr`, as librosa.load would produce them, without loading the whole file"""
+    with sf.SoundFile(audio_path) as f:
+        block_frames = max(1, int(block_seconds * f.samplerate))
+        resampler = None
+        if f.samplerate != sr:
+            # Same resampler librosa.load uses by default (soxr_hq), keeping filter state between blocks
+            resampler = soxr.ResampleStream(f.samplerate, sr, 1, dtype="float32", quality="HQ")
+        while True:
+            data = f.read(block_frames, dtype="float32", always_2d=True)
+            last = len(data) < block_frames
+            mono = data.mean(axis=1)
+            if resampler is not None:
+                mono = resampler.resample_chunk(mono, last=last)
+            if len(mono):
+                yield mono
+            if last:
+                break
+
+
+class StreamingChroma:
+    """Block-wise equivalent of librosa's chroma_stft / onset_strength on a mono signal.
+
+    Frames are cut exactly like librosa's centred STFT (n_fft // 2 zeros of
+    padding at both ends), so a signal pushed in any block sizes yields the same
+    frames as the batch transform. Only the samples of one partial frame are
+    carried between blocks. Chroma is emitted per block; the onset envelope
+    (one float per frame) is kept for beat tracking.
+    """
+
+    def __init__(self, sr: int, n_fft: int = 2048, hop_length: int = 512,
+                 tuning_seconds: float = STREAM_TUNING_SECONDS, n_mels: int = 128, top_db: float = 80.0):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.top_db = top_db
+        self.window = librosa.filters.get_window("hann", n_fft, fftbins=True).reshape(-1, 1)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+        self.chroma_basis = None
+        self.tuning = None
+        self.n_samples = 0
+        self.n_frames = 0
+
+        self._buffer = np.zeros(n_fft // 2, dtype=np.float32)  # centre padding
+        self._tuning_frames = max(1, int(tuning_seconds * sr / hop_length))
+        self._pending_power: List[np.ndarray] = []  # held back until the tuning is known
+        self._pending_count = 0
+        self._db_max = -np.inf
+        self._prev_db = None
+        # onset_strength shifts the envelope by lag + n_fft // (2 * hop) frames of zeros
+        self._onset: List[np.ndarray] = [np.zeros(1 + n_fft // (2 * hop_length), dtype=np.float32)]
+
+    def push(self, samples: np.ndarray) -> List[np.ndarray]:
+        """Feed samples; returns the chroma blocks (12, n) that became available"""
+        self.n_samples += len(samples)
+        self._buffer = np.concatenate([self._buffer, samples.astype(np.float32, copy=False)])
+        return self._drain(final=False)
+
+    def finish(self) -> List[np.ndarray]:
+        """Flush the trailing padding and any chroma held back for tuning"""
+        self._buffer = np.concatenate([self._buffer, np.zeros(self.n_fft // 2, dtype=np.float32)])
+        return self._drain(final=True)
+
+    def onset_envelope(self) -> np.ndarray:
+        return np.concatenate(self._onset)[:self.n_frames]
+
+    def _drain(self, final: bool) -> List[np.ndarray]:
+        out = []
+        if len(self._buffer) >= self.n_fft:
+            n_frames = 1 + (len(self._buffer) - self.n_fft) // self.hop_length
+            frames = librosa.util.frame(self._buffer[:self.n_fft + (n_frames - 1) * self.hop_length],
+                                        frame_length=self.n_fft, hop_length=self.hop_length)
+            power = np.abs(np.fft.rfft(self.window * frames, axis=0)) ** 2
+            # Keep only the samples the next frame still needs
+            self._buffer = self._buffer[n_frames * self.hop_length:]
+            self.n_frames += n_frames
+            self._update_onset(power)
+            out.extend(self._emit(power, final))
+        elif final:
+            out.extend(self._emit(None, final))
+        return out
+
+    def _emit(self, power, final: bool) -> List[np.ndarray]:
+        if self.chroma_basis is None:
+            if power is not None:
+                self._pending_power.append(power)
+                self._pending_count += power.shape[1]
+            if self._pending_count < self._tuning_frames and not final:
+                return []
+            if not self._pending_power:
+                return []
+            held = np.concatenate(self._pending_power, axis=1)
+            self._pending_power = []
+            self.tuning = librosa.estimate_tuning(S=held, sr=self.sr, bins_per_octave=12)
+            self.chroma_basis = librosa.filters.chroma(sr=self.sr, n_fft=self.n_fft, tuning=self.tuning, n_chroma=12)
+            return [self._chroma(held)]
+        return [self._chroma(power)] if power is not None else []
+
+    def _chroma(self, power: np.ndarray) -> np.ndarray:
+        return librosa.util.normalize(self.chroma_basis @ power, norm=np.inf, axis=0)
+
+    def _update_onset(self, power: np.ndarray):
+        mel_db = librosa.power_to_db(self.mel_basis @ power, ref=1.0, top_db=None)
+        # top_db relative to the loudest frame so far (the batch path uses the global maximum)
+        self._db_max = max(self._db_max, float(mel_db.max()))
+        np.maximum(mel_db, self._db_max - self.top_db, out=mel_db)
+        if self._prev_db is not None:
+            mel_db_with_prev = np.concatenate([self._prev_db, mel_db], axis=1)
+        else:
+            mel_db_with_prev = mel_db
+        self._prev_db = mel_db[:, -1:]
+        flux = np.maximum(0.0, np.diff(mel_db_with_prev, axis=1)).mean(axis=0)
+        self._onset.append(flux.astype(np.float32))
@@ -0,0 +1,272 @@
+"""
+Task Store - Estado de tareas persistente (SQL vía TaskDB) o compartido (Redis), o solo en memoria
+"""
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from models import ProcessingTask, TaskStatus
+
+EXECUTION_BACKEND = os.getenv("EXECUTION_BACKEND", "local")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+TASK_STORE = os.getenv("TASK_STORE", "sql")
+TASK_TTL_SECONDS = int(os.getenv("TASK_TTL_SECONDS", str(7 * 24 * 3600)))
+# Progress updates are coalesced and written at most once per interval
+PROGRESS_FLUSH_SECONDS = float(os.getenv("PROGRESS_FLUSH_SECONDS", "1.0"))
+# How long a running task read from the DB is served from cache (other nodes may be updating it)
+READ_CACHE_TTL_SECONDS = float(os.getenv("READ_CACHE_TTL_SECONDS", "1.0"))
+READ_CACHE_SIZE = 1024
+TERMINAL_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED)
+ACTIVE_STATUSES = (TaskStatus.PENDING, TaskStatus.PROCESSING)
+INTERRUPTED_ERROR = "Interrupted by restart"
+
+
+class ChangeListeners:
+    """Callbacks run with the task id after every save/update_progress in this process (SSE push).
+
+    They are called on the writer's thread and must be cheap and thread-safe.
+    """
+
+    _listeners: Tuple[Callable[[str], None], ...] = ()
+
+    def add_listener(self, listener: Callable[[str], None]):
+        # Rebound rather than mutated, so writers iterating on other threads never see it change
+        self._listeners = self._listeners + (listener,)
+
+    def _notify(self, task_id: str):
+        for listener in self._listeners:
+            try:
+                listener(task_id)
+            except Exception as e:
+                print(f"Task listener error: {e}")
+
+
+class MemoryTaskStore(ChangeListeners):
+    """Process-local store; tasks are live objects, so in-place updates are visible immediately"""
+
+    def __init__(self):
+        self._tasks: Dict[str, ProcessingTask] = {}
+
+    def get(self, task_id: str) -> Optional[ProcessingTask]:
+        return self._tasks.get(task_id)
+
+    def save(self, task: ProcessingTask):
+        self._tasks[task.id] = task
+        self._notify(task.id)
+
+    def update_progress(self, task: ProcessingTask):
+        self.save(task)
+
+    def fail_interrupted(self, reason: str = INTERRUPTED_ERROR) -> int:
+        # Nothing outlives the process
+        return 0
+
+    def close(self):
+        pass
+
+
+class RedisTaskStore(ChangeListeners):
+    """Tasks serialized as JSON in Redis so API nodes and workers on other machines share them"""
+
+    def __init__(self, url: str = REDIS_URL, ttl: int = TASK_TTL_SECONDS, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(task_id: str) -> str:
+        return f"moises:task:{task_id}"
+
+    def get(self, task_id: str) -> Optional[ProcessingTask]:
+        raw = self.client.get(self._key(task_id))
+        if raw is None:
+            return None
+        return ProcessingTask.model_validate_json(raw)
+
+    def save(self, task: ProcessingTask):
+        self.client.set(self._key(task.id), task.model_dump_json(), ex=self.ttl)
+        self._notify(task.id)
+
+    def update_progress(self, task: ProcessingTask):
+        self.save(task)
+
+    def fail_interrupted(self, reason: str = INTERRUPTED_ERROR) -> int:
+        # Shared by several nodes: a running task may belong to one that is still up (the TTL expires the rest)
+        return 0
+
+    def close(self):
+        self.client.close()
+
+
+class SQLTaskStore(ChangeListeners):
+    """Tasks persisted in the `tasks` table (TaskDB).
+
+    State transitions are written immediately; progress updates are coalesced
+    per task and flushed in one transaction by a background thread. Reads go
+    through a small cache: tasks this process is updating are always served
+    from memory, finished tasks are immutable, and running tasks loaded from
+    the DB are re-read after READ_CACHE_TTL_SECONDS.
+    """
+
+    COLUMNS = ("id", "original_filename", "file_path", "separation_type", "status",
+               "progress", "stems", "error", "created_at", "completed_at")
+
+    def __init__(self, flush_interval: float = PROGRESS_FLUSH_SECONDS, cache_ttl: float = READ_CACHE_TTL_SECONDS,
+                 runs_jobs: bool = EXECUTION_BACKEND == "local"):
+        from database import SessionLocal, TaskDB
+        self._session_factory = SessionLocal
+        self._model = TaskDB
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        # With external workers the objects written here go stale, so they must expire like DB reads
+        self.runs_jobs = runs_jobs
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()  # task_id -> (task, expires_at)
+        self._dirty: Dict[str, ProcessingTask] = {}
+        self._lock = threading.Lock()
+        # Held from picking what to write until commit, so a stale progress batch never lands after a newer save
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def get(self, task_id: str) -> Optional[ProcessingTask]:
+        with self._lock:
+            entry = self._cache.get(task_id)
+            if entry and entry[1] > time.monotonic():
+                self._cache.move_to_end(task_id)
+                return entry[0]
+
+        with self._session_factory() as db:
+            row = db.get(self._model, task_id)
+            task = self._from_row(row) if row else None
+        if task is not None:
+            self._remember(task, local=False)
+        return task
+
+    def save(self, task: ProcessingTask):
+        """Write a state change now (creation, status change, results)"""
+        if task.status in TERMINAL_STATUSES and task.completed_at is None:
+            task.completed_at = datetime.now()
+        self._remember(task)
+        with self._write_lock:
+            with self._lock:
+                self._dirty.pop(task.id, None)
+            with self._session_factory() as db:
+                db.merge(self._to_row(task))
+                db.commit()
+        self._notify(task.id)
+
+    def update_progress(self, task: ProcessingTask):
+        """Queue a progress update; repeated updates of the same task collapse into one write"""
+        self._remember(task)
+        with self._lock:
+            self._dirty[task.id] = task
+        self._ensure_flusher()
+        # Readers in this process see the cached task right away, before the batch is written
+        self._notify(task.id)
+
+    def fail_interrupted(self, reason: str = INTERRUPTED_ERROR) -> int:
+        """Mark tasks left pending/processing by a previous run as failed; their jobs died with it"""
+        active = [status.value for status in ACTIVE_STATUSES]
+        with self._write_lock:
+            with self._session_factory() as db:
+                rows = db.query(self._model).filter(self._model.status.in_(active)).all()
+                for row in rows:
+                    row.status, row.error, row.completed_at = TaskStatus.FAILED.value, reason, datetime.now()
+                db.commit()
+        return len(rows)
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return
+            with self._session_factory() as db:
+                for task in dirty.values():
+                    db.merge(self._to_row(task))
+                db.commit()
+
+    def close(self):
+        """Stop the flusher and write any pending progress"""
+        if self._flusher is not None:
+            self._wakeup.set()
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+
+    def _ensure_flusher(self):
+        if self._flusher is None:
+            self._wakeup.clear()
+            self._flusher = threading.Thread(target=self._flush_loop, name="task-store-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._wakeup.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing task progress: {e}")
+
+    def _remember(self, task: ProcessingTask, local: bool = True):
+        if task.status in TERMINAL_STATUSES or (local and self.runs_jobs):
+            expires = float("inf")
+        else:
+            expires = time.monotonic() + self.cache_ttl
+        with self._lock:
+            self._cache[task.id] = (task, expires)
+            self._cache.move_to_end(task.id)
+            while len(self._cache) > READ_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _to_row(self, task: ProcessingTask):
+        data = task.model_dump(mode="json")
+        details = {name: value for name, value in data.items() if name not in self.COLUMNS}
+        return self._model(
+            id=task.id,
+            original_filename=task.original_filename,
+            file_path=task.file_path,
+            separation_type=task.separation_type,
+            status=task.status.value,
+            progress=task.progress,
+            stems=json.dumps(task.stems) if task.stems is not None else None,
+            error=task.error,
+            details=json.dumps(details),
+            created_at=task.created_at,
+            completed_at=task.completed_at,
+        )
+
+    @staticmethod
+    def _from_row(row) -> ProcessingTask:
+        data = json.loads(row.details) if row.details else {}
+        data.update(
+            id=row.id,
+            original_filename=row.original_filename,
+            file_path=row.file_path,
+            separation_type=row.separation_type,
+            status=row.status,
+            progress=row.progress or 0,
+            stems=json.loads(row.stems) if row.stems else None,
+            error=row.error,
+            created_at=row.created_at,
+            completed_at=row.completed_at,
+        )
+        return ProcessingTask.model_validate(data)
+
+
+def create_task_store(kind: str = TASK_STORE):
+    if kind == "redis":
+        return RedisTaskStore()
+    if kind == "sql":
+        return SQLTaskStore()
+    return MemoryTaskStore()
+
+
+# Global instance
+task_store = create_task_store()
@@ -0,0 +1,254 @@
+"""
+Upload Ingest - Lee el cuerpo multipart en streaming: disco + hash + sondeo de cabecera en una sola pasada
+"""
+
+import os
+import struct
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiofiles
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+
+CHUNK_SIZE = 1024 * 1024
+# Bytes needed before the header probe runs (enough for WAV/FLAC/MP3 headers behind an ID3 tag)
+PROBE_BYTES = 64 * 1024
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "500"))
+MAX_DURATION_SECONDS = float(os.getenv("MAX_DURATION_SECONDS", "7200"))
+
+MP3_BITRATES = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0]
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+@dataclass
+class AudioProbe:
+    format: str
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    duration: Optional[float] = None
+    bitrate: Optional[int] = None  # bits per second, for compressed formats
+
+
+@dataclass
+class UploadInfo:
+    path: str
+    size: int
+    sha256: str
+    probe: AudioProbe
+    filename: str
+    content_type: str
+
+
+def probe_header(header: bytes, total_size: Optional[int] = None) -> Optional[AudioProbe]:
+    """Identify the container from its first bytes and read what the header tells us"""
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return _probe_wav(header)
+    if header[:4] == b"fLaC":
+        return _probe_flac(header)
+    if header[:4] == b"OggS":
+        return AudioProbe(format="ogg")
+    if header[:4] == b"FORM" and header[8:12] in (b"AIFF", b"AIFC"):
+        return AudioProbe(format="aiff")
+    if header[4:8] == b"ftyp":
+        return AudioProbe(format="m4a")
+    if header[:3] == b"ID3" or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return _probe_mp3(header, total_size)
+    return None
+
+
+def _probe_wav(header: bytes) -> AudioProbe:
+    probe = AudioProbe(format="wav")
+    offset = 12
+    byte_rate = None
+    while offset + 8 <= len(header):
+        chunk_id, chunk_size = header[offset:offset + 4], struct.unpack("<I", header[offset + 4:offset + 8])[0]
+        body = offset + 8
+        if chunk_id == b"fmt " and body + 16 <= len(header):
+            _, channels, sample_rate, byte_rate = struct.unpack("<HHII", header[body:body + 12])
+            probe.channels, probe.sample_rate = channels, sample_rate
+        elif chunk_id == b"data":
+            if byte_rate:
+                probe.duration = chunk_size / byte_rate
+            break
+        offset = body + chunk_size + (chunk_size & 1)
+    return probe
+
+
+def _probe_flac(header: bytes) -> AudioProbe:
+    probe = AudioProbe(format="flac")
+    # STREAMINFO is always the first metadata block: 4 bytes marker + 4 bytes block header
+    info = header[8:8 + 34]
+    if len(info) == 34:
+        packed = int.from_bytes(info[10:18], "big")
+        probe.sample_rate = packed >> 44
+        probe.channels = ((packed >> 41) & 0x7) + 1
+        total_samples = packed & 0xFFFFFFFFF
+        if probe.sample_rate and total_samples:
+            probe.duration = total_samples / probe.sample_rate
+    return probe
+
+
+def _probe_mp3(header: bytes, total_size: Optional[int]) -> AudioProbe:
+    probe = AudioProbe(format="mp3")
+    offset = 0
+    if header[:3] == b"ID3" and len(header) >= 10:
+        # Syncsafe tag size
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        offset = 10 + size
+    # Find the first frame sync after the tag
+    while offset + 4 <= len(header):
+        if header[offset] == 0xFF and header[offset + 1] & 0xE0 == 0xE0:
+            version = (header[offset + 1] >> 3) & 0x3
+            bitrate_index = (header[offset + 2] >> 4) & 0xF
+            rate_index = (header[offset + 2] >> 2) & 0x3
+            if version in MP3_SAMPLE_RATES and rate_index < 3 and 0 < bitrate_index < 15:
+                probe.sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+                probe.channels = 1 if (header[offset + 3] >> 6) == 3 else 2
+                probe.bitrate = MP3_BITRATES[bitrate_index] * 1000
+                if total_size:
+                    # Constant-bitrate estimate; close enough for limits and display
+                    probe.duration = (total_size - offset) * 8 / probe.bitrate
+                break
+        offset += 1
+    return probe
+
+
+def _check_limits(probe: Optional[AudioProbe], received: int, max_bytes: int, max_duration: float):
+    if received > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds {max_bytes // (1024 * 1024)} MB limit")
+    if probe is None:
+        raise HTTPException(status_code=415, detail="File is not a supported audio format")
+    if probe.duration and probe.duration > max_duration:
+        raise HTTPException(status_code=413, detail=f"Audio exceeds {int(max_duration)} s limit")
+
+
+def _file_part_events(content_type: str, field: str) -> Tuple[MultipartParser, List[Tuple]]:
+    """Multipart parser that queues ("begin", filename, content_type), ("data", bytes) and ("end",) for `field`"""
+    mime, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if mime != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    events: List[Tuple] = []
+    part: Dict = {}
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers={}, field=b"", value=b"", wanted=False)
+
+    def on_header_field(data, start, end):
+        part["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"], part["value"] = b"", b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("latin-1")
+        filename = disposition.get(b"filename")
+        part["wanted"] = name == field and filename is not None
+        if part["wanted"]:
+            events.append(("begin", filename.decode("utf-8", errors="replace"),
+                           part["headers"].get(b"content-type", b"").decode("latin-1")))
+
+    def on_part_data(data, start, end):
+        if part.get("wanted"):
+            events.append(("data", data[start:end]))
+
+    def on_part_end():
+        if part.get("wanted"):
+            events.append(("end",))
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    return parser, events
+
+
+async def ingest_request(request: Request, upload_dir: Path, name: str = "original", default_ext: str = "mp3",
+                         field: str = "file", require_audio_type: bool = False,
+                         max_bytes: int = MAX_UPLOAD_MB * 1024 * 1024,
+                         max_duration: float = MAX_DURATION_SECONDS) -> UploadInfo:
+    """Parse the multipart body as it arrives and stream the `field` file part to `upload_dir/name.ext`.
+
+    The SHA-256 and the header probe are computed in the same pass, so a file
+    that is not audio, or whose header is over the duration limit, is rejected
+    once its first PROBE_BYTES have arrived (and the partial file removed)
+    instead of after the whole body has been received.
+    """
+    parser, events = _file_part_events(request.headers.get("content-type", ""), field)
+    content_length = request.headers.get("content-length")
+    # Until the part ends its size is unknown; the body size is close enough for the MP3 duration estimate
+    expected_size = int(content_length) if content_length and content_length.isdigit() else None
+
+    digest = hashlib.sha256()
+    header = b""
+    probe = None
+    probed = False
+    received = 0
+    file_path = None
+    filename = content_type = ""
+    buffer = None
+    done = False
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for event in events:
+                if done:
+                    break
+                if event[0] == "begin":
+                    _, filename, content_type = event
+                    if require_audio_type and not content_type.startswith("audio/"):
+                        raise HTTPException(status_code=400, detail="File must be audio")
+                    ext = filename.split(".")[-1] if "." in filename else default_ext
+                    file_path = upload_dir / f"{name}.{ext}"
+                    buffer = await aiofiles.open(file_path, "wb")
+                elif event[0] == "data":
+                    data = event[1]
+                    received += len(data)
+                    digest.update(data)
+                    if not probed:
+                        header += data[:PROBE_BYTES - len(header)]
+                        if len(header) >= PROBE_BYTES:
+                            probe = probe_header(header, expected_size)
+                            probed = True
+                            _check_limits(probe, received, max_bytes, max_duration)
+                    elif received > max_bytes:
+                        _check_limits(probe, received, max_bytes, max_duration)
+                    await buffer.write(data)
+                else:
+                    # Only the first file part is kept
+                    done = True
+            events.clear()
+        parser.finalize()
+
+        if buffer is None:
+            raise HTTPException(status_code=400, detail=f"No '{field}' file in the upload")
+        await buffer.close()
+        buffer = None
+        if not probed or (probe and probe.format == "mp3"):
+            probe = probe_header(header, received)
+        _check_limits(probe, received, max_bytes, max_duration)
+    except Exception:
+        # Rejected, or the client went away: never leave a partial file behind
+        if buffer is not None:
+            await buffer.close()
+        if file_path is not None:
+            file_path.unlink(missing_ok=True)
+        raise
+
+    return UploadInfo(path=str(file_path), size=received, sha256=digest.hexdigest(), probe=probe,
+                      filename=filename, content_type=content_type)
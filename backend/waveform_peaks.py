@@ -0,0 +1,144 @@
+"""
+Waveform Peaks - Pirámide min/max por stem para dibujar formas de onda sin descargar el audio
+"""
+
+import os
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+# Samples per peak of each zoom level, finest first; every level is a multiple of the first
+PEAK_LEVELS = tuple(int(v) for v in os.getenv("PEAK_LEVELS", "256,1024,4096,16384").split(","))
+# Widest range a single request may ask for, in peaks
+MAX_PEAKS_PER_REQUEST = int(os.getenv("MAX_PEAKS_PER_REQUEST", "20000"))
+
+# Container: magic, version, level count, sample rate; then per level (samples per peak,
+# peak count, byte offset); then each level as interleaved int8 min/max pairs
+MAGIC = b"MPK1"
+HEADER = struct.Struct("<4sHHI")
+LEVEL = struct.Struct("<IIQ")
+# audiowaveform .dat v1: version, flags (1 = 8-bit), sample rate, samples per pixel, length
+DAT_HEADER = struct.Struct("<iIiiI")
+
+
+def compute_peaks(audio_path: str, levels: Tuple[int, ...] = PEAK_LEVELS) -> Tuple[int, List[Tuple[int, np.ndarray]]]:
+    """Min/max of every `levels[0]` samples (across all channels), read block by block.
+
+    Returns (sample_rate, [(samples_per_peak, int8 array of min/max pairs), ...]).
+    """
+    base = levels[0]
+    if any(level % base for level in levels):
+        raise ValueError("Every peak level must be a multiple of the first")
+
+    mins, maxs = [], []
+    with sf.SoundFile(audio_path) as f:
+        sample_rate = f.samplerate
+        carry = np.empty((0, f.channels), dtype=np.float32)
+        for block in f.blocks(blocksize=base * 1024, dtype="float32", always_2d=True):
+            block = np.concatenate([carry, block]) if len(carry) else block
+            usable = len(block) // base * base
+            grouped = block[:usable].reshape(-1, base * f.channels)
+            mins.append(grouped.min(axis=1))
+            maxs.append(grouped.max(axis=1))
+            carry = block[usable:]
+        if len(carry):
+            mins.append(carry.min(keepdims=True).ravel())
+            maxs.append(carry.max(keepdims=True).ravel())
+
+    level_min = np.concatenate(mins) if mins else np.zeros(0, dtype=np.float32)
+    level_max = np.concatenate(maxs) if maxs else np.zeros(0, dtype=np.float32)
+
+    pyramid = []
+    for level in levels:
+        factor = level // base
+        if factor > 1 and len(level_min):
+            starts = np.arange(0, len(level_min), factor)
+            lo, hi = np.minimum.reduceat(level_min, starts), np.maximum.reduceat(level_max, starts)
+        else:
+            lo, hi = level_min, level_max
+        pairs = np.empty(2 * len(lo), dtype=np.int8)
+        pairs[0::2] = quantize(lo)
+        pairs[1::2] = quantize(hi)
+        pyramid.append((level, pairs))
+    return sample_rate, pyramid
+
+
+def quantize(values: np.ndarray) -> np.ndarray:
+    return np.clip(np.round(values * 127.0), -128, 127).astype(np.int8)
+
+
+def write_peaks(path: Path, sample_rate: int, pyramid: List[Tuple[int, np.ndarray]]):
+    offset = HEADER.size + LEVEL.size * len(pyramid)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 1, len(pyramid), sample_rate))
+        for samples_per_peak, pairs in pyramid:
+            f.write(LEVEL.pack(samples_per_peak, len(pairs) // 2, offset))
+            offset += pairs.nbytes
+        for _, pairs in pyramid:
+            f.write(pairs.tobytes())
+
+
+def read_header(path: Path) -> Tuple[int, List[Tuple[int, int, int]]]:
+    """(sample_rate, [(samples_per_peak, peak_count, offset), ...])"""
+    with open(path, "rb") as f:
+        magic, version, n_levels, sample_rate = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != 1:
+            raise ValueError(f"Not a peaks file: {path}")
+        return sample_rate, [LEVEL.unpack(f.read(LEVEL.size)) for _ in range(n_levels)]
+
+
+def build_peaks(stems: Dict[str, str], output_dir: Path) -> Dict[str, str]:
+    """Write one peaks file per local stem; returns {stem: peaks path}"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    peaks = {}
+    for name, stem_path in stems.items():
+        if not os.path.exists(stem_path):
+            continue
+        sample_rate, pyramid = compute_peaks(stem_path)
+        peaks_path = output_dir / f"{name}.peaks"
+        write_peaks(peaks_path, sample_rate, pyramid)
+        peaks[name] = str(peaks_path)
+    return peaks
+
+
+def describe_peaks(path: Path) -> Dict:
+    sample_rate, levels = read_header(path)
+    base, count, _ = levels[0]
+    return {
+        "sample_rate": sample_rate,
+        "duration": base * count / sample_rate,
+        "levels": [samples_per_peak for samples_per_peak, _, _ in levels]
+    }
+
+
+def read_peaks_range(path: Path, start: float = 0.0, end: Optional[float] = None, pixels: int = 2000) -> Tuple[bytes, float]:
+    """Peaks for [start, end) seconds at the coarsest level that still gives `pixels` peaks.
+
+    Returns an audiowaveform .dat (v1, 8-bit) payload and the start time of its
+    first peak, which is the requested start snapped to the level's grid.
+    """
+    sample_rate, levels = read_header(path)
+    duration = levels[0][0] * levels[0][1] / sample_rate
+    start = min(max(0.0, start), duration)
+    end = duration if end is None else min(max(start, end), duration)
+    pixels = max(1, pixels)
+
+    wanted = (end - start) * sample_rate / pixels
+    samples_per_peak, count, offset = levels[0]
+    for level in levels:
+        if level[0] <= wanted:
+            samples_per_peak, count, offset = level
+
+    first = min(count, int(start * sample_rate // samples_per_peak))
+    last = min(count, -(-int(end * sample_rate) // samples_per_peak))
+    last = min(last, first + MAX_PEAKS_PER_REQUEST)
+
+    with open(path, "rb") as f:
+        f.seek(offset + 2 * first)
+        data = f.read(2 * (last - first))
+
+    header = DAT_HEADER.pack(1, 1, sample_rate, samples_per_peak, len(data) // 2)
+    return header + data, first * samples_per_peak / sample_rate
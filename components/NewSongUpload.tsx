@@ -71,7 +71,7 @@ const NewSongUpload: React.FC<NewSongUploadProps> = ({ isOpen, onClose, onUpload
         bpm: statusResult.bpm || 0,
         key: statusResult.key || '',
         duration: statusResult.duration || '0:00',
-        durationSeconds: 0,
+        durationSeconds: statusResult.durationSeconds || 0,
         timeSignature: statusResult.timeSignature || '4/4',
         year: undefined,
         album: '',
@@ -124,7 +124,67 @@ const NewSongUpload: React.FC<NewSongUploadProps> = ({ isOpen, onClose, onUpload
     }
   };
 
+  // Actualizar progreso y mensaje
+  const updateSeparationProgress = (statusResult: any) => {
+    setSeparationProgress(statusResult.progress || 0);
+    if (statusResult.progress) {
+      if (statusResult.progress < 20) {
+        setSeparationMessage('Iniciando separación...');
+      } else if (statusResult.progress < 40) {
+        setSeparationMessage('Iniciando Demucs AI...');
+      } else if (statusResult.progress < 70) {
+        setSeparationMessage('Procesando con Demucs AI...');
+      } else if (statusResult.progress < 85) {
+        setSeparationMessage('Demucs completado, procesando archivos...');
+      } else if (statusResult.progress < 95) {
+        setSeparationMessage('Subiendo archivos a la nube...');
+      } else {
+        setSeparationMessage('¡Casi listo!');
+      }
+    }
+  };
+
+  // Progreso empujado por el servidor (SSE); resuelve null si el stream no está disponible
+  const followSeparationEvents = (taskId: string, songData: any) =>
+    new Promise<any>((resolve, reject) => {
+      const source = new EventSource(`http://localhost:8000/status/${taskId}/events`);
+      
+      source.onmessage = async (event) => {
+        const statusResult = JSON.parse(event.data);
+        console.log('🔄 Separation status (push):', statusResult);
+        updateSeparationProgress(statusResult);
+        
+        if (statusResult.status === 'completed') {
+          source.close();
+          console.log('✅ REAL Audio separation completed!');
+          try {
+            await saveSeparatedSongToCloud(statusResult, songData, taskId);
+            resolve({ success: true, taskId, stems: statusResult.stems });
+          } catch (error) {
+            reject(error);
+          }
+        } else if (statusResult.status === 'failed') {
+          source.close();
+          setIsProcessingSeparation(false);
+          reject(new Error('Audio separation failed'));
+        }
+      };
+      
+      source.onerror = () => {
+        // Sin SSE (proxy, red): volver al polling
+        source.close();
+        resolve(null);
+      };
+    });
+
   const pollSeparationStatus = async (taskId: string, songData: any) => {
+    if (typeof EventSource !== 'undefined') {
+      const pushed = await followSeparationEvents(taskId, songData);
+      if (pushed) {
+        return pushed;
+      }
+    }
+    
     const maxAttempts = 120; // 120 intentos máximo (2 minutos para Demucs)
     let attempts = 0;
     
@@ -135,23 +195,7 @@ const NewSongUpload: React.FC<NewSongUploadProps> = ({ isOpen, onClose, onUpload
         
         console.log(`🔄 Separation status (attempt ${attempts + 1}):`, statusResult);
         
-        // Actualizar progreso y mensaje
-        setSeparationProgress(statusResult.progress || 0);
-        if (statusResult.progress) {
-          if (statusResult.progress < 20) {
-            setSeparationMessage('Iniciando separación...');
-          } else if (statusResult.progress < 40) {
-            setSeparationMessage('Iniciando Demucs AI...');
-          } else if (statusResult.progress < 70) {
-            setSeparationMessage('Procesando con Demucs AI...');
-          } else if (statusResult.progress < 85) {
-            setSeparationMessage('Demucs completado, procesando archivos...');
-          } else if (statusResult.progress < 95) {
-            setSeparationMessage('Subiendo archivos a la nube...');
-          } else {
-            setSeparationMessage('¡Casi listo!');
-          }
-        }
+        updateSeparationProgress(statusResult);
         
         if (statusResult.status === 'completed') {
           console.log('✅ REAL Audio separation completed!');